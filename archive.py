@@ -0,0 +1,206 @@
+import re
+import sys
+from datetime import datetime
+
+import gspread
+
+import sheet_sync
+from rollups import ROLLUP_SHEET, _contributions
+from row_index import DEFAULT_PATH, RowIndex
+from schema import (LEDGER_SHEETS, SHEET_MAINT, USER_KEY, column_names, date_column, normalize_date, record_id,
+                    row_key)
+from sheet_client import load_local_secrets, pool_from_secrets
+
+
+# ==========================================
+# [연도별 보관 - 해가 바뀌면 한 번 실행]
+# 지난 해 기록을 장부 시트에서 연도별 시트(매출기록_2025 같은)로 옮겨서
+# 앱이 매번 읽는 시트에는 올해 기록만 남긴다.
+# 매출기록을 옮긴 해는 사용자별 월/년 합계를 "보관합계" 시트에 적어 두고,
+# 앱은 통계를 다시 만들 때 이 합계를 더한다 (보관된 행은 안 읽는다).
+#   - 옮길 행을 보관 시트에 먼저 쓰고, 다시 읽어서 확인된 행만 장부에서 지운다
+#     (중간에 멈춰도 다시 실행하면 이어서 한다. 이미 보관된 기록ID 는 다시 안 붙인다)
+#   - 정비기록은 항목별 마지막 기록을 남긴다 (정비 현황이 그걸로 계산된다)
+#   - 기록ID 가 없는 예전 행은 옮기지 않는다 (migrate_typed.py --apply 를 먼저)
+#   - storage = "sheets" 일 때만 쓴다 (sqlite 는 로컬 DB 에 전체 기록이 그대로 있다)
+# 앱 사용이 적은 시간에 실행하세요.
+#     python archive.py                  # 옮길 행 수만 확인 (올해 이전)
+#     python archive.py --apply          # 실제로 옮기기
+#     python archive.py --before 2025    # 2024년까지만
+# ==========================================
+TOTALS_SHEET = "보관합계"
+TOTALS_HEADER = [USER_KEY, "기간", "수입", "배달건수"]
+
+
+def archive_sheet_name(sheet_name, year):
+    return f"{sheet_name}_{year}"
+
+
+def _year(sheet_name, values):
+    day = normalize_date(values[column_names(sheet_name).index(date_column(sheet_name))])
+    return int(day[:4]) if re.fullmatch(r"\d{4}-\d{2}-\d{2}", day) else None
+
+
+def _pad(rows, width):
+    return [(list(r) + [""] * width)[:width] for r in rows]
+
+
+def _keep_latest_maint(rows):
+    # 정비기록: (사용자번호, 항목)별로 날짜가 가장 늦은 행은 장부에 남긴다
+    names = column_names(SHEET_MAINT)
+    i_date, i_item = names.index("날짜"), names.index("항목")
+    latest = {}
+    for row_num, values in rows:
+        key = (values[0], values[i_item])
+        if key not in latest or normalize_date(values[i_date]) >= normalize_date(latest[key][1][i_date]):
+            latest[key] = (row_num, values)
+    keep = {row_num for row_num, _ in latest.values()}
+    return [(row_num, values) for row_num, values in rows if row_num not in keep]
+
+
+def pick_rows(sheet_name, rows, before_year):
+    # rows: get_all_values() 결과 -> {연도: [(행번호, 값)]} (before_year 이전, 기록ID 있는 행만)
+    # 반환: (연도별 행, 기록ID 가 없어서 못 옮기는 행 수)
+    width = len(column_names(sheet_name))
+    candidates = []
+    legacy = 0
+    for row_num, values in enumerate(_pad(rows[1:], width), start=2):
+        year = _year(sheet_name, values)
+        if year is None or year >= before_year:
+            continue
+        if not record_id(sheet_name, values):
+            legacy += 1
+            continue
+        candidates.append((row_num, values))
+    if sheet_name == SHEET_MAINT:
+        candidates = _keep_latest_maint(candidates)
+
+    by_year = {}
+    for row_num, values in candidates:
+        by_year.setdefault(_year(sheet_name, values), []).append((row_num, values))
+    return by_year, legacy
+
+
+def _read(pool, name):
+    return pool.run(name, lambda ws: ws.get_all_values())
+
+
+def _open_archive(pool, name, header):
+    # 없으면 헤더만 있는 새 시트로 만든다
+    try:
+        return _read(pool, name)
+    except gspread.exceptions.WorksheetNotFound:
+        pool.add_worksheet(name, header)
+        return [header]
+
+
+def copy_to_archive(pool, sheet_name, year, moving):
+    # moving: [(행번호, 값)] -> 보관 시트에 쓰고 다시 읽어서 그대로 들어간 기록ID 만 돌려준다
+    # 이미 있는 기록ID 는 다시 붙이지 않고, 장부 쪽이 더 새로 고쳐졌으면 그 행만 덮어쓴다
+    header = column_names(sheet_name)
+    width = len(header)
+    name = archive_sheet_name(sheet_name, year)
+    archived = _pad(_open_archive(pool, name, header), width)
+    where = {record_id(sheet_name, values): row_num
+             for row_num, values in enumerate(archived[1:], start=2) if record_id(sheet_name, values)}
+
+    updates, inserts = {}, []
+    for _, values in moving:
+        row_num = where.get(record_id(sheet_name, values))
+        if row_num is None:
+            inserts.append(values)
+        elif row_key(sheet_name, archived[row_num - 1]) != row_key(sheet_name, values):
+            updates[row_num] = values
+    if updates or inserts:
+        pool.run(name, lambda ws: sheet_sync.apply_changes(ws, width, updates, inserts, []), idempotent=False)
+
+    stored = {record_id(sheet_name, values): row_key(sheet_name, values)
+              for values in _pad(_read(pool, name)[1:], width)}
+    return {record_id(sheet_name, values) for _, values in moving
+            if stored.get(record_id(sheet_name, values)) == row_key(sheet_name, values)}
+
+
+def remove_archived(pool, sheet_name, expected):
+    # expected: {기록ID: row_key} -> 장부를 다시 읽어서 그대로인 행만 한 번에 지운다
+    # (그 사이에 누가 고쳤으면 남겨 두고 다음 실행 때 다시 옮긴다)
+    width = len(column_names(sheet_name))
+    rows = _read(pool, sheet_name)
+    deletes = [row_num for row_num, values in enumerate(_pad(rows[1:], width), start=2)
+               if expected.get(record_id(sheet_name, values)) == row_key(sheet_name, values)]
+    if deletes:
+        pool.run(sheet_name, lambda ws: sheet_sync.apply_changes(ws, width, {}, [], deletes), idempotent=False)
+    return len(deletes)
+
+
+def write_totals(pool):
+    # 매출기록 보관 시트를 모두 읽어서 사용자별 월/년 합계를 "보관합계" 에 통째로 다시 쓴다
+    # (몇 번을 실행해도 결과가 같다. 일별 합계는 양이 많아서 안 남긴다)
+    pattern = re.compile(re.escape(ROLLUP_SHEET) + r"_\d{4}$")
+    totals = {}
+    for name in sorted(t for t in pool.titles() if pattern.match(t)):
+        for key, (revenue, count) in _contributions(_read(pool, name)[1:]).items():
+            if key[1][0] in "MY":
+                entry = totals.setdefault(key, [0, 0])
+                entry[0] += revenue
+                entry[1] += count
+
+    old = _open_archive(pool, TOTALS_SHEET, TOTALS_HEADER)
+    values = [TOTALS_HEADER] + [[owner, period, rev, cnt] for (owner, period), (rev, cnt) in sorted(totals.items())]
+    # 예전 내용이 더 길면 남는 줄은 빈 칸으로 덮는다 (한 번의 update 라 중간 상태가 안 생긴다)
+    values += [[""] * len(TOTALS_HEADER)] * (len(old) - len(values))
+    pool.run(TOTALS_SHEET, lambda ws: ws.update(range_name="A1", values=values), idempotent=False)
+    return len(totals)
+
+
+def load_totals(pool):
+    # 앱에서 부름: {사용자번호: {기간: (수입, 건수)}}, 보관한 적이 없으면 {}
+    try:
+        rows = pool.run(TOTALS_SHEET, lambda ws: ws.get_all_values(), key=("all_rows", TOTALS_SHEET))
+    except gspread.exceptions.WorksheetNotFound:
+        return {}
+    totals = {}
+    for row in _pad(rows[1:], len(TOTALS_HEADER)):
+        owner, period, revenue, count = row
+        if owner and period:
+            totals.setdefault(owner, {})[period] = (int(revenue or 0), int(count or 0))
+    return totals
+
+
+def archive_ledgers(pool, before_year, apply=False, index=None, log=print):
+    for sheet_name in LEDGER_SHEETS:
+        by_year, legacy = pick_rows(sheet_name, _read(pool, sheet_name), before_year)
+        if legacy:
+            log(f"{sheet_name}: 기록ID 없는 {legacy}행은 그대로 둠 (migrate_typed.py --apply 먼저)")
+        if not by_year:
+            log(f"{sheet_name}: 옮길 행 없음")
+            continue
+        if not apply:
+            for year, moving in sorted(by_year.items()):
+                log(f"{sheet_name}: {year}년 {len(moving)}행 -> {archive_sheet_name(sheet_name, year)} 옮길 예정")
+            continue
+
+        expected = {}
+        for year, moving in sorted(by_year.items()):
+            confirmed = copy_to_archive(pool, sheet_name, year, moving)
+            expected.update({record_id(sheet_name, values): row_key(sheet_name, values)
+                             for _, values in moving if record_id(sheet_name, values) in confirmed})
+            log(f"{sheet_name}: {year}년 {len(confirmed)}/{len(moving)}행 -> {archive_sheet_name(sheet_name, year)}")
+        removed = remove_archived(pool, sheet_name, expected)
+        log(f"{sheet_name}: 장부에서 {removed}행 지움")
+        if index is not None:
+            # 행 번호가 당겨졌으니 행 인덱스를 새로 만든다 (돌고 있는 앱은 어긋난 걸 알아채고 다시 만든다)
+            index.rebuild_sheet(sheet_name, _read(pool, sheet_name))
+
+    if apply:
+        log(f"{TOTALS_SHEET}: 사용자/기간 {write_totals(pool)}개")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    apply = "--apply" in args
+    before = int(args[args.index("--before") + 1]) if "--before" in args else datetime.now().year
+    secrets = load_local_secrets()
+    archive_ledgers(pool_from_secrets(secrets), before, apply,
+                    index=RowIndex(secrets.get("row_index_path", DEFAULT_PATH)))
+    if not apply:
+        print("실제로 옮기려면 --apply 를 붙여서 다시 실행하세요.")
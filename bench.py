@@ -0,0 +1,425 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import csv_import
+import perf
+from fake_gspread import FakeSpreadsheet
+from fake_redis import FakeRedis
+from ledger import FrameCache, edit_values, fix_work_rows
+from maint_index import MaintIndex, MaintIndexStorage
+from rollups import RollupStorage, Rollups
+from row_index import RowIndex
+from schema import LEDGER_SHEETS, SHEET_BANK, SHEET_MAINT, SHEET_WORK, column_names, hidden_columns, new_record
+from shared_cache import LocalShared, RedisShared, owner_stamps
+from sheet_cache import SnapshotCache
+from sheet_sync import editor_frame
+from scheduler import RequestScheduler
+from sheet_client import SheetPool
+from snapshot import HAS_ARROW, ColumnarSnapshot, SnapshotStorage
+from storage import CachedStorage, GoogleSheetsStorage
+from write_queue import make_write_queue
+
+
+# ==========================================
+# [벤치마크]
+# 가짜 구글 시트(fake_gspread)에 가상의 라이더 장부를 채워 넣고
+# 앱과 같은 저장소 구성으로 불러오기/저장/수정/통계를 화면 없이 돌린다.
+# 단계별로 걸린 시간, API 호출 수, 최대 메모리를 출력한다.
+# 새 프로세스에서 앱을 띄워 로그인 화면이 나올 때까지의 시간(첫 화면)도 잰다.
+#     python bench.py --rows 100000 --users 300
+#     python bench.py --rows 1000000 --users 500 --latency 0.3 --quota 300
+#     python bench.py --json bench.json     # 결과를 파일로 (회귀 비교용)
+#     python bench.py --replicas 3 --shared-redis   # 서버 3대가 가짜 redis 를 같이 쓸 때 시트 읽기 수
+# ==========================================
+PLATFORMS = ["쿠팡", "배민", "일반대행", "기타"]
+BANK_SOURCES = ["쿠팡", "배민", "기타"]
+MAINT_ITEMS = ["휘발유", "오일교환", "미션오일", "브레이크(앞)", "타이어(뒤)", "구동벨트"]
+
+
+def synthetic_ledgers(rows, users, seed=0, days=730):
+    # 매출기록 rows 행, 입금기록 rows/10, 정비기록 rows/20 행 (사용자 행이 섞여 있는 실제 시트처럼)
+    rng = random.Random(seed)
+    # 사용자번호 (users.py 의 사용자 목록 번호)
+    ids = [str(n) for n in range(1, users + 1)]
+    start = date.today() - timedelta(days=days)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+
+    def meta():
+        # 기록ID / 수정번호 (migrate_typed.py 로 채운 시트처럼)
+        return [f"{rng.getrandbits(48):012x}", 1]
+
+    work = [column_names(SHEET_WORK)]
+    for _ in range(rows):
+        user = rng.choice(ids)
+        revenue = rng.randrange(20, 300) * 1000
+        count = rng.randrange(5, 60)
+        work.append([user, rng.choice(dates), rng.choice(PLATFORMS), revenue, count, revenue // count, ""] + meta())
+
+    bank = [column_names(SHEET_BANK)]
+    for _ in range(rows // 10):
+        user = rng.choice(ids)
+        bank.append([user, rng.choice(dates), rng.choice(BANK_SOURCES), rng.randrange(10, 200) * 10000, ""]
+                    + meta())
+
+    maint = [column_names(SHEET_MAINT)]
+    for _ in range(rows // 20):
+        user = rng.choice(ids)
+        maint.append([user, rng.choice(dates), rng.choice(MAINT_ITEMS), rng.randrange(1, 100) * 1000,
+                      rng.randrange(1000, 80000), ""] + meta())
+
+    return ids, {SHEET_WORK: work, SHEET_BANK: bank, SHEET_MAINT: maint}
+
+
+class App:
+    # mobile_app.py 의 저장소 구성과 같다 (캐시 -> 집계표 -> 정비 인덱스 -> 쓰기 대기열)
+    def __init__(self, spreadsheet, workdir, ttl=60, snapshot=False, scheduler=None, page_size=50, shared=None):
+        self.spreadsheet = spreadsheet
+        self.shared = shared if shared is not None else LocalShared()
+        self.page_size = page_size
+        self.scheduler = scheduler
+        self.pool = SheetPool({}, "fake://bench", connect=lambda: spreadsheet, scheduler=scheduler)
+        self.cache = SnapshotCache(ttl=ttl, shared=self.shared)
+        self.frames = FrameCache()
+        self.rollups = Rollups(os.path.join(workdir, "rollups.db"), owner_stamps(self.shared, "rollup"))
+        inner = GoogleSheetsStorage(self.pool, RowIndex(os.path.join(workdir, "row_index.json")), self.shared)
+        if snapshot:
+            inner = SnapshotStorage(inner, ColumnarSnapshot(os.path.join(workdir, "snapshots")), self.pool.revision)
+        self.maint_index = MaintIndex(os.path.join(workdir, "maint_index.db"), owner_stamps(self.shared, "maint"))
+        self.storage = MaintIndexStorage(RollupStorage(CachedStorage(inner, self.cache), self.rollups), self.maint_index)
+        self.queue = make_write_queue(self.storage, self.shared, os.path.join(workdir, "write_queue.db"), flush_delay=0)
+
+    # --- mobile_app.py 의 같은 이름 함수들 ---
+    def load_data(self, sheet_name, user):
+        return self.frames.frame(sheet_name, self.storage.load_user_rows(sheet_name, user), user)
+
+    def month_views(self, sheet_name, user, df):
+        # 탭 1~3: 월 목록 + 월마다 편집기 첫 페이지 (휴대폰으로 보내는 양은 페이지만큼)
+        index = self.frames.month_index(sheet_name, user, df)
+        for month in index.months:
+            rows = index.rows(month)
+            with perf.timed("editor.page") as info:
+                page = editor_frame(rows.iloc[:self.page_size].drop(columns=hidden_columns()))
+                info["rows"] = len(page)
+                info["bytes"] = int(page.memory_usage(deep=True).sum())
+            perf.recorder.record("editor.month", 0, len(rows), int(rows.memory_usage(deep=True).sum()))
+
+    def save_new_entry(self, sheet_name, user, data_list):
+        self.queue.submit(sheet_name, user, new_record(sheet_name, [user] + data_list))
+
+    def import_csv(self, sheet_name, user, data, my_df, source="쿠팡"):
+        new_df, _, _ = csv_import.prepare(sheet_name, csv_import.read_csv(data), my_df, source)
+        self.queue.submit_many(sheet_name, user, csv_import.to_records(sheet_name, new_df, user))
+        return len(new_df)
+
+    def update_my_data(self, sheet_name, user, my_df, changes, fix_rows=None):
+        updates, inserts, expected = edit_values(sheet_name, my_df, changes, user, fix_rows)
+        self.storage.apply_changes(sheet_name, user, updates, inserts, changes[2], expected)
+
+    def wait_for_queue(self, timeout=600):
+        deadline = time.monotonic() + timeout
+        while self.queue.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    # --- 통계 탭 (탭 4) ---
+    def stats(self, owner, df_work):
+        if not self.rollups.has(owner):
+            self.rollups.rebuild(owner, df_work.values.tolist())
+        for month in self.rollups.months(owner):
+            self.rollups.total(owner, "M" + month)
+            self.rollups.days_in_month(owner, month)
+        for year in self.rollups.years(owner):
+            self.rollups.total(owner, f"Y{year}")
+            self.rollups.months_in_year(owner, year)
+
+
+    # --- 정비 현황 (탭 3) ---
+    def maint_status(self, owner, df_maint):
+        if not self.maint_index.has(owner):
+            with perf.timed("maint_index.rebuild"):
+                self.maint_index.rebuild(owner, df_maint.values.tolist())
+        with perf.timed("maint_index.status") as info:
+            info["rows"] = len(self.maint_index.projections(owner))
+
+
+# 새 파이썬 프로세스에서 mobile_app.py 를 처음 실행해 로그인 화면까지 (서버를 막 켠 것과 같음)
+# streamlit 을 불러오는 시간과 앱 스크립트 첫 실행 시간을 따로 재고, 그때 불러온 무거운 모듈을 적는다
+FIRST_PAINT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.secrets["storage"] = "sqlite"
+ready = time.perf_counter()
+at.run()
+done = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": round((ready - start) * 1000, 1),
+    "script_ms": round((done - ready) * 1000, 1),
+    "login_form": len(at.text_input) == 2 and not at.exception,
+    "heavy_modules": [m for m in ("pandas", "numpy", "gspread", "pyarrow") if m in sys.modules],
+}))
+"""
+
+
+def first_paint():
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mobile_app.py")
+    workdir = tempfile.mkdtemp(prefix="bench-paint-")
+    start = time.perf_counter()
+    try:
+        out = subprocess.run([sys.executable, "-c", FIRST_PAINT_SCRIPT, app_path], cwd=workdir,
+                             capture_output=True, text=True, timeout=300)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+    except (subprocess.TimeoutExpired, IndexError, ValueError):
+        return None
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def _work_changes(df, rng):
+    # 매출 표에서 몇 행 수정 + 한 행 삭제 + 한 행 추가 (sheet_sync.frame_changes 결과 모양)
+    view = df.drop(columns=hidden_columns())
+    labels = list(view.index)
+    picked = rng.sample(labels, min(len(labels), 4))
+    updated = {}
+    for label in picked[:-1]:
+        row = view.loc[label].to_dict()
+        row["수입"] = int(row["수입"]) + 1000
+        updated[label] = row
+    deleted = picked[-1:]
+    added = [{"날짜": date.today().isoformat(), "플랫폼": "쿠팡", "수입": 50000, "배달건수": 10, "평균단가": 0, "메모": "bench"}]
+    return updated, added, deleted
+
+
+def run(rows, users, sessions=20, entries=5, latency=0.0, per_row_latency=0.0, quota=None, seed=0, trace=True,
+        snapshot=False, use_scheduler=True, page_size=50, replicas=1, shared_redis=False):
+    rng = random.Random(seed)
+    ids, ledgers = synthetic_ledgers(rows, users, seed)
+    spreadsheet = FakeSpreadsheet(latency, per_row_latency, quota)
+    for name in LEDGER_SHEETS:
+        spreadsheet.add_worksheet(name, ledgers[name])
+    del ledgers
+    sampled = rng.sample(ids, min(sessions, len(ids)))
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    # 서버끼리 같이 쓰는 저장소: 가짜 redis 에 서버마다 따로 접속 / 아니면 서버마다 프로세스 안 (따로 논다)
+    fake_redis = FakeRedis() if shared_redis else None
+    redis_url = fake_redis.start() if fake_redis else None
+
+    def make_shared():
+        return RedisShared(redis_url) if redis_url else LocalShared()
+
+    def make_scheduler():
+        # 앱처럼 시트 한도에 맞춘 스케줄러 (한도가 없으면 충분히 큰 값 -> 합치기/재시도만)
+        if not use_scheduler:
+            return None
+        return RequestScheduler(quota or 100000, quota or 100000)
+
+    app = App(spreadsheet, workdir, snapshot=snapshot, scheduler=make_scheduler(), page_size=page_size,
+              shared=make_shared())
+    perf.recorder.reset()
+    report = {
+        "rows": rows, "users": users, "sessions": len(sampled), "latency": latency,
+        "per_row_latency": per_row_latency, "quota": quota, "snapshot": snapshot, "phases": [], "errors": 0,
+        "scheduler": use_scheduler, "page_size": page_size, "replicas": replicas, "shared_redis": shared_redis,
+    }
+    frames = {}
+
+    def phase(name, fn):
+        before = sum(spreadsheet.calls.values())
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        if trace:
+            tracemalloc.stop()
+        report["phases"].append({
+            "phase": name,
+            "wall_s": round(wall, 3),
+            "per_session_ms": round(wall / len(sampled) * 1000, 1),
+            "api_calls": sum(spreadsheet.calls.values()) - before,
+            "peak_mb": round(peak / 2 ** 20, 1),
+        })
+
+    def load_all(target=None):
+        # 앱처럼 실패한 시트는 건너뛰고 오류 수만 센다 (할당량 초과 등)
+        for user in sampled:
+            for name in LEDGER_SHEETS:
+                try:
+                    frames[(name, user)] = (target or app).load_data(name, user)
+                except Exception:
+                    report["errors"] += 1
+
+    def save_entries():
+        for user in sampled:
+            for _ in range(entries):
+                revenue, count = rng.randrange(20, 300) * 1000, rng.randrange(5, 60)
+                app.save_new_entry(SHEET_WORK, user, [date.today(), "쿠팡", revenue, count, revenue // count, ""])
+        app.wait_for_queue()
+
+    def import_month():
+        # 정산 파일 한 달 치 (배달 한 건 = 한 줄, 하루 20~40건) -> 하루 합계 30행을 한 번에
+        start = date.today().replace(day=1) - timedelta(days=30)
+        for user in sampled:
+            lines = ["주문일시,배달료"]
+            for d in range(30):
+                day = (start + timedelta(days=d)).isoformat()
+                lines += [f"{day} 12:00,{rng.randrange(25, 60) * 100}" for _ in range(rng.randrange(20, 40))]
+            try:
+                df = app.load_data(SHEET_WORK, user)
+                app.import_csv(SHEET_WORK, user, "\n".join(lines).encode("utf-8"), df)
+            except Exception:
+                report["errors"] += 1
+        app.wait_for_queue()
+
+    def update_rows():
+        for user in sampled:
+            try:
+                df = app.load_data(SHEET_WORK, user)
+                if len(df):
+                    app.update_my_data(SHEET_WORK, user, df, _work_changes(df, rng), fix_work_rows)
+            except Exception:
+                report["errors"] += 1
+
+    def month_views():
+        for user in sampled:
+            for name in LEDGER_SHEETS:
+                if (name, user) in frames:
+                    app.month_views(name, user, frames[(name, user)])
+
+    def stats():
+        for user in sampled:
+            if (SHEET_WORK, user) in frames:
+                app.stats(user, frames[(SHEET_WORK, user)])
+
+    def maint_status():
+        for user in sampled:
+            if (SHEET_MAINT, user) in frames:
+                app.maint_status(user, frames[(SHEET_MAINT, user)])
+
+    phase("load (cold: index build)", load_all)
+    phase("load (cached)", load_all)
+    app.cache.invalidate()
+    phase("load (row index)", load_all)
+    phase("month views (index build)", month_views)
+    phase("month views (reused)", month_views)
+    phase("stats (first: rollup build)", stats)
+    phase("stats (rollups)", stats)
+    phase("maint status (first: index build)", maint_status)
+    phase("maint status (index)", maint_status)
+    phase("save (write queue)", save_entries)
+    phase("import (csv, 1 month)", import_month)
+    phase("update (edit/delete/add)", update_rows)
+
+    if replicas > 1:
+        # 같은 시트를 보는 서버 여러 대: 한 대에서 고친 뒤 모두 다시 불러오기
+        others = []
+        for n in range(1, replicas):
+            os.makedirs(os.path.join(workdir, f"replica{n}"))
+            others.append(App(spreadsheet, os.path.join(workdir, f"replica{n}"), snapshot=snapshot,
+                              scheduler=make_scheduler(), page_size=page_size, shared=make_shared()))
+
+        def load_others():
+            for other in others:
+                load_all(other)
+
+        def update_then_load_all():
+            update_rows()
+            load_all()
+            load_others()
+
+        phase(f"load (other {replicas - 1} servers)", load_others)
+        phase(f"update + load ({replicas} servers)", update_then_load_all)
+
+    report["cache"] = app.cache.stats()
+    report["scheduler_stats"] = app.scheduler.stats() if app.scheduler else None
+
+    # 서버를 다시 켠 것처럼 메모리 캐시를 모두 비우고 (디스크의 인덱스/스냅샷은 그대로) 다시 불러오기
+    # (공용 redis 는 그대로 -> 다른 서버가 불러 둔 것을 쓴다)
+    app = App(spreadsheet, workdir, snapshot=snapshot, scheduler=make_scheduler(), page_size=page_size,
+              shared=make_shared())
+    phase("load (restart)", load_all)
+
+    report["api_calls_by_op"] = dict(spreadsheet.calls)
+    report["quota_errors"] = spreadsheet.quota_errors
+    report["stages"] = perf.recorder.summary()
+    report["first_paint"] = first_paint()
+    if fake_redis:
+        report["redis_calls"] = dict(fake_redis.calls)
+        fake_redis.stop()
+    return report
+
+
+def print_report(report):
+    print(f"행 {report['rows']:,} / 사용자 {report['users']} / 세션 {report['sessions']} "
+          f"(지연 {report['latency']}s + 행당 {report['per_row_latency']}s, 한도 {report['quota'] or '-'}/분"
+          f"{', 스냅샷' if report['snapshot'] else ''}{'' if report['scheduler'] else ', 스케줄러 끔'}"
+          f"{', 서버 %d대' % report['replicas'] if report['replicas'] > 1 else ''}"
+          f"{', 공용 redis' if report['shared_redis'] else ''})")
+    print(f"{'단계':<30}{'시간(s)':>10}{'세션당(ms)':>12}{'API':>8}{'최대MB':>9}")
+    for p in report["phases"]:
+        print(f"{p['phase']:<30}{p['wall_s']:>10}{p['per_session_ms']:>12}{p['api_calls']:>8}{p['peak_mb']:>9}")
+    print("API 호출:", ", ".join(f"{op} {n}" for op, n in sorted(report["api_calls_by_op"].items())))
+    if report["quota_errors"] or report["errors"]:
+        print(f"할당량 초과(429): {report['quota_errors']}회, 실패한 불러오기/수정: {report['errors']}회")
+    sched = report["scheduler_stats"]
+    if sched:
+        print(f"스케줄러: 합친 읽기 {sched['coalesced']}회, 재시도 {sched['retries']}회, 속도 조절 {sched['throttled']}회")
+    stages = {s["stage"]: s for s in report["stages"]}
+    if "editor.page" in stages:
+        page, month = stages["editor.page"], stages["editor.month"]
+        print(f"편집기 표 (월 평균): 한 달 {month['rows'] / month['count']:.0f}행 {month['bytes'] / month['count'] / 1024:.1f}KB"
+              f" -> 한 페이지 {page['rows'] / page['count']:.0f}행 {page['bytes'] / page['count'] / 1024:.1f}KB"
+              f" (페이지 {report['page_size']}행)")
+    paint = report["first_paint"]
+    if paint:
+        print(f"첫 화면 (새 프로세스 -> 로그인 화면): {paint['total_ms']:.0f} ms "
+              f"(streamlit {paint['streamlit_ms']:.0f} ms + 앱 첫 실행 {paint['script_ms']:.0f} ms), "
+              f"불러온 모듈: {', '.join(paint['heavy_modules']) or '없음'}"
+              f"{'' if paint['login_form'] else ' [로그인 화면 안 나옴]'}")
+    else:
+        print("첫 화면: 측정 실패 (streamlit 이 없거나 앱 실행 오류)")
+    cache = report["cache"]
+    print(f"캐시 적중률 {cache['hit_rate']:.0%} ({cache['hits'] + cache['shared_hits']}/"
+          f"{cache['hits'] + cache['shared_hits'] + cache['misses']}, 다른 서버가 불러 둔 것 {cache['shared_hits']})")
+    if report.get("redis_calls"):
+        print("redis 명령:", ", ".join(f"{op} {n}" for op, n in sorted(report["redis_calls"].items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가짜 시트로 앱 저장 경로 벤치마크")
+    parser.add_argument("--rows", type=int, default=10000, help="매출기록 행 수 (입금 1/10, 정비 1/20)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=20, help="돌려볼 사용자 수")
+    parser.add_argument("--entries", type=int, default=5, help="세션당 새로 저장할 행 수")
+    parser.add_argument("--latency", type=float, default=0.0, help="API 호출당 지연(초)")
+    parser.add_argument("--per-row-latency", type=float, default=0.0, help="주고받는 행당 지연(초)")
+    parser.add_argument("--quota", type=int, default=None, help="분당 API 호출 한도")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-scheduler", action="store_true", help="요청 스케줄러 없이 (비교용)")
+    parser.add_argument("--page-size", type=int, default=50, help="편집기 한 페이지 행 수")
+    parser.add_argument("--no-trace", action="store_true", help="메모리 측정 끄기 (더 빠름)")
+    parser.add_argument("--snapshot", action="store_true", help="로컬 Arrow 스냅샷 켜기 (pyarrow 필요)")
+    parser.add_argument("--replicas", type=int, default=1, help="같은 시트를 보는 서버 수")
+    parser.add_argument("--shared-redis", action="store_true", help="서버들이 가짜 redis 를 공용 캐시로 같이 씀")
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    if args.snapshot and not HAS_ARROW:
+        parser.error("--snapshot 은 pyarrow 가 필요합니다")
+    result = run(args.rows, args.users, args.sessions, args.entries, args.latency,
+                 args.per_row_latency, args.quota, args.seed, not args.no_trace, args.snapshot,
+                 not args.no_scheduler, args.page_size, args.replicas, args.shared_redis)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,45 @@
+import pytest
+
+import bench
+from fake_gspread import FakeSpreadsheet
+from fake_redis import FakeRedis
+from schema import LEDGER_SHEETS
+
+
+# ==========================================
+# [테스트 공용]
+# 네트워크 없이 가짜 시트(fake_gspread)와 가짜 redis(fake_redis)로 앱의 저장 경로를 돌린다.
+#     pip install pytest && python -m pytest -q
+# (이 파일이 저장소 맨 위에 있어서 tests/ 에서도 앱 모듈을 그대로 import 한다)
+# ==========================================
+@pytest.fixture
+def sheet():
+    # (사용자번호 목록, 가짜 스프레드시트) - 매출 300행, 사용자 10명
+    ids, ledgers = bench.synthetic_ledgers(300, 10, seed=1)
+    spreadsheet = FakeSpreadsheet()
+    for name in LEDGER_SHEETS:
+        spreadsheet.add_worksheet(name, ledgers[name])
+    return ids, spreadsheet
+
+
+@pytest.fixture
+def redis_url():
+    fake = FakeRedis()
+    yield fake.start()
+    fake.stop()
+
+
+def lose_first_response(worksheet, method="append_rows"):
+    # 첫 호출은 시트에 들어가지만 응답이 끊긴다 (ConnectionError)
+    original = getattr(worksheet, method)
+    calls = []
+
+    def lossy(*args, **kwargs):
+        result = original(*args, **kwargs)
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("응답 없이 끊김")
+        return result
+
+    setattr(worksheet, method, lossy)
+    return calls
@@ -0,0 +1,145 @@
+import io
+import re
+
+import pandas as pd
+
+import perf
+from ledger import average_price
+from schema import SHEET_BANK, SHEET_WORK, column_names, data_columns, new_record, parse_frame
+
+
+# ==========================================
+# [CSV 한꺼번에 가져오기]
+# 쿠팡/배민 정산 내역 CSV 나 이 앱에서 내려받은 CSV 를 읽어서 장부 행으로 바꾼다.
+# - 컬럼 이름은 여러 표기를 받아준다 (COLUMN_ALIASES)
+# - 검사/변환은 행마다 돌지 않고 컬럼 단위로 한 번에
+# - 건수 컬럼이 없는 정산 파일은 한 줄 = 배달 한 건으로 보고 날짜별로 합친다
+# - (날짜, 플랫폼, 금액)이 이미 장부나 전송 대기열에 있으면 빼고 넣는다
+# 만든 행은 쓰기 대기열에 한 번에 넣어서 append_rows 한 번으로 시트에 간다.
+# ==========================================
+IMPORT_SHEETS = {
+    # 시트: (날짜, 플랫폼/입금처, 금액, 건수) 컬럼
+    SHEET_WORK: ("날짜", "플랫폼", "수입", "배달건수"),
+    SHEET_BANK: ("입금날짜", "입금처", "입금액", None),
+}
+
+COLUMN_ALIASES = {
+    "날짜": ["날짜", "일자", "배달일", "배달일자", "수행일", "수행일자", "운행일", "정산일", "정산일자", "주문일시", "완료일시"],
+    "입금날짜": ["입금날짜", "입금일", "입금일자", "지급일", "지급일자", "정산일", "정산일자", "날짜", "일자"],
+    "플랫폼": ["플랫폼", "구분", "서비스"],
+    "입금처": ["입금처", "플랫폼", "구분"],
+    "수입": ["수입", "배달료", "배달수수료", "정산금액", "지급액", "지급금액", "금액", "합계"],
+    "입금액": ["입금액", "지급액", "지급금액", "정산금액", "금액"],
+    "배달건수": ["배달건수", "건수", "완료건수", "수행건수", "배달 건수"],
+    "메모": ["메모", "비고"],
+}
+
+_NOT_DIGIT = re.compile(r"[^\d.\-]")
+
+
+def read_csv(data):
+    # data: 올린 파일 내용 (bytes). 엑셀에서 저장한 CSV 는 cp949 인 경우가 많다
+    for encoding in ("utf-8-sig", "cp949"):
+        try:
+            return pd.read_csv(io.BytesIO(data), dtype=str, encoding=encoding, skipinitialspace=True)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("CSV 글자 인코딩을 알 수 없습니다 (UTF-8 또는 CP949 로 저장해 주세요)")
+
+
+def _rename(raw, sheet_name):
+    # 파일 컬럼 -> 장부 컬럼 (앞쪽 별칭부터, 이미 쓴 파일 컬럼은 다시 안 씀)
+    present = {str(c).strip(): c for c in raw.columns}
+    picked = {}
+    for name in column_names(sheet_name):
+        for alias in COLUMN_ALIASES.get(name, [name]):
+            if alias in present and present[alias] not in picked.values():
+                picked[name] = present[alias]
+                break
+    return raw[list(picked.values())].set_axis(list(picked), axis=1)
+
+
+def _number(col):
+    text = col.fillna("").astype(str).str.replace(_NOT_DIGIT, "", regex=True)
+    return pd.to_numeric(text, errors="coerce")
+
+
+def _key(df, sheet_name):
+    # 중복 비교용 (날짜, 플랫폼, 금액)
+    date_col, source_col, amount_col, _ = IMPORT_SHEETS[sheet_name]
+    return pd.MultiIndex.from_arrays([
+        df[date_col].astype(str), df[source_col].astype(str), pd.to_numeric(df[amount_col], errors="coerce"),
+    ])
+
+
+def prepare(sheet_name, raw, existing, default_source="기타"):
+    # raw: read_csv() 결과, existing: 장부에 있는 내 행 + 전송 대기 행 (장부 컬럼 이름의 표)
+    # default_source: 파일에 플랫폼/입금처 컬럼이 없을 때 넣을 값
+    # 반환: (새로 넣을 표 (사용자번호/관리용 칸 뺀 화면 컬럼), 중복이라 뺀 행 수, 잘못된 행 [(줄, 이유)])
+    date_col, source_col, amount_col, count_col = IMPORT_SHEETS[sheet_name]
+    with perf.timed("import.prepare") as info:
+        df = _rename(raw, sheet_name)
+        missing = [c for c in (date_col, amount_col) if c not in df.columns]
+        if missing:
+            raise ValueError(f"필요한 컬럼이 없습니다: {', '.join(missing)}")
+        # 파일의 줄 번호 (헤더가 1줄)
+        df.index = pd.RangeIndex(2, len(df) + 2)
+
+        dates = parse_frame(df[[date_col]].copy(), sheet_name)[date_col]
+        amount = _number(df[amount_col])
+        # 잘못된 이유는 처음 걸린 것 하나만
+        bad = pd.Series("", index=df.index)
+
+        def reject(mask, reason):
+            return bad.mask((bad == "") & mask, reason)
+
+        bad = reject(~dates.str.fullmatch(r"\d{4}-\d{2}-\d{2}"), "날짜를 읽을 수 없음")
+        bad = reject(amount.isna() | (amount < 0), "금액이 숫자가 아님")
+
+        out = pd.DataFrame({date_col: dates, amount_col: amount}, index=df.index)
+        out[source_col] = df[source_col].fillna("").str.strip() if source_col in df.columns else ""
+        out[source_col] = out[source_col].mask(out[source_col] == "", default_source)
+        out["메모"] = df["메모"].fillna("") if "메모" in df.columns else ""
+
+        per_delivery = False
+        if count_col:
+            if count_col in df.columns:
+                count = _number(df[count_col])
+                bad = reject(count.isna() | (count < 0), "건수가 숫자가 아님")
+                out[count_col] = count
+            else:
+                per_delivery = True
+
+        errors = [(line, reason) for line, reason in bad[bad != ""].items()]
+        out = out[bad == ""]
+
+        if per_delivery:
+            # 정산 파일: 배달 한 건 = 한 줄 -> (날짜, 플랫폼)별 하루 합계
+            out = (out.groupby([date_col, source_col], sort=True)
+                   .agg(**{amount_col: (amount_col, "sum"), count_col: (amount_col, "size")})
+                   .reset_index())
+            out["메모"] = "정산파일"
+
+        out[amount_col] = out[amount_col].round().astype("int64")
+        if count_col:
+            out[count_col] = out[count_col].round().astype("int64")
+            out["평균단가"] = average_price(out[amount_col], out[count_col])
+
+        # 파일 안의 중복과 이미 있는 행은 뺀다
+        keys = _key(out, sheet_name)
+        fresh = ~keys.duplicated()
+        if existing is not None and len(existing):
+            fresh &= ~keys.isin(_key(existing, sheet_name))
+        duplicates = int((~fresh).sum())
+        out = out[fresh]
+
+        view_cols = [c for c in data_columns(sheet_name) if c in out.columns]
+        out = out[view_cols].reset_index(drop=True)
+        info["rows"] = len(out)
+    return out, duplicates, errors
+
+
+def to_records(sheet_name, df, user):
+    # prepare() 결과 -> 저장할 행들 (사용자번호, 기록ID/수정번호를 붙인 저장 형식)
+    full = df.reindex(columns=data_columns(sheet_name), fill_value="")
+    return [new_record(sheet_name, [user] + values) for values in full.values.tolist()]
@@ -0,0 +1,91 @@
+import io
+import zipfile
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl 이 없으면 CSV 로만 내보낸다
+    openpyxl = None
+
+import perf
+from ledger import user_frame
+from schema import column_names, hidden_columns
+
+
+# ==========================================
+# [기록 내보내기 (여러 달 / 전체)]
+# 저장소에서 날짜순으로 조금씩(CHUNK_ROWS 행) 읽어서 바로 파일에 쓴다 (전체 기록을 한꺼번에 표로 만들지 않는다).
+# 다 만든 파일은 bytes 로 돌려준다 (st.download_button 이 어차피 전부 메모리에 올린다).
+# 파일은 다운로드 버튼을 눌렀을 때만 만든다 (st.download_button 에 함수로 넘김 -> 화면 리런과 따로 돈다).
+#   - CSV : 장부 하나면 CSV 한 개, 여러 개면 장부마다 CSV 를 묶은 zip
+#   - 엑셀: 장부마다 시트 하나인 xlsx (openpyxl 쓰기 전용 모드)
+#     pip install openpyxl   (없으면 엑셀만 꺼진다)
+# ==========================================
+HAS_XLSX = openpyxl is not None
+CHUNK_ROWS = 2000
+
+MIME = {
+    "csv": "text/csv",
+    "zip": "application/zip",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _view_columns(sheet_name):
+    return [c for c in column_names(sheet_name) if c not in hidden_columns()]
+
+
+def iter_frames(storage, sheet_name, user, start=None, end=None):
+    # 내 행만, 화면에 보이는 컬럼으로 CHUNK_ROWS 행씩 (날짜순)
+    for rows in storage.iter_user_rows(sheet_name, user, start, end, CHUNK_ROWS):
+        df = user_frame(sheet_name, rows, user)
+        if not df.empty:
+            yield df[_view_columns(sheet_name)]
+
+
+def _write_csv(storage, sheet_name, user, start, end, out):
+    # out: 바이너리 파일. 엑셀에서 한글이 안 깨지게 BOM 을 붙인다
+    out.write(b"\xef\xbb\xbf")
+    header = True
+    for df in iter_frames(storage, sheet_name, user, start, end):
+        out.write(df.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+    if header:
+        # 기록이 없어도 헤더는 남긴다
+        out.write((",".join(_view_columns(sheet_name)) + "\n").encode("utf-8"))
+
+
+def _write_xlsx(storage, sheet_names, user, start, end, out):
+    book = openpyxl.Workbook(write_only=True)
+    for sheet_name in sheet_names:
+        ws = book.create_sheet(sheet_name)
+        ws.append(_view_columns(sheet_name))
+        for df in iter_frames(storage, sheet_name, user, start, end):
+            # 빈 주행거리(<NA>) 같은 값은 빈 칸으로
+            for row in df.astype(object).where(df.notna(), None).values.tolist():
+                ws.append(row)
+    book.save(out)
+
+
+def file_kind(sheet_names, fmt):
+    # 반환: 확장자 (csv / zip / xlsx)
+    if fmt == "xlsx":
+        return "xlsx"
+    return "csv" if len(sheet_names) == 1 else "zip"
+
+
+def build_export(storage, sheet_names, user, fmt="csv", start=None, end=None):
+    # 반환: 파일 내용 (bytes)
+    kind = file_kind(sheet_names, fmt)
+    out = io.BytesIO()
+    with perf.timed(f"export.{kind}") as info:
+        if kind == "xlsx":
+            _write_xlsx(storage, sheet_names, user, start, end, out)
+        elif kind == "csv":
+            _write_csv(storage, sheet_names[0], user, start, end, out)
+        else:
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+                for sheet_name in sheet_names:
+                    with archive.open(f"{sheet_name}.csv", "w") as member:
+                        _write_csv(storage, sheet_name, user, start, end, member)
+        info["bytes"] = out.tell()
+    return out.getvalue()
@@ -0,0 +1,245 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import gspread
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+
+# ==========================================
+# [가짜 구글 시트 - 벤치마크용]
+# 실제 스프레드시트 없이 앱의 저장 경로를 돌려보려고 만든 메모리 속 흉내.
+# 앱이 쓰는 메서드만 있다: get_all_values / batch_get / append_row(s) /
+# batch_update / update, 그리고 스프레드시트의 batch_update (칸 수정/행 삭제/끝에 추가, 한 번에 반영)와
+# Drive 파일 정보(client.http_client.request 로 version 만), 워크시트 목록/추가(연도별 보관용).
+# 호출마다 지연 시간을 흉내 내고, 분당 읽기/쓰기 한도를 (따로) 넘으면 429 오류를 낸다.
+# Drive API 는 시트 한도에 안 센다.
+# ==========================================
+class _Response:
+    status_code = 429
+    text = "Quota exceeded (fake)"
+
+
+class _DriveResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class _FakeClient:
+    # gspread Client 중 Drive 파일 정보 요청만 (sheet_client.drive_version)
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self.http_client = self
+
+    def request(self, method, url, params=None):
+        return _DriveResponse(self.spreadsheet.drive_metadata())
+
+
+class QuotaExceeded(Exception):
+    # write_queue.is_quota_error 가 알아보도록 response.status_code = 429
+    def __init__(self):
+        super().__init__(_Response.text)
+        self.response = _Response()
+
+
+_A1_RANGE = re.compile(r"^([A-Z]+\d+)(?::([A-Z]+\d+))?$")
+
+
+def _grid(a1):
+    # "A5:H7" -> (5, 1, 7, 8)
+    match = _A1_RANGE.match(a1.split("!")[-1].replace("'", ""))
+    if not match:
+        raise ValueError(f"지원하지 않는 범위: {a1}")
+    start = a1_to_rowcol(match.group(1))
+    end = a1_to_rowcol(match.group(2) or match.group(1))
+    return start[0], start[1], end[0], end[1]
+
+
+def _cell_values(row):
+    # updateCells/appendCells 의 {"values": [{"userEnteredValue": {...}}]} -> 칸 글자들
+    out = []
+    for cell in row["values"]:
+        value = next(iter(cell.get("userEnteredValue", {}).values()), "")
+        out.append(str(int(value)) if isinstance(value, float) and value.is_integer() else str(value))
+    return out
+
+
+def _trim(rows):
+    # 실제 API처럼 끝쪽 빈 칸과 빈 행은 돌려주지 않는다
+    out = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        out.append(row)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+# 읽기 한도에 세는 호출 (나머지는 쓰기)
+READ_OPS = {"get_all_values", "batch_get", "worksheet", "worksheets"}
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency=0.0, per_row_latency=0.0, quota_per_minute=None):
+        self.latency = latency
+        self.per_row_latency = per_row_latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = Counter()
+        self.quota_errors = 0
+        # 쓰기마다 1씩 올라가는 번호 (Drive 파일 version 흉내)
+        self.id = "fake-spreadsheet"
+        self.client = _FakeClient(self)
+        self.version = 0
+        self._recent = {"read": deque(), "write": deque()}
+        self._sheets = {}
+        self._lock = threading.RLock()
+
+    def _call(self, op, rows=0):
+        with self._lock:
+            now = time.monotonic()
+            if self.quota_per_minute is not None and op != "drive.files.get":
+                recent = self._recent["read" if op in READ_OPS else "write"]
+                while recent and now - recent[0] >= 60:
+                    recent.popleft()
+                if len(recent) >= self.quota_per_minute:
+                    self.quota_errors += 1
+                    raise QuotaExceeded()
+                recent.append(now)
+            self.calls[op] += 1
+        delay = self.latency + self.per_row_latency * rows
+        if delay:
+            time.sleep(delay)
+
+    def _touch(self):
+        with self._lock:
+            self.version += 1
+
+    def drive_metadata(self):
+        self._call("drive.files.get")
+        with self._lock:
+            return {"version": str(self.version)}
+
+    def add_worksheet(self, title, rows=None, cols=None, index=None):
+        # rows: 실제 API 처럼 크기(정수)면 빈 시트, 벤치마크에서 행 리스트를 넘기면 그 행으로 채운다
+        data = rows if isinstance(rows, list) else []
+        if not isinstance(rows, list):
+            self._call("add_worksheet")
+        with self._lock:
+            if title in self._sheets:
+                raise ValueError(f"이미 있는 시트: {title}")
+            ws = FakeWorksheet(self, len(self._sheets), title, data)
+            self._sheets[title] = ws
+            return ws
+
+    def worksheets(self):
+        self._call("worksheets")
+        with self._lock:
+            return list(self._sheets.values())
+
+    def worksheet(self, title):
+        self._call("worksheet")
+        with self._lock:
+            if title not in self._sheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return self._sheets[title]
+
+    def batch_update(self, body):
+        # 앱이 쓰는 요청만: updateCells / deleteDimension / appendCells (순서대로, 한 번에)
+        requests = body.get("requests", [])
+        self._call("spreadsheet.batch_update", len(requests))
+        with self._lock:
+            by_id = {ws.id: ws for ws in self._sheets.values()}
+            for request in requests:
+                if "updateCells" in request:
+                    cells = request["updateCells"]
+                    grid = cells["range"]
+                    a1 = rowcol_to_a1(grid["startRowIndex"] + 1, grid["startColumnIndex"] + 1)
+                    by_id[grid["sheetId"]]._write(a1, [_cell_values(row) for row in cells["rows"]])
+                elif "appendCells" in request:
+                    cells = request["appendCells"]
+                    by_id[cells["sheetId"]]._extend([_cell_values(row) for row in cells["rows"]])
+                else:
+                    grid = request["deleteDimension"]["range"]
+                    ws = by_id[grid["sheetId"]]
+                    del ws._rows[grid["startIndex"]:grid["endIndex"]]
+            self._touch()
+        return {"replies": [{} for _ in requests]}
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self._rows = [[str(v) for v in row] for row in rows]
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def get_all_values(self, **kwargs):
+        self.spreadsheet._call("get_all_values", len(self._rows))
+        with self.spreadsheet._lock:
+            return _trim(self._rows)
+
+    def batch_get(self, ranges, **kwargs):
+        with self.spreadsheet._lock:
+            result = []
+            for a1 in ranges:
+                r1, c1, r2, c2 = _grid(a1)
+                result.append(_trim([row[c1 - 1:c2] for row in self._rows[r1 - 1:r2]]))
+        self.spreadsheet._call("batch_get", sum(len(r) for r in result))
+        return result
+
+    def _extend(self, rows):
+        # 마지막으로 값이 있는 행 다음에 붙인다. 반환: 시작 행 번호
+        last = len(self._rows)
+        while last and not any(self._rows[last - 1]):
+            last -= 1
+        del self._rows[last:]
+        self._rows.extend([str(v) for v in row] for row in rows)
+        return last + 1
+
+    def _append(self, op, rows):
+        self.spreadsheet._call(op, len(rows))
+        with self.spreadsheet._lock:
+            start = self._extend(rows)
+            end = start + len(rows) - 1
+            width = max((len(row) for row in rows), default=1)
+            self.spreadsheet._touch()
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{rowcol_to_a1(end, width)}"}}
+
+    def append_row(self, values, **kwargs):
+        return self._append("append_row", [values])
+
+    def append_rows(self, values, **kwargs):
+        return self._append("append_rows", values)
+
+    def _write(self, a1, values):
+        r1, c1, _, _ = _grid(a1)
+        for offset, row in enumerate(values):
+            r = r1 - 1 + offset
+            while len(self._rows) <= r:
+                self._rows.append([])
+            target = self._rows[r]
+            target.extend([""] * (c1 - 1 + len(row) - len(target)))
+            target[c1 - 1:c1 - 1 + len(row)] = [str(v) for v in row]
+
+    def batch_update(self, data, **kwargs):
+        self.spreadsheet._call("batch_update", sum(len(d["values"]) for d in data))
+        with self.spreadsheet._lock:
+            for d in data:
+                self._write(d["range"], d["values"])
+            self.spreadsheet._touch()
+
+    def update(self, range_name=None, values=None, **kwargs):
+        self.spreadsheet._call("update", len(values or []))
+        with self.spreadsheet._lock:
+            self._write(range_name, values or [])
+            self.spreadsheet._touch()
@@ -0,0 +1,133 @@
+import argparse
+import socketserver
+import threading
+from collections import Counter
+
+from shared_cache import LocalShared, RedisError, read_reply
+
+
+# ==========================================
+# [가짜 redis - 벤치마크/로컬 확인용]
+# 공용 저장소(shared_cache.RedisShared)가 쓰는 명령만 흉내 내는 작은 RESP 서버.
+# 값은 프로세스 안 저장소(LocalShared)에 bytes 로 둔다 (db 번호는 무시, 하나만).
+#     python fake_redis.py --port 6379     # 띄워 두고 secrets 에 shared_cache = "redis://localhost:6379/0"
+# 벤치마크는 FakeRedis().start() 로 같은 프로세스 안에서 띄운다.
+# ==========================================
+def _reply(value):
+    if isinstance(value, RedisError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if value is True:
+        return b"+OK\r\n"
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, (list, set)):
+        return b"*%d\r\n" % len(value) + b"".join(_reply(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _bulk(value):
+    # INCR 로 만든 값도 GET 에서는 문자열로
+    return b"%d" % value if isinstance(value, int) else value
+
+
+class FakeRedis:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.store = LocalShared()
+        self.calls = Counter()
+        self._server = None
+        self.host = host
+        self.port = port
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}/0"
+
+    def execute(self, args):
+        op, args = args[0].decode("utf-8").upper(), args[1:]
+        self.calls[op] += 1
+        store = self.store
+        key = args[0].decode("utf-8") if args else None
+        if op == "PING":
+            return "PONG"
+        if op in ("AUTH", "SELECT"):
+            return True
+        if op == "GET":
+            return _bulk(store.get(key))
+        if op == "MGET":
+            return [_bulk(v) for v in store.mget([a.decode("utf-8") for a in args])]
+        if op == "SET":
+            options = [a.decode("utf-8").upper() for a in args[2:]]
+            ttl = int(options[options.index("PX") + 1]) / 1000 if "PX" in options else None
+            return True if store.set(key, args[1], ttl, nx="NX" in options) else None
+        if op == "DEL":
+            store.delete(key)
+            return 1
+        if op == "PEXPIRE":
+            return int(store.expire(key, int(args[1]) / 1000))
+        if op == "INCR":
+            return store.incr(key)
+        if op == "RPUSH":
+            return store.rpush(key, list(args[1:]))
+        if op == "LRANGE":
+            return [_bulk(v) for v in store.lrange(key, int(args[1]), int(args[2]))]
+        if op == "LTRIM":
+            store.ltrim(key, int(args[1]), int(args[2]))
+            return True
+        if op == "LREM":
+            # count 는 1 만 (shared_cache 가 그렇게만 쓴다)
+            return store.lrem_many(key, [args[2]])
+        if op == "LLEN":
+            return store.llen(key)
+        if op == "SADD":
+            store.sadd(key, args[1])
+            return 1
+        if op == "SREM":
+            store.srem(key, args[1])
+            return 1
+        if op == "SMEMBERS":
+            return store.smembers(key)
+        return RedisError(f"ERR unknown command '{op}'")
+
+    def start(self):
+        # 백그라운드 스레드로 띄운다. 반환: 접속 주소 (redis://...)
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        args = read_reply(self.rfile)
+                    except ConnectionError:
+                        return
+                    self.wfile.write(_reply(fake.execute(args)))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 확인용 가짜 redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    fake = FakeRedis(args.host, args.port)
+    print(f"{fake.start()} 에서 기다리는 중 (Ctrl+C 로 끝)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import perf
+from schema import (RECORD_ID, USER_KEY, VERSION, canonical_row, column_names, date_column, new_record_id,
+                    parse_frame, row_key)
+
+
+# ==========================================
+# [장부 표 변환]
+# 저장소에서 읽은 행 -> 내 DataFrame, 표 편집 내용 -> 저장할 행 값.
+# 화면(mobile_app.py)과 벤치마크(bench.py)가 같은 코드를 쓰도록 여기 모아 둔다.
+# ==========================================
+def user_frame(sheet_name, rows, user):
+    # rows: [(행 id, 값 리스트)], user: 사용자번호 ("17") -> 내 행만 담은 DataFrame (index = 행 id)
+    required_cols = column_names(sheet_name)
+    if not rows:
+        return parse_frame(pd.DataFrame(columns=required_cols), sheet_name)
+
+    with perf.timed("pandas.load_frame") as info:
+        # index = 저장소의 행 id (시트는 실제 행 번호) -> 수정/삭제할 때 그 행만 고친다
+        df = pd.DataFrame([r for _, r in rows], index=[n for n, _ in rows], columns=required_cols)
+
+        # 숫자/날짜 변환은 여기서 한 번만 (컬럼 단위). 사용자번호도 정수 컬럼 -> 정수 하나만 비교
+        df = parse_frame(df, sheet_name)
+        my_data = df[df[USER_KEY] == int(user)]
+        info["rows"] = len(my_data)
+        return my_data
+
+
+# --- 수정 내용 저장 전 계산 ---
+def average_price(revenue, count):
+    return (revenue / count.where(count > 0)).fillna(0).astype(int)
+
+
+def fix_work_rows(df):
+    # 평균단가는 수입/건수로 다시 계산
+    df['평균단가'] = average_price(df['수입'], df['배달건수'])
+    return df
+
+
+def edit_values(sheet_name, my_df, changes, user, fix_rows=None):
+    # changes: sheet_sync.frame_changes() 결과
+    # 반환: (수정 {행 id: 값}, 추가 [값], 확인용 {행 id: schema.row_key})
+    updated, added, deleted = changes
+    columns = list(my_df.columns)
+
+    with perf.timed("pandas.edit_prep") as info:
+        changed = parse_frame(pd.DataFrame(list(updated.values()) + added, columns=columns[1:]), sheet_name)
+        if fix_rows is not None and not changed.empty:
+            changed = fix_rows(changed)
+        # 고친 행은 기록ID 그대로 수정번호 +1, 새 행(과 기록ID 없는 예전 행)은 기록ID 를 새로 정한다
+        old = my_df.loc[list(updated), [RECORD_ID, VERSION]]
+        ids = old[RECORD_ID].tolist() + [""] * len(added)
+        changed[RECORD_ID] = [rid or new_record_id() for rid in ids]
+        changed[VERSION] = (old[VERSION] + 1).tolist() + [1] * len(added)
+        changed.insert(0, USER_KEY, int(user))
+        values = [canonical_row(sheet_name, row) for row in changed[columns].values.tolist()]
+        info["rows"] = len(values)
+
+    updates = dict(zip(updated.keys(), values[:len(updated)]))
+    inserts = values[len(updated):]
+
+    # 기록ID/수정번호가 불러올 때와 같은지 먼저 확인 (다른 곳에서 고친 걸 덮어쓰지 않도록)
+    expected = {r: row_key(sheet_name, my_df.loc[r, columns].tolist()) for r in list(updated) + list(deleted)}
+    return updates, inserts, expected
+
+
+# --- 월별 인덱스 ---
+class MonthIndex:
+    # 날짜 최신순으로 한 번 정렬해 두고 "YYYY-MM" 별 행 위치를 나눠 둔다
+    # -> 월 목록, 한 달 치 표는 그 달 행 수만큼만 일한다
+    def __init__(self, df, date_col):
+        with perf.timed("pandas.month_index") as info:
+            self.df = df.sort_values(date_col, ascending=False, kind="stable")
+            months = self.df[date_col].astype(str).str[:7]
+            valid = months.str.fullmatch(r"\d{4}-\d{2}")
+            groups = self.df.groupby(months.where(valid, None).to_numpy(), sort=False).indices
+            self._positions = {m: np.asarray(p) for m, p in groups.items()}
+            self.months = sorted(self._positions, reverse=True)
+            info["rows"] = len(df)
+
+    def rows(self, month):
+        # 그 달의 행 (날짜 최신순, index = 행 id)
+        positions = self._positions.get(month)
+        if positions is None:
+            return self.df.iloc[0:0].copy()
+        return self.df.iloc[positions].copy()
+
+
+# --- 스냅샷별 표/월 인덱스 재사용 ---
+class FrameCache:
+    # (시트, 사용자번호) -> [스냅샷, 표, 월 인덱스]
+    # 저장소가 같은 스냅샷 객체를 돌려주는 동안은 (= 데이터가 안 바뀌었으면) 다시 만들지 않는다
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def frame(self, sheet_name, rows, user):
+        key = (sheet_name, user)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is rows:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        df = user_frame(sheet_name, rows, user)
+
+        with self._lock:
+            self._entries[key] = [rows, df, None]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return df
+
+    def month_index(self, sheet_name, user, df):
+        # df 가 frame() 이 돌려준 그 표면 월 인덱스를 한 번만 만들어 둔다
+        key = (sheet_name, user)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is df and entry[2] is not None:
+                return entry[2]
+
+        index = MonthIndex(df, date_column(sheet_name))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is df:
+                entry[2] = index
+        return index
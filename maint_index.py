@@ -0,0 +1,291 @@
+import csv
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+from schema import SHEET_MAINT, column_names, normalize_date, parse_number, record_id, user_key
+from sheet_sync import SheetConflict
+from storage import Storage
+
+
+# ==========================================
+# [정비 현황 인덱스]
+# 사용자별 정비 기록(항목, 날짜, 주행거리)을 기록ID 로 따로 들고 있다가
+# 저장/수정/삭제할 때마다 바뀐 행만 고친다. 정비 현황 표는
+# 전체 기록을 정렬하지 않고 항목별 마지막 기록만 꺼낸다 (항목 수만큼).
+# 최근 주행거리 기록으로 하루 평균 주행거리를 구해서 항목별 다음 정비 예정일도 계산한다.
+# 서버가 여러 대면(redis) 사용자별 버전 번호(shared_cache.Stamps)로 다른 서버에서 고친 것을 알아챈다.
+# 밤마다 모든 라이더 것을 한꺼번에 계산해 둘 수도 있다:
+#     python maint_index.py                      # service_due.csv 로 저장
+#     python maint_index.py --out 정비예정.csv
+# ==========================================
+# 항목별 교체 주기 (km). 배달용 스쿠터 기준, secrets 의 service_intervals 로 바꿀 수 있다
+SERVICE_INTERVALS = {
+    "오일교환": 2000,
+    "미션오일": 6000,
+    "에어필터": 10000,
+    "점화플러그": 10000,
+    "브레이크(앞)": 10000,
+    "브레이크(뒤)": 10000,
+    "타이어(앞)": 15000,
+    "타이어(뒤)": 10000,
+    "구동벨트": 20000,
+    "웨이트롤러": 20000,
+    "구동계": 20000,
+    "브레이크오일": 20000,
+    "냉각수": 20000,
+}
+# 하루 평균 주행거리는 마지막 주행거리 기록 전 RATE_DAYS 일 동안의 기록으로 (최소 MIN_RATE_DAYS 일 차이)
+RATE_DAYS = 60
+MIN_RATE_DAYS = 7
+# 남은 거리가 주기의 이 비율보다 적으면 "곧"
+SOON_RATIO = 0.1
+
+
+def _entries(rows):
+    # rows: 정비기록 값 리스트들 -> [(owner, 기록ID, 항목, 날짜, km, 메모)]
+    # 기록ID 가 없는 예전 행(migrate_typed.py 전)은 "~항목|날짜|km|같은 값 중 몇 번째" 를 대신 쓴다.
+    # 이런 행을 고치거나 지우면 MaintIndexStorage 가 그 사용자 것을 통째로 다시 만든다
+    names = column_names(SHEET_MAINT)
+    i_date, i_item, i_km, i_memo = names.index("날짜"), names.index("항목"), names.index("당시주행거리"), names.index("메모")
+    out = []
+    seen = {}
+    for row in rows:
+        row = list(row) + [""] * (len(names) - len(row))
+        owner, item, day, km = user_key(row[0]), str(row[i_item]), normalize_date(row[i_date]), parse_number(row[i_km])
+        rid = record_id(SHEET_MAINT, row)
+        if not rid:
+            legacy = (owner, item, day, km)
+            seen[legacy] = seen.get(legacy, 0) + 1
+            rid = f"~{item}|{day}|{'' if km is None else km}|{seen[legacy]}"
+        out.append((owner, rid, item, day, km, "" if row[i_memo] is None else str(row[i_memo])))
+    return out
+
+
+def _day(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+class MaintIndex:
+    def __init__(self, path="maint_index.db", stamps=None):
+        self.stamps = stamps
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS service ("
+                "owner TEXT, rid TEXT, item TEXT, day TEXT, km INTEGER, memo TEXT, PRIMARY KEY (owner, rid))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS service_item ON service (owner, item, day)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS built (owner TEXT PRIMARY KEY, version TEXT DEFAULT '')")
+            if "version" not in [row[1] for row in self._conn.execute("PRAGMA table_info(built)")]:
+                self._conn.execute("ALTER TABLE built ADD COLUMN version TEXT DEFAULT ''")
+
+    def _put(self, entries):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO service (owner, rid, item, day, km, memo) VALUES (?, ?, ?, ?, ?, ?)", entries
+        )
+
+    def add_rows(self, rows):
+        entries = _entries(rows)
+        if entries:
+            with self._lock, self._conn:
+                self._put(entries)
+
+    def remove(self, rids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM service WHERE rid = ?", [(rid,) for rid in rids])
+
+    def has(self, owner):
+        # 다른 서버에서 그 사용자 것을 고쳤으면 (버전 번호가 다르면) 다시 만들어야 한다
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM built WHERE owner = ?", (owner,)).fetchone()
+        return row is not None and (self.stamps is None or row[0] == self.stamps.current(owner)[0])
+
+    def touched(self, owner):
+        # 저장/수정 뒤: 버전 번호를 올려서 다른 서버에 알린다.
+        # 이 서버 표가 바로 앞 번호였으면 (방금 고친 것까지 반영됨) 새 번호로, 아니면 다음에 다시 만든다
+        if self.stamps is None:
+            return
+        before, version = self.stamps.bump(owner)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE built SET version = ? WHERE owner = ? AND version = ?",
+                               (version, owner, before))
+
+    def _version(self, owner):
+        return "" if self.stamps is None else self.stamps.current(owner)[0]
+
+    def forget(self, user):
+        # 그 사용자 것을 믿을 수 없게 됨 (기록ID 없는 행을 고침, 저장이 들어갔는지 모름) -> 다음에 불러올 때 다시 만든다
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM built WHERE owner = ?", (user,))
+
+    def rebuild(self, owner, rows):
+        # rows: 그 사용자의 정비기록 전체 (처음 한 번, 또는 어긋났을 때)
+        entries = [e for e in _entries(rows) if e[0] == owner]
+        version = self._version(owner)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM service WHERE owner = ?", (owner,))
+            self._put(entries)
+            self._conn.execute("INSERT OR REPLACE INTO built (owner, version) VALUES (?, ?)", (owner, version))
+
+    def rebuild_all(self, rows):
+        # 밤 작업용: 시트 전체로 모든 사용자를 다시 만든다. 반환: 사용자 owner 목록
+        entries = _entries(rows)
+        owners = sorted({e[0] for e in entries})
+        versions = self.stamps.current(*owners) if self.stamps is not None and owners else [""] * len(owners)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM service")
+            self._put(entries)
+            self._conn.executemany("INSERT OR REPLACE INTO built (owner, version) VALUES (?, ?)",
+                                   list(zip(owners, versions)))
+        return owners
+
+    def latest(self, owner):
+        # 항목별 마지막 정비: [(항목, 날짜, km, 메모)] 날짜 최신순
+        # 같은 날 두 번이면 주행거리가 큰 쪽 (나중에 한 정비)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item, day, km, memo FROM ("
+                " SELECT *, ROW_NUMBER() OVER (PARTITION BY item ORDER BY day DESC, km DESC, rowid DESC) AS n"
+                " FROM service WHERE owner = ?) WHERE n = 1", (owner,)
+            ).fetchall()
+        return sorted(rows, key=lambda r: r[1], reverse=True)
+
+    def odometer(self, owner):
+        # 반환: (마지막 주행거리 기록 날짜, km, 하루 평균 km 또는 None)
+        with self._lock:
+            last = self._conn.execute(
+                "SELECT day, km FROM service WHERE owner = ? AND km IS NOT NULL AND day != '' "
+                "ORDER BY day DESC, km DESC LIMIT 1", (owner,)
+            ).fetchone()
+            if last is None:
+                return None, None, None
+            since = (_day(last[0]) or date.min) - timedelta(days=RATE_DAYS)
+            first = self._conn.execute(
+                "SELECT day, km FROM service WHERE owner = ? AND km IS NOT NULL AND day >= ? "
+                "ORDER BY day, km LIMIT 1", (owner, since.isoformat())
+            ).fetchone()
+        day0, day1 = _day(first[0]), _day(last[0])
+        rate = None
+        if day0 and day1 and (day1 - day0).days >= MIN_RATE_DAYS and last[1] > first[1]:
+            rate = (last[1] - first[1]) / (day1 - day0).days
+        return last[0], last[1], rate
+
+    def projections(self, owner, intervals=None, today=None):
+        # 항목별 정비 현황 + 다음 정비 예상
+        # 반환: [{항목, 날짜, 당시주행거리, 메모, 지난거리, 남은거리, 예정일, 상태}] (주기/주행거리를 모르면 빈 칸)
+        intervals = {**SERVICE_INTERVALS, **(intervals or {})}
+        today = today or date.today()
+        odo_day, odo_km, rate = self.odometer(owner)
+        now_km = None
+        if odo_km is not None:
+            # 마지막 기록 뒤로 달린 거리 추정
+            now_km = odo_km + int(rate * max((today - (_day(odo_day) or today)).days, 0)) if rate else odo_km
+
+        out = []
+        for item, day, km, memo in self.latest(owner):
+            entry = {"항목": item, "날짜": day, "당시주행거리": km, "메모": memo,
+                     "지난거리": None, "남은거리": None, "예정일": "", "상태": ""}
+            interval = intervals.get(item)
+            if interval and km is not None and now_km is not None:
+                used = max(now_km - km, 0)
+                left = interval - used
+                entry["지난거리"], entry["남은거리"] = used, left
+                if left <= 0:
+                    entry["상태"] = "⚠️ 교체 시기 지남"
+                elif left <= interval * SOON_RATIO:
+                    entry["상태"] = "🔔 곧 교체"
+                else:
+                    entry["상태"] = "✅ 여유"
+                if rate:
+                    entry["예정일"] = (today + timedelta(days=max(left, 0) / rate)).isoformat()
+            out.append(entry)
+        return out
+
+
+# --- 저장소에 끼워서 쓰기 때마다 인덱스도 같이 고치기 ---
+class MaintIndexStorage(Storage):
+    def __init__(self, inner, index):
+        self.inner = inner
+        self.index = index
+        self.stable_ids = inner.stable_ids
+
+    def load_user_rows(self, sheet_name, user):
+        return self.inner.load_user_rows(sheet_name, user)
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        return self.inner.iter_user_rows(sheet_name, user, start, end, chunk_size)
+
+    def forget(self, sheet_name, user):
+        self.inner.forget(sheet_name, user)
+        self._stale(sheet_name, user)
+
+    def _stale(self, sheet_name, user):
+        if sheet_name == SHEET_MAINT:
+            self.index.forget(user)
+            self.index.touched(user)
+
+    def append_rows(self, sheet_name, user, rows):
+        try:
+            self.inner.append_rows(sheet_name, user, rows)
+        except Exception:
+            # 들어갔는데 응답만 못 받았을 수도 있다
+            self._stale(sheet_name, user)
+            raise
+        if sheet_name == SHEET_MAINT:
+            self.index.add_rows(rows)
+            self.index.touched(user)
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        try:
+            deleted = self.inner.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        except SheetConflict:
+            raise
+        except Exception:
+            self._stale(sheet_name, user)
+            raise
+        if sheet_name == SHEET_MAINT:
+            # 고친/지운 행은 기록ID 로 찾아서 뺀다 (확인용 expected 의 key[1] 이 기록ID)
+            rids = [(expected or {}).get(r, [None, ""])[1] for r in list(updates) + list(deletes)]
+            if all(rids):
+                self.index.remove(rids)
+                self.index.add_rows(list(updates.values()) + list(inserts))
+            else:
+                self.index.forget(user)
+            self.index.touched(user)
+        return deleted
+
+
+# --- 밤 작업: 모든 라이더의 정비 예정 ---
+def nightly(index, rows, intervals=None, out_path="service_due.csv", today=None):
+    owners = index.rebuild_all(rows)
+    fields = ["사용자번호", "항목", "날짜", "당시주행거리", "지난거리", "남은거리", "예정일", "상태"]
+    with open(out_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for owner in owners:
+            for entry in index.projections(owner, intervals, today):
+                writer.writerow([owner] + ["" if entry[k] is None else entry[k] for k in fields[1:]])
+    return len(owners)
+
+
+if __name__ == "__main__":
+    from sheet_client import load_local_secrets, pool_from_secrets
+    from storage import SqliteStorage
+
+    args = sys.argv[1:]
+    out_path = args[args.index("--out") + 1] if "--out" in args else "service_due.csv"
+    secrets = load_local_secrets()
+    if secrets.get("storage", "sheets").startswith("sqlite"):
+        all_rows = SqliteStorage(secrets.get("sqlite_path", "ledger.db")).load_all_rows(SHEET_MAINT)
+    else:
+        all_rows = pool_from_secrets(secrets).run(SHEET_MAINT, lambda ws: ws.get_all_values())[1:]
+        all_rows = list(enumerate(all_rows, start=2))
+    count = nightly(MaintIndex(secrets.get("maint_index_path", "maint_index.db")), [v for _, v in all_rows],
+                    dict(secrets.get("service_intervals", {})), out_path)
+    print(f"{count}명 정비 예정 -> {out_path}")
@@ -0,0 +1,68 @@
+import sys
+
+from gspread.utils import rowcol_to_a1
+
+from schema import COLUMNS, LEDGER_SHEETS, NUMBER_KINDS, column_names, new_record
+from sheet_client import load_local_secrets, pool_from_secrets
+
+
+# ==========================================
+# [저장 형식 변환 - 한 번만 실행]
+# 예전 형식("30,000", "12,345 km", "2025.1.3")으로 저장된 시트를
+# 새 형식(정수, YYYY-MM-DD)으로 바꾸고, 기록ID 가 없는 행에는 기록ID/수정번호를 채운다
+# (헤더에도 두 칸 이름을 붙인다). 행 순서는 그대로라 행 인덱스는 안 바뀐다.
+# 앱 사용이 적은 시간에 실행하세요.
+#     python migrate_typed.py            # 바뀔 행 수만 확인
+#     python migrate_typed.py --apply    # 실제로 시트에 쓰기
+# ==========================================
+def migrate_sheet(pool, sheet_name, apply=False):
+    # 반환: (바뀐 행 수, 숫자로 못 바꾼 칸 [(행, 컬럼, 값)])
+    rows = pool.run(sheet_name, lambda ws: ws.get_all_values())
+    if not rows:
+        return 0, []
+    if list(rows[0][:2]) == ["아이디", "비번"]:
+        # 아이디/비번 칸이 있는 예전 시트는 칸 위치가 달라서 건드리지 않는다 (migrate_users.py 가 같이 바꾼다)
+        print(f"{sheet_name}: 아이디/비번 칸이 있는 예전 시트 -> migrate_users.py 를 먼저 실행하세요")
+        return 0, []
+    header = column_names(sheet_name)
+    if apply and list(rows[0]) != header:
+        pool.run(sheet_name, lambda ws: ws.update(range_name="A1", values=[header]), idempotent=False)
+    if len(rows) < 2:
+        return 0, []
+
+    columns = COLUMNS[sheet_name]
+    width = len(columns)
+    new_rows = []
+    changed = 0
+    unparsed = []
+    for row_num, row in enumerate(rows[1:], start=2):
+        old = (list(row) + [""] * width)[:width]
+        if not any(old):
+            # 빈 행은 그대로 (기록ID 를 붙이면 빈 기록이 생긴다)
+            new_rows.append(old)
+            continue
+        new = new_record(sheet_name, old)
+        if [str(v) for v in new] != old:
+            changed += 1
+        for (name, kind), value in zip(columns, new):
+            if kind in NUMBER_KINDS and isinstance(value, str) and value:
+                unparsed.append((row_num, name, value))
+        new_rows.append(new)
+
+    if apply and changed:
+        # 헤더 밑부터 장부 컬럼 범위만 한 번에 덮어쓴다 (오른쪽 다른 칸은 건드리지 않음)
+        target = f"A2:{rowcol_to_a1(len(rows), width)}"
+        pool.run(sheet_name, lambda ws: ws.update(range_name=target, values=new_rows), idempotent=False)
+    return changed, unparsed
+
+
+if __name__ == "__main__":
+    apply = "--apply" in sys.argv[1:]
+    pool = pool_from_secrets(load_local_secrets())
+    for name in LEDGER_SHEETS:
+        changed, unparsed = migrate_sheet(pool, name, apply)
+        print(f"{name}: {changed}행 {'변환함' if apply else '변환 예정'}")
+        for row_num, col, value in unparsed:
+            print(f"  - {row_num}행 {col}: 숫자로 못 바꿈 ({value!r}), 그대로 둠")
+    if not apply:
+        print("실제로 바꾸려면 --apply 를 붙여서 다시 실행하세요.")
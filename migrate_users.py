@@ -0,0 +1,214 @@
+import os
+import re
+import sqlite3
+import sys
+from collections import Counter
+
+import archive
+from row_index import DEFAULT_PATH, RowIndex
+from schema import LEDGER_SHEETS, USER_KEY, column_names, new_record
+from sheet_client import load_local_secrets, pool_from_secrets
+from storage import SqliteStorage, _q
+from users import REGISTRY_HEADER, REGISTRY_SHEET, SheetUsers, UserRegistry, _winners
+
+
+# ==========================================
+# [사용자번호로 바꾸기 - 한 번만 실행]
+# 장부 행의 아이디/비번 두 칸을 사용자 목록(users.py)의 사용자번호 한 칸으로 바꾼다.
+#   1) 장부(연도별 보관 시트 포함)에 나오는 (아이디, 비밀번호)를 사용자 목록에 등록한다
+#      - 이미 등록된 아이디는 그 비밀번호로 쓴 행만 그 번호로 간다
+#      - 같은 아이디를 다른 비밀번호로 쓴 행은 "아이디#2" 같은 새 아이디로 등록한다 (목록을 출력하니 알려 주세요)
+#   2) 시트마다 헤더와 행을 새 형식으로 한 번에 덮어쓴다 (행 순서 그대로, 남는 오른쪽 칸은 지움)
+#      SQLite 장부는 사용자번호 칸을 채우고 아이디/비번 칸을 지운다 (행 id 그대로)
+#   3) 행 인덱스와 보관합계를 다시 만든다
+# 쓰기 대기열이 빈 뒤에 앱을 멈추고 실행하세요. 이미 바꾼 시트는 건너뛴다.
+# 예전 집계표/정비 현황(rollups.db, maint_index.db)은 지워도 된다 (앱이 새 번호로 다시 만든다).
+#     python migrate_users.py            # 바뀔 내용만 확인
+#     python migrate_users.py --apply
+# ==========================================
+OLD_USER_COLUMNS = ["아이디", "비번"]
+
+
+def _base_sheet(title):
+    # 장부 시트 또는 연도별 보관 시트(매출기록_2025) -> 장부 이름, 아니면 None
+    for sheet_name in LEDGER_SHEETS:
+        if title == sheet_name or re.fullmatch(re.escape(sheet_name) + r"_\d{4}", title):
+            return sheet_name
+    return None
+
+
+def _old_sheet_rows(pool):
+    # 아직 아이디/비번 칸인 시트들: {시트 이름: get_all_values()}
+    out = {}
+    for title in pool.titles():
+        if _base_sheet(title) is None:
+            continue
+        rows = pool.run(title, lambda ws: ws.get_all_values())
+        if rows and list(rows[0][:2]) == OLD_USER_COLUMNS:
+            out[title] = rows
+    return out
+
+
+def _old_db_pairs(conn):
+    # SQLite 장부에서 (아이디, 비번)별 행 수
+    counts = Counter()
+    for sheet_name in LEDGER_SHEETS:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({_q(sheet_name)})")]
+        if all(c in columns for c in OLD_USER_COLUMNS):
+            for user, password, n in conn.execute(
+                    f"SELECT 아이디, 비번, COUNT(*) FROM {_q(sheet_name)} GROUP BY 아이디, 비번"):
+                if user and password:
+                    counts[(str(user), str(password))] += n
+    return counts
+
+
+def assign_users(registry, counts):
+    # counts: {(아이디, 비밀번호): 행 수} -> 등록할 [(아이디, 비밀번호)], {(아이디, 비밀번호): 등록할 아이디}
+    # 이미 등록된 아이디는 비밀번호가 맞는 쌍만 그 아이디로, 나머지는 행이 많은 비밀번호부터 아이디 / 아이디#2 / ...
+    taken = registry.users()
+    names, new = {}, []
+    by_user = {}
+    for (user, password), n in counts.most_common():
+        by_user.setdefault(user, []).append(password)
+    for user, passwords in sorted(by_user.items()):
+        if user in taken:
+            own = [p for p in passwords if registry.check(user, p) == "ok"]
+            rest = [p for p in passwords if p not in own]
+            for p in own:
+                names[(user, p)] = user
+        else:
+            rest = passwords
+        n = 1
+        for password in rest:
+            name = user
+            while name in taken:
+                n += 1
+                name = f"{user}#{n}"
+            taken.add(name)
+            names[(user, password)] = name
+            new.append((name, password))
+    return new, names
+
+
+def convert_rows(sheet_name, rows, keys):
+    # rows: 예전 형식 get_all_values() -> 새 형식 [헤더] + 행 (예전 칸 수만큼 빈 칸으로 채움)
+    width = max(len(r) for r in rows)
+    old_width = len(column_names(sheet_name)) + 1
+    out = [column_names(sheet_name)]
+    for row in rows[1:]:
+        old = (list(row) + [""] * old_width)[:old_width]
+        if not any(old):
+            out.append([])
+            continue
+        out.append(new_record(sheet_name, [keys.get((old[0], old[1]), "")] + old[2:]))
+    return [(list(r) + [""] * width)[:width] for r in out]
+
+
+def migrate_db(path, keys, apply):
+    # SQLite 장부: 사용자번호 칸을 채우고 아이디/비번 칸과 예전 인덱스를 지운다
+    conn = sqlite3.connect(path)
+    done = 0
+    for sheet_name in LEDGER_SHEETS:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({_q(sheet_name)})")]
+        if not all(c in columns for c in OLD_USER_COLUMNS):
+            continue
+        count = conn.execute(f"SELECT COUNT(*) FROM {_q(sheet_name)}").fetchone()[0]
+        print(f"{sheet_name} (SQLite): {count}행 {'바꿈' if apply else '바꿀 예정'}")
+        done += count
+        if not apply:
+            continue
+        with conn:
+            if USER_KEY not in columns:
+                conn.execute(f"ALTER TABLE {_q(sheet_name)} ADD COLUMN {_q(USER_KEY)} INTEGER")
+            conn.executemany(f"UPDATE {_q(sheet_name)} SET {_q(USER_KEY)} = ? WHERE 아이디 = ? AND 비번 = ?",
+                             [(key, user, password) for (user, password), key in keys.items()])
+            conn.execute(f"DROP INDEX IF EXISTS {_q('idx_' + sheet_name + '_user_date')}")
+            for name in OLD_USER_COLUMNS:
+                conn.execute(f"ALTER TABLE {_q(sheet_name)} DROP COLUMN {_q(name)}")
+    conn.close()
+    if apply:
+        # 새 칸으로 인덱스를 다시 만든다
+        SqliteStorage(path)
+    return done
+
+
+def migrate_sheets(pool, old_rows, keys, apply, index=None):
+    for title, rows in sorted(old_rows.items()):
+        sheet_name = _base_sheet(title)
+        print(f"{title}: {max(len(rows) - 1, 0)}행 {'바꿈' if apply else '바꿀 예정'}")
+        if not apply:
+            continue
+        values = convert_rows(sheet_name, rows, keys)
+        pool.run(title, lambda ws: ws.update(range_name="A1", values=values), idempotent=False)
+        if index is not None and title == sheet_name:
+            index.rebuild_sheet(title, pool.run(title, lambda ws: ws.get_all_values()))
+    if apply and any(title != _base_sheet(title) for title in old_rows):
+        print(f"{archive.TOTALS_SHEET}: 사용자/기간 {archive.write_totals(pool)}개")
+
+
+def upgrade_registry_sheet(pool, apply):
+    # users.py 에 사용자번호가 없던 때 만든 "사용자" 시트 -> 위에서부터 1, 2, 3 ... 번호를 붙인다
+    if REGISTRY_SHEET not in pool.titles():
+        return
+    rows = pool.run(REGISTRY_SHEET, lambda ws: ws.get_all_values())
+    if rows and rows[0][:1] == ["아이디"]:
+        print(f"{REGISTRY_SHEET}: {len(rows) - 1}명에게 사용자번호 붙임{'' if apply else ' 예정'}")
+        if apply:
+            values = [REGISTRY_HEADER] + _winners([[n] + list(r) for n, r in enumerate(rows[1:], start=1)])
+            pool.run(REGISTRY_SHEET, lambda ws: ws.update(range_name="A1", values=values, value_input_option="RAW"),
+                     idempotent=False)
+
+
+def pending_writes(path):
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    apply = "--apply" in sys.argv[1:]
+    secrets = load_local_secrets()
+    backend = secrets.get("storage", "sheets")
+    waiting = pending_writes(secrets.get("write_queue_path", "write_queue.db"))
+    if apply and waiting:
+        sys.exit(f"쓰기 대기열에 {waiting}건이 남아 있습니다. 앱에서 다 보내진 뒤에 다시 실행하세요.")
+
+    pool = None if backend == "sqlite" else pool_from_secrets(secrets)
+    db_path = secrets.get("sqlite_path", "ledger.db") if backend.startswith("sqlite") else None
+    if pool is not None:
+        upgrade_registry_sheet(pool, apply)
+    registry = UserRegistry(secrets.get("user_registry_path", "users.db"),
+                            None if pool is None else (lambda: SheetUsers(pool)))
+
+    counts = Counter()
+    old_rows = _old_sheet_rows(pool) if pool is not None else {}
+    for rows in old_rows.values():
+        counts.update((str(r[0]), str(r[1])) for r in rows[1:] if len(r) > 1 and r[0] and r[1])
+    if db_path:
+        db_conn = sqlite3.connect(db_path)
+        counts.update(_old_db_pairs(db_conn))
+        db_conn.close()
+
+    new, names = assign_users(registry, counts)
+    for (user, password), name in sorted(names.items()):
+        if name != user:
+            print(f"{user}: 다른 비밀번호로 쓴 기록 -> 새 아이디 {name}")
+    print(f"새로 등록할 아이디 {len(new)}개")
+    if apply:
+        registry.register_many(new)
+    keys = {pair: registry.key(name) for pair, name in names.items()}
+    if apply and any(key is None for key in keys.values()):
+        sys.exit("사용자 등록이 끝나지 않았습니다. 다시 실행하세요.")
+
+    if db_path:
+        migrate_db(db_path, keys, apply)
+    if pool is not None:
+        migrate_sheets(pool, old_rows, keys, apply, RowIndex(secrets.get("row_index_path", DEFAULT_PATH)))
+    if not apply:
+        print("실제로 바꾸려면 --apply 를 붙여서 다시 실행하세요.")
@@ -1,26 +1,40 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from datetime import datetime
 import time
 
+from users import SheetUsers, UserRegistry
+
 # 1. 페이지 설정
 st.set_page_config(page_title="배달통합장부", page_icon="🛵", layout="centered")
-
-# --- 구글 시트 연결 ---
-try:
-    gc = gspread.service_account_from_dict(st.secrets["gcp_service_account"])
-    url = "https://docs.google.com/spreadsheets/d/1vNdErX9sW6N5ulvfr-ndcrGmutxwiuvfe2og87AOEnI"
-    sh = gc.open_by_url(url)
-except Exception as e:
-    st.error(f"⚠️ 연결 실패! {e}")
-    st.stop()
-
-# 시트 이름 정의
-SHEET_WORK = "매출기록"
-SHEET_BANK = "입금기록"
-SHEET_MAINT = "정비기록"
-SHEET_GOAL = "목표설정"
+RERUN_START = time.perf_counter()
+
+# 로그인 화면까지는 streamlit 과 사용자 목록(users.py, 표준 라이브러리만)만 쓴다.
+# pandas/gspread 와 시트 연결은 로그인한 뒤에 불러온다 -> 처음 화면이 네트워크를 안 기다린다.
+
+# --- 저장소 선택 ---
+# secrets의 storage 로 선택: "sheets"(기본) / "sqlite" / "sqlite+sheets"(SQLite + 시트 백그라운드 복사)
+# 인증/스프레드시트/워크시트 핸들은 서버 프로세스당 한 번만 만들고 재사용
+STORAGE_BACKEND = st.secrets.get("storage", "sheets")
+
+# --- 시트 요청 스케줄러 (할당량/우선순위/재시도, 모든 세션 공용) ---
+# gspread 는 처음 연결할 때 불러온다
+@st.cache_resource
+def get_scheduler():
+    from sheet_client import scheduler_from_secrets
+    return scheduler_from_secrets(st.secrets)
+
+@st.cache_resource
+def get_sheet_pool():
+    from sheet_client import SHEET_URL, SheetPool
+    pool = SheetPool(dict(st.secrets["gcp_service_account"]), SHEET_URL, scheduler=get_scheduler())
+    pool.spreadsheet()
+    return pool
+
+# --- 사용자 목록 (로그인 확인) ---
+# 시트를 쓰는 설정이면 "사용자" 시트가 원본 (로컬에 없는 아이디일 때만 읽으러 간다)
+@st.cache_resource
+def get_user_registry(backend):
+    source = None if backend == "sqlite" else (lambda: SheetUsers(get_sheet_pool()))
+    return UserRegistry(st.secrets.get("user_registry_path", "users.db"), source)
 
 # ==========================================
 # [초기화 기능] 입력창 강제 리셋을 위한 세션 키
@@ -50,9 +64,24 @@ def login_screen():
         
         if submit:
             if user_id and password:
+                # 사용자 목록에서만 확인 (처음 보는 아이디면 그 비밀번호로 등록)
+                try:
+                    registry = get_user_registry(STORAGE_BACKEND)
+                    state = registry.check(user_id, password)
+                    if state == "new":
+                        state = registry.register(user_id, password)
+                except Exception as e:
+                    st.error(f"⚠️ 연결 실패! {e}")
+                    st.stop()
+                if state != "ok":
+                    st.error("비밀번호가 맞지 않습니다. 처음이라면 다른 아이디를 써 주세요.")
+                    st.stop()
+                # 세션에는 비밀번호 대신 사용자번호만 둔다 (장부 행도 이 번호로 찾는다)
+                admins = st.secrets.get("admin_users", {})
                 st.session_state['logged_in'] = True
                 st.session_state['user_id'] = user_id
-                st.session_state['password'] = password
+                st.session_state['user_key'] = str(registry.key(user_id))
+                st.session_state['is_admin'] = user_id in admins and str(admins[user_id]) == password
                 st.query_params["id"] = user_id
                 
                 st.success(f"반갑습니다, {user_id}님!")
@@ -71,101 +100,386 @@ if not st.session_state['logged_in']:
     login_screen()
     st.stop()
 
+# ==========================================
+# [로그인 뒤에 불러오는 것들]
+# ==========================================
+import pandas as pd
+from datetime import datetime
+import uuid
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from shared_cache import owner_stamps, shared_from_url
+from sheet_cache import SnapshotCache
+from sheet_sync import ROW_COL, SheetConflict, editor_frame, frame_changes
+from row_index import RowIndex
+from schema import (SHEET_WORK, SHEET_BANK, SHEET_MAINT, SHEET_GOAL, COLUMNS, column_names, hidden_columns,
+                    new_record, parse_number)
+from storage import CachedStorage, GoogleSheetsStorage, MirroredStorage, SqliteStorage
+from write_queue import make_write_queue
+from rollups import RollupStorage, Rollups
+import archive
+from maint_index import MaintIndex, MaintIndexStorage
+from snapshot import HAS_ARROW, ColumnarSnapshot, SnapshotStorage
+from ledger import FrameCache, average_price, edit_values, fix_work_rows
+import csv_import
+import export
+import perf
+
+# --- 서버 공용 저장소 (스냅샷/집계표 버전/쓰기 대기열/시트 수정 잠금/목표 금액) ---
+# 서버가 여러 대면 secrets 에 shared_cache = "redis://호스트:6379/0", 비어 있으면 이 프로세스 안에만
+@st.cache_resource
+def get_shared():
+    shared = shared_from_url(st.secrets.get("shared_cache", ""))
+    shared.ping()
+    return shared
+
+try:
+    shared = get_shared()
+except Exception as e:
+    st.error(f"⚠️ 공용 캐시 연결 실패! {e}")
+    st.stop()
+
+# --- 시트 스냅샷 캐시 (모든 세션 공용) ---
+# 캐시 유지 시간(초)은 secrets의 cache_ttl 로 조절 (기본 60초)
+CACHE_TTL = int(st.secrets.get("cache_ttl", 60))
+
+@st.cache_resource
+def get_snapshot_cache(ttl):
+    return SnapshotCache(ttl=ttl, shared=shared)
+
+snapshot_cache = get_snapshot_cache(CACHE_TTL)
+
+# --- 저장소 연결 ---
+@st.cache_resource
+def get_row_index():
+    return RowIndex(st.secrets.get("row_index_path", "row_index.json"))
+
+# --- 매출 집계표 (일/월/년 합계) ---
+@st.cache_resource
+def get_rollups():
+    return Rollups(st.secrets.get("rollup_path", "rollups.db"), owner_stamps(shared, "rollup"))
+
+rollups = get_rollups()
+
+# --- 정비 현황 인덱스 (항목별 마지막 정비 + 다음 정비 예상) ---
+# 교체 주기(km)는 secrets 의 service_intervals = { "오일교환" = 2000 } 처럼 바꿀 수 있다
+@st.cache_resource
+def get_maint_index():
+    return MaintIndex(st.secrets.get("maint_index_path", "maint_index.db"), owner_stamps(shared, "maint"))
+
+maint_index = get_maint_index()
+SERVICE_INTERVALS = dict(st.secrets.get("service_intervals", {}))
+
+# 연도별 시트로 옮긴 해(archive.py)의 월/년 합계 -> 집계표를 다시 만들 때 더한다
+# storage = "sheets" 일 때만 (sqlite 는 로컬 DB 에 전체 기록이 그대로 있다). 1년에 한 번 바뀌니 오래 둔다
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_archived_totals():
+    return archive.load_totals(get_sheet_pool())
+
+# 로컬 스냅샷 폴더 (pyarrow 가 있을 때만, snapshot_dir = "" 이면 끔)
+# 스프레드시트 버전 번호는 snapshot_check 초(기본 30초)에 한 번만 확인
+SNAPSHOT_DIR = st.secrets.get("snapshot_dir", "snapshots")
+
+@st.cache_resource
+def get_storage(backend):
+    if backend == "sheets":
+        inner = GoogleSheetsStorage(get_sheet_pool(), get_row_index(), shared)
+        if HAS_ARROW and SNAPSHOT_DIR:
+            inner = SnapshotStorage(
+                inner, ColumnarSnapshot(SNAPSHOT_DIR), get_sheet_pool().revision,
+                check_interval=float(st.secrets.get("snapshot_check", 30)),
+            )
+    elif backend == "sqlite":
+        inner = SqliteStorage(st.secrets.get("sqlite_path", "ledger.db"))
+    elif backend == "sqlite+sheets":
+        inner = MirroredStorage(
+            SqliteStorage(st.secrets.get("sqlite_path", "ledger.db")),
+            GoogleSheetsStorage(get_sheet_pool(), get_row_index(), shared),
+        )
+    else:
+        raise ValueError(f"알 수 없는 storage 설정: {backend}")
+    return MaintIndexStorage(RollupStorage(CachedStorage(inner, snapshot_cache), rollups), maint_index)
+
+# --- 쓰기 대기열 (입력 폼 저장은 여기에 적고 바로 끝냄) ---
+# 공용 저장소가 redis 면 대기열도 거기에 (어느 서버에서 저장해도 모든 서버에 보임)
+@st.cache_resource
+def get_write_queue(backend):
+    return make_write_queue(get_storage(backend), shared, st.secrets.get("write_queue_path", "write_queue.db"))
+
+try:
+    storage = get_storage(STORAGE_BACKEND)
+    write_queue = get_write_queue(STORAGE_BACKEND)
+except Exception as e:
+    st.error(f"⚠️ 연결 실패! {e}")
+    st.stop()
+
 CURRENT_USER = st.session_state['user_id']
-CURRENT_PW = st.session_state['password']
+# 사용자번호 ("17") - 저장소, 대기열, 집계표, 정비 현황은 모두 이 번호로 찾는다 (아이디는 화면 표시용)
+MY_KEY = st.session_state['user_key']
 
+# 성능 기록용 세션 이름 (같은 아이디로 여러 곳에서 접속해도 구분)
+if 'perf_session' not in st.session_state:
+    st.session_state['perf_session'] = uuid.uuid4().hex[:6]
+perf.set_session(f"{CURRENT_USER}#{st.session_state['perf_session']}")
 
-# --- 데이터 로드 함수 ---
-def load_data(sheet_name):
-    try:
-        worksheet = sh.worksheet(sheet_name)
-        rows = worksheet.get_all_values()
-
-        if sheet_name == SHEET_WORK:
-            required_cols = ["아이디", "비번", "날짜", "플랫폼", "수입", "배달건수", "평균단가", "메모"]
-        elif sheet_name == SHEET_BANK:
-            required_cols = ["아이디", "비번", "입금날짜", "입금처", "입금액", "메모"]
-        elif sheet_name == SHEET_MAINT:
-            required_cols = ["아이디", "비번", "날짜", "항목", "금액", "당시주행거리", "메모"]
-        else:
-            required_cols = []
 
-        if len(rows) < 2:
-            return pd.DataFrame(columns=required_cols)
+# --- 데이터 로드 함수 ---
+# 오류는 그대로 올려보내고, 빈 표로 바꾸는 건 load_all 에서 시트별로 처리한다
+# 저장소가 같은 스냅샷을 돌려주면 (데이터가 안 바뀌었으면) 지난번 표와 월 인덱스를 그대로 쓴다
+@st.cache_resource
+def get_frame_cache():
+    return FrameCache()
 
-        data = rows[1:]
-        df = pd.DataFrame(data)
+frame_cache = get_frame_cache()
 
-        if df.shape[1] < len(required_cols):
-            for i in range(len(required_cols) - df.shape[1]):
-                df[len(df.columns)] = "" 
-        df = df.iloc[:, :len(required_cols)]
-        df.columns = required_cols
-        
-        my_data = df[(df['아이디'] == CURRENT_USER) & (df['비번'] == CURRENT_PW)]
-        
-        return my_data
-    except Exception as e:
-        return pd.DataFrame()
+def load_data(sheet_name):
+    rows = storage.load_user_rows(sheet_name, MY_KEY)
+    return frame_cache.frame(sheet_name, rows, MY_KEY)
+
+# --- 세 시트 동시에 불러오기 ---
+# 시트별 대기 시간(초)은 secrets의 load_timeout 으로 조절 (기본 8초)
+LOAD_TIMEOUT = float(st.secrets.get("load_timeout", 8))
+
+@st.cache_resource
+def get_load_executor():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="sheet-load")
+
+def load_all(sheet_names):
+    # 반환: ({시트: DataFrame}, {시트: "ok" | "pending" | 오류 메시지})
+    # 시간 안에 못 끝난 시트는 백그라운드에서 계속 불러오고, 다음 리런 때 결과를 가져간다
+    executor = get_load_executor()
+    pending = st.session_state.setdefault('pending_loads', {})
+
+    futures = {}
+    for name in sheet_names:
+        key = (name, MY_KEY)
+        # 성능 기록의 세션 이름이 작업 스레드에도 따라가도록 컨텍스트를 복사해서 넘긴다
+        futures[name] = pending.pop(key, None) or executor.submit(contextvars.copy_context().run, load_data, name)
+
+    deadline = time.monotonic() + LOAD_TIMEOUT
+    frames, status = {}, {}
+    for name, future in futures.items():
+        try:
+            frames[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+            status[name] = "ok"
+        except FuturesTimeout:
+            pending[(name, MY_KEY)] = future
+            frames[name] = pd.DataFrame()
+            status[name] = "pending"
+        except Exception as e:
+            frames[name] = pd.DataFrame()
+            status[name] = str(e) or type(e).__name__
+    return frames, status
+
+def sheet_ready(sheet_name):
+    return load_status.get(sheet_name) == "ok"
+
+def show_load_status(sheet_name, where):
+    state = load_status.get(sheet_name)
+    if state == "pending":
+        st.info("⏳ 아직 불러오는 중입니다. 잠시 후 다시 불러오기를 눌러주세요.")
+    else:
+        st.error(f"⚠️ 불러오기 실패: {state}")
+    if st.button("🔄 다시 불러오기", key=f"reload_{sheet_name}_{where}"):
+        st.rerun()
 
 # --- 데이터 추가 ---
+# 대기열에만 적고 바로 돌아온다 -> 백그라운드에서 모아서 시트에 추가
 def save_new_entry(sheet_name, data_list):
-    worksheet = sh.worksheet(sheet_name)
-    if not worksheet.get_all_values():
-        if sheet_name == SHEET_WORK:
-            worksheet.append_row(["아이디", "비번", "날짜", "플랫폼", "수입", "배달건수", "평균단가", "메모"])
-        elif sheet_name == SHEET_BANK:
-            worksheet.append_row(["아이디", "비번", "입금날짜", "입금처", "입금액", "메모"])
-        elif sheet_name == SHEET_MAINT:
-            worksheet.append_row(["아이디", "비번", "날짜", "항목", "금액", "당시주행거리", "메모"])
-    
-    full_data = [CURRENT_USER, CURRENT_PW] + data_list
-    worksheet.append_row([str(x) for x in full_data])
+    full_data = [MY_KEY] + data_list
+    # 기록ID 를 여기서 정해 둔다 (대기열이 다시 보내도 같은 기록)
+    write_queue.submit(sheet_name, MY_KEY, new_record(sheet_name, full_data))
+
+def pending_frame(sheet_name):
+    cols = column_names(sheet_name)
+    rows = write_queue.pending_rows(MY_KEY, sheet_name)
+    return pd.DataFrame([(r + [""] * len(cols))[:len(cols)] for r in rows], columns=cols)
+
+def show_pending_rows(sheet_name):
+    pending_df = pending_frame(sheet_name)
+    if not pending_df.empty:
+        st.caption(f"⏳ 시트로 전송 대기 중 {len(pending_df)}건 (곧 아래 내역에 반영됩니다)")
+        cols = column_names(sheet_name)
+        st.dataframe(pending_df[[c for c in cols if c not in hidden_columns()]], hide_index=True, use_container_width=True, column_config=number_column_config(sheet_name))
+
+# --- CSV 한꺼번에 넣기 (쿠팡/배민 정산 파일, 이 앱에서 받은 CSV) ---
+# 이미 있는 (날짜, 플랫폼, 금액)은 빼고, 나머지는 대기열에 한 번에 넣는다 -> 시트에는 append 한 번
+def import_panel(sheet_name, my_df, key, sources):
+    with st.expander("📤 CSV 파일로 한꺼번에 넣기"):
+        upload = st.file_uploader("정산 내역 또는 이 앱에서 받은 CSV", type=["csv"],
+                                  key=f"import_file_{key}_{st.session_state.form_id}")
+        source = st.selectbox("파일에 플랫폼이 없으면", sources, key=f"import_src_{key}")
+        if upload is None:
+            return
+        try:
+            pending = pending_frame(sheet_name)
+            existing = pd.concat([my_df, pending]) if not pending.empty else my_df
+            new_df, duplicates, errors = csv_import.prepare(
+                sheet_name, csv_import.read_csv(upload.getvalue()), existing, source)
+        except Exception as e:
+            st.error(f"⚠️ 파일을 읽지 못했습니다: {e}")
+            return
+
+        st.caption(f"새 기록 {len(new_df)}건 · 이미 있는 기록 {duplicates}건 제외"
+                   + (f" · 잘못된 줄 {len(errors)}개 제외" if errors else ""))
+        if errors:
+            st.caption(", ".join(f"{line}줄 {reason}" for line, reason in errors[:10]) + (" ..." if len(errors) > 10 else ""))
+        if new_df.empty:
+            return
+        st.dataframe(new_df, hide_index=True, use_container_width=True, column_config=number_column_config(sheet_name))
+        if st.button(f"💾 {len(new_df)}건 저장", type="primary", key=f"import_save_{key}"):
+            write_queue.submit_many(sheet_name, MY_KEY, csv_import.to_records(sheet_name, new_df, MY_KEY))
+            st.toast(f"✅ {len(new_df)}건 저장되었습니다!")
+            reset_forms()
+            st.rerun()
 
 # --- 업데이트 ---
-def update_my_data(sheet_name, my_edited_df):
-    worksheet = sh.worksheet(sheet_name)
-    all_rows = worksheet.get_all_values()
-    
-    if not all_rows: return
-    header = all_rows[0]
-    
-    all_df = pd.DataFrame(all_rows[1:], columns=header)
-    others_df = all_df[all_df['아이디'] != CURRENT_USER]
-    
-    my_edited_df['아이디'] = CURRENT_USER
-    my_edited_df['비번'] = CURRENT_PW
-    
-    final_df = pd.concat([others_df, my_edited_df], ignore_index=True)
-    
-    worksheet.clear()
-    worksheet.update([final_df.columns.values.tolist()] + final_df.values.tolist())
+def update_my_data(sheet_name, my_df, changes, fix_rows=None):
+    # 바뀐 행만 시트에 반영한다 (수정=범위 일괄 수정, 추가=일괄 추가, 삭제=일괄 행 삭제)
+    updated, added, deleted = changes
+    if not (updated or added or deleted):
+        return False
+
+    updates, inserts, expected = edit_values(sheet_name, my_df, changes, MY_KEY, fix_rows)
+    storage.apply_changes(sheet_name, MY_KEY, updates, inserts, deleted, expected)
+    return True
+
+# --- 표 편집 (페이지 나눠서) ---
+# 한 달 치 전체 대신 PAGE_SIZE 행씩만 편집기에 보낸다 (휴대폰으로 보내는 양/그리는 시간 줄이기)
+# 페이지는 월별 인덱스의 날짜 최신순 그대로 자른다.
+# 저장 안 한 수정은 페이지마다 (편집 전 행, 편집한 표)로 기억해 두고, 저장 버튼은 모든 페이지 것을 한 번에 저장한다.
+PAGE_SIZE = int(st.secrets.get("page_size", 50))
+
+def ledger_editor(sheet_name, my_df, month_df, month, key, to_view, **editor_args):
+    # month_df: 그 달 행 전체 (날짜 최신순, index = 행 id, 모든 컬럼)
+    # to_view: 행 -> 편집기에 보일 컬럼만 남긴 표 (index 는 그대로)
+    pager = st.session_state.setdefault(f"pager_{key}", {"gen": 0, "pages": {}, "shown": None})
+
+    page_count = max(1, -(-len(month_df) // PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        col_page, col_info = st.columns([1, 2])
+        page = col_page.selectbox("페이지", range(1, page_count + 1), key=f"page_{key}_{month}",
+                                  format_func=lambda p: f"{p} / {page_count}")
+        first = (page - 1) * PAGE_SIZE
+        col_info.caption(f"총 {len(month_df)}건 중 {first + 1}~{min(first + PAGE_SIZE, len(month_df))}번째")
+    page_id = (month, page)
+
+    # 편집기에 처음 보여줄 표는 페이지가 바뀌거나, 데이터가 새로 불러와졌고 그 페이지에 수정이 없을 때만 다시 만든다
+    # (보여주는 중에 표를 바꾸면 편집기에 쌓인 수정이 어긋난다)
+    shown = pager["shown"]
+    if shown is None or shown["page"] != page_id or (shown["frame"] is not my_df and page_id not in pager["pages"]):
+        entry = pager["pages"].get(page_id)
+        if entry is None:
+            orig = month_df.iloc[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+            view = to_view(orig)
+            entry = {"orig": orig, "view": view, "edited": editor_frame(view)}
+        shown = pager["shown"] = {"page": page_id, "frame": my_df, "orig": entry["orig"], "view": entry["view"],
+                                  "base": entry["edited"]}
+
+    edited = st.data_editor(
+        shown["base"],
+        num_rows="dynamic",
+        use_container_width=True,
+        key=f"editor_{key}_{pager['gen']}_{month}_{page}",
+        hide_index=True,
+        column_config={**number_column_config(sheet_name), ROW_COL: None},
+        **editor_args,
+    )
+    if any(frame_changes(shown["view"], edited)):
+        pager["pages"][page_id] = {"orig": shown["orig"], "view": shown["view"], "edited": edited}
+    else:
+        pager["pages"].pop(page_id, None)
+
+    others = len(pager["pages"]) - (page_id in pager["pages"])
+    if others:
+        st.caption(f"✏️ 다른 페이지에 아직 저장 안 한 수정이 있습니다 ({others}페이지)")
+
+def hide_columns(rows):
+    # 사용자번호/기록ID/수정번호 빼고 그대로
+    return rows.drop(columns=[c for c in hidden_columns() if c in rows.columns])
+
+def reset_editor(key):
+    # 저장했거나 버릴 때: 기억해 둔 수정과 편집기 상태를 비운다
+    pager = st.session_state.get(f"pager_{key}")
+    if pager is not None:
+        pager["pages"], pager["shown"] = {}, None
+        pager["gen"] += 1
+
+def save_editor_changes(sheet_name, key, fix_rows):
+    pages = list(st.session_state.get(f"pager_{key}", {}).get("pages", {}).values())
+    changes = ({}, [], [])
+    for entry in pages:
+        updated, added, deleted = frame_changes(entry["view"], entry["edited"])
+        changes[0].update(updated)
+        changes[1].extend(added)
+        changes[2].extend(deleted)
+    if not pages:
+        st.info("변경된 내용이 없습니다.")
+        return
+    # 페이지마다 기억해 둔 편집 전 행 (수정번호 확인용)
+    orig = pd.concat([entry["orig"] for entry in pages])
+    orig = orig[~orig.index.duplicated()]
+    try:
+        with st.spinner("저장 중..."):
+            changed = update_my_data(sheet_name, orig, changes, fix_rows)
+    except SheetConflict:
+        reset_editor(key)
+        st.warning("⚠️ 불러온 뒤에 다른 곳에서 이 기록을 고치거나 지웠습니다. 새로 불러온 내용을 확인하고 다시 수정해주세요.")
+        return
+    except Exception as e:
+        # 재시도를 다 해도 안 되면 (할당량 초과 등) 화면은 그대로 두고 알려준다
+        st.error(f"⚠️ 저장 실패: {e}")
+        return
+    reset_editor(key)
+    if not changed:
+        st.info("변경된 내용이 없습니다.")
+        return
+    st.success("저장 완료!")
+    st.rerun()
 
 # --- 엑셀 다운로드 도우미 ---
 def convert_df_to_csv(df):
     return df.to_csv(index=False).encode('utf-8-sig')
 
+def csv_download(df, file_name, key):
+    # CSV 는 다운로드 버튼을 눌렀을 때만 만든다 (화면 그릴 때마다 인코딩하지 않도록, 리런도 안 함)
+    st.download_button(
+        label="📥 엑셀(CSV)로 다운로드",
+        data=lambda: convert_df_to_csv(df),
+        file_name=file_name,
+        mime="text/csv",
+        key=f"csv_{key}",
+        on_click="ignore",
+    )
+
 
 # --- 목표 관리 ---
+# 공용 저장소에 사용자번호별로 (redis 면 서버가 여러 대여도, 다시 켜도 그대로)
+DEFAULT_GOAL = 3000000
+
 def get_user_goal():
-    if 'my_goal' not in st.session_state:
-        st.session_state['my_goal'] = 3000000
-    return st.session_state['my_goal']
+    goal = shared.get(f"goal:{MY_KEY}")
+    return DEFAULT_GOAL if goal is None else int(goal)
 
 def set_user_goal(amount):
-    st.session_state['my_goal'] = amount
-
-
-# --- 숫자 변환 도우미 (쉼표, km 제거 후 숫자로 변환) ---
-def safe_numeric(series):
-    return pd.to_numeric(
-        series.astype(str)
-        .str.replace(',', '')
-        .str.replace('km', '', case=False)
-        .str.replace('Km', '', case=False)
-        .str.strip(), 
-        errors='coerce'
-    ).fillna(0)
+    shared.set(f"goal:{MY_KEY}", int(amount))
+
+
+# --- 화면 표시 형식 ---
+# 숫자는 정수 그대로 두고, 쉼표/단위는 표에 보여줄 때만 붙인다
+def number_column_config(sheet_name):
+    config = {}
+    for name, kind in COLUMNS[sheet_name]:
+        if kind == "won":
+            config[name] = st.column_config.NumberColumn(name, format="localized", step=1)
+        elif kind == "count":
+            config[name] = st.column_config.NumberColumn(name, format="%d", step=1, min_value=0)
+        elif kind == "km":
+            config[name] = st.column_config.NumberColumn(name, format="%d km", step=1, min_value=0)
+    return config
 
 # ================= 메인 화면 =================
 col_title, col_logout = st.columns([4, 1])
@@ -181,51 +495,119 @@ with col_logout:
 st.sidebar.header(f"👤 {CURRENT_USER}님 현황")
 goal_amount = get_user_goal()
 
-# 1. 데이터 로드
-df_work = load_data(SHEET_WORK)
-df_bank = load_data(SHEET_BANK)
-df_maint = load_data(SHEET_MAINT)
-
-# 2. 숫자 변환 (계산용)
-if not df_work.empty:
-    for col in ['수입', '배달건수', '평균단가']:
-        if col in df_work.columns:
-            df_work[col] = safe_numeric(df_work[col])
-
-if not df_bank.empty:
-    for col in ['입금액']:
-        if col in df_bank.columns:
-            df_bank[col] = safe_numeric(df_bank[col])
-
-if not df_maint.empty:
-    for col in ['금액']:
-        if col in df_maint.columns:
-            df_maint[col] = safe_numeric(df_maint[col])
-
-# 3. 요약 계산
-current_profit = 0
-current_count = 0
-if not df_work.empty:
-    current_month = datetime.now().strftime("%Y-%m")
-    month_data = df_work[df_work['날짜'].astype(str).str.contains(current_month, na=False)]
-    current_profit = month_data['수입'].sum()
-    current_count = month_data['배달건수'].sum()
+# 화면 선택 (st.tabs 는 안 보이는 탭까지 전부 계산하므로, 고른 화면만 그린다)
+TAB_WORK, TAB_BANK, TAB_MAINT, TAB_STATS = "📝배달매출", "💰입금관리", "🛠️정비관리", "📊통계"
+# 통계는 집계표만 읽으므로 시트를 불러오지 않는다
+TAB_SHEETS = {TAB_WORK: [SHEET_WORK], TAB_BANK: [SHEET_BANK], TAB_MAINT: [SHEET_MAINT], TAB_STATS: []}
+active_tab = st.radio("화면", list(TAB_SHEETS), horizontal=True, key="active_tab", label_visibility="collapsed")
+
+# 1. 데이터 로드 (고른 화면에 필요한 시트만, 여러 개면 동시에)
+# 집계표가 아직 없는 사용자면 매출기록도 같이 불러와서 한 번 만든다
+needed_sheets = list(TAB_SHEETS[active_tab])
+if not rollups.has(MY_KEY) and SHEET_WORK not in needed_sheets:
+    needed_sheets.append(SHEET_WORK)
+with perf.timed("page.load_all"):
+    frames, load_status = load_all(needed_sheets)
+df_work = frames.get(SHEET_WORK, pd.DataFrame())
+df_bank = frames.get(SHEET_BANK, pd.DataFrame())
+df_maint = frames.get(SHEET_MAINT, pd.DataFrame())
+
+def rebuild_rollups(work_rows):
+    # 보관 합계를 못 읽으면 지난 해가 빠진 채로 만들지 않고 다음 화면에서 다시 시도
+    try:
+        archived = get_archived_totals().get(MY_KEY) if STORAGE_BACKEND == "sheets" else None
+    except Exception as e:
+        st.sidebar.warning(f"⚠️ 지난 해 합계를 불러오지 못했습니다: {e}")
+        return
+    with perf.timed("rollups.rebuild"):
+        rollups.rebuild(MY_KEY, work_rows, archived)
+
+if sheet_ready(SHEET_WORK) and not rollups.has(MY_KEY):
+    rebuild_rollups(df_work.values.tolist())
+
+# 3. 요약 계산 (집계표에서 이번 달 합계만 읽음)
+current_month = datetime.now().strftime("%Y-%m")
+current_profit, current_count = rollups.total(MY_KEY, "M" + current_month)
 
 progress = min(current_profit / goal_amount, 1.0) if goal_amount > 0 else 0
 st.sidebar.progress(progress)
 st.sidebar.write(f"💰 이번 달 수입: **{int(current_profit):,}원**")
 st.sidebar.write(f"🛵 이번 달 배달: **{int(current_count)}건**")
-
-new_goal = st.sidebar.number_input("목표 금액 (임시)", value=goal_amount, step=100000, format="%d")
+if not rollups.has(MY_KEY):
+    st.sidebar.caption("⏳ 매출 기록을 불러오지 못해 0으로 표시 중입니다.")
+
+pending_count = write_queue.pending_count(MY_KEY)
+failed_rows = write_queue.failed_rows(MY_KEY)
+if pending_count:
+    st.sidebar.caption(f"⏳ 전송 대기 {pending_count}건")
+    if write_queue.last_error:
+        st.sidebar.caption(f"⚠️ 재시도 중: {write_queue.last_error}")
+elif not failed_rows:
+    st.sidebar.caption(f"✅ 모든 기록 저장됨 (이번 접속 {write_queue.synced_count(MY_KEY)}건 전송)")
+
+# 다시 보내도 안 되는 오류로 빠진 기록 (write_queue 실패 목록)
+if failed_rows:
+    with st.sidebar.expander(f"❌ 보내지 못한 기록 {len(failed_rows)}건", expanded=True):
+        st.caption(f"오류: {failed_rows[-1][2]}")
+        for sheet_name, row, _ in failed_rows[:10]:
+            shown = [v for name, v in zip(column_names(sheet_name), row) if name not in hidden_columns() and v != ""]
+            st.caption(f"{sheet_name} · " + " · ".join(str(v) for v in shown))
+        c_retry, c_drop = st.columns(2)
+        if c_retry.button("다시 보내기", key="failed_retry"):
+            write_queue.retry_failed(MY_KEY)
+            st.rerun()
+        if c_drop.button("버리기", key="failed_drop"):
+            write_queue.discard_failed(MY_KEY)
+            st.rerun()
+
+new_goal = st.sidebar.number_input("목표 금액", value=goal_amount, step=100000, format="%d")
 if st.sidebar.button("목표 설정"):
     set_user_goal(new_goal)
     st.rerun()
 
-# 탭 구성
-tab1, tab2, tab3, tab4 = st.tabs(["📝배달매출", "💰입금관리", "🛠️정비관리", "📊통계"])
+# --- 기록 내보내기 (여러 달 / 전체, 여러 장부) ---
+# 파일은 다운로드 버튼을 누를 때 화면과 따로 만든다 (export.py, 저장소에서 조금씩 읽어서 씀)
+EXPORT_SHEETS = {"매출": SHEET_WORK, "입금": SHEET_BANK, "정비": SHEET_MAINT}
+
+with st.sidebar.expander("📦 기록 내보내기"):
+    export_picked = st.multiselect("장부", list(EXPORT_SHEETS), default=list(EXPORT_SHEETS), key="export_sheets")
+    export_start = export_end = None
+    if not st.checkbox("전체 기간", value=True, key="export_all"):
+        period = st.date_input("기간", (datetime.now().replace(month=1, day=1), datetime.now()),
+                               format="YYYY.MM.DD", key="export_period")
+        if len(period) == 2:
+            export_start, export_end = (d.isoformat() for d in period)
+    export_format = st.radio("형식", ["CSV"] + (["엑셀"] if export.HAS_XLSX else []), horizontal=True, key="export_format")
+    if export_picked:
+        export_sheets = [EXPORT_SHEETS[name] for name in export_picked]
+        export_fmt = "xlsx" if export_format == "엑셀" else "csv"
+        kind = export.file_kind(export_sheets, export_fmt)
+        st.download_button(
+            label="📥 내려받기",
+            data=functools.partial(export.build_export, storage, export_sheets, MY_KEY,
+                                   export_fmt, export_start, export_end),
+            file_name=f"배달장부_{CURRENT_USER}_{export_start or '처음'}~{export_end or '오늘'}.{kind}",
+            mime=export.MIME[kind],
+            key="export_download",
+            on_click="ignore",
+        )
+
+# --- 비밀번호 바꾸기 (사용자 목록만 고친다. 장부 행은 사용자번호라 그대로) ---
+with st.sidebar.expander("🔑 비밀번호 바꾸기"):
+    with st.form("password_form", clear_on_submit=True):
+        old_pw = st.text_input("지금 비밀번호", type="password")
+        new_pw = st.text_input("새 비밀번호", type="password")
+        new_pw2 = st.text_input("새 비밀번호 확인", type="password")
+        if st.form_submit_button("바꾸기"):
+            if not new_pw or new_pw != new_pw2:
+                st.warning("새 비밀번호를 똑같이 두 번 입력해주세요.")
+            elif get_user_registry(STORAGE_BACKEND).set_password(CURRENT_USER, old_pw, new_pw):
+                st.success("비밀번호를 바꿨습니다. 다음 로그인부터 새 비밀번호를 쓰세요.")
+            else:
+                st.error("지금 비밀번호가 맞지 않습니다.")
 
 # ================= [탭 1] 배달 매출 =================
-with tab1:
+if active_tab == TAB_WORK:
     st.subheader("📝 금일매출")
     with st.container(border=True):
         with st.form("work_form", clear_on_submit=True):
@@ -248,103 +630,54 @@ with tab1:
                 else:
                     avg_price = 0
                 
-                # [저장 포맷팅] 쉼표 추가 (30,000)
-                fmt_revenue = "{:,}".format(int(revenue))
-                fmt_price = "{:,}".format(int(avg_price))
-                
-                save_new_entry(SHEET_WORK, [date, platform_label, fmt_revenue, count, fmt_price, memo])
+                save_new_entry(SHEET_WORK, [date, platform_label, int(revenue), int(count), avg_price, memo])
                 
-                st.success("✅ 저장되었습니다!")
+                st.toast("✅ 저장되었습니다!")
                 reset_forms()
-                time.sleep(0.5)
                 st.rerun()
+        # 중복 확인에 내 기록이 필요해서 불러온 뒤에만
+        if sheet_ready(SHEET_WORK):
+            import_panel(SHEET_WORK, df_work, "work", ["쿠팡", "배민", "일반대행", "기타"])
 
     st.write("---")
     st.subheader("📋 전체 내역 (수정/삭제)")
+    show_pending_rows(SHEET_WORK)
     
-    if not df_work.empty:
-        df_view = df_work.copy()
-        df_view['날짜_dt'] = pd.to_datetime(df_view['날짜'], errors='coerce')
-        df_view['월'] = df_view['날짜_dt'].dt.strftime('%Y-%m')
-        
-        all_months = sorted(df_view['월'].dropna().unique().tolist(), reverse=True)
+    if not sheet_ready(SHEET_WORK):
+        show_load_status(SHEET_WORK, "tab1")
+    elif not df_work.empty:
+        # 월 목록/한 달 치 표는 월별 인덱스에서 바로 꺼낸다 (데이터가 바뀔 때만 다시 만듦)
+        work_months = frame_cache.month_index(SHEET_WORK, MY_KEY, df_work)
+        all_months = work_months.months
         
         if all_months:
             col_sel, _ = st.columns([1, 2])
             selected_month = col_sel.selectbox("📅 조회할 월(Month) 선택", all_months)
             
-            current_month_df = df_view[df_view['월'] == selected_month].drop(columns=['날짜_dt', '월'])
-            
-            cols_to_hide = ['아이디', '비번']
-            current_month_df = current_month_df.drop(columns=[c for c in cols_to_hide if c in current_month_df.columns])
+            # 월별 인덱스가 이미 날짜 최신순
+            current_month_df = work_months.rows(selected_month)
 
-            # 화면 표시를 위해 쉼표 포맷팅 적용 (문자열로 변환)
-            current_month_df['수입'] = current_month_df['수입'].apply(lambda x: "{:,}".format(int(x)))
-            
-            # 평균단가 재계산 후 쉼표 적용
-            # 원본 데이터가 문자열일 수 있으므로 safe_numeric 한번 거침
-            temp_rev = safe_numeric(current_month_df['수입'])
-            temp_cnt = safe_numeric(current_month_df['배달건수'])
-            
-            current_month_df['평균단가'] = (temp_rev / temp_cnt).fillna(0).astype(int)
-            current_month_df['평균단가'] = current_month_df['평균단가'].apply(lambda x: "{:,}".format(int(x)))
+            def work_view(rows):
+                view = rows.drop(columns=[c for c in hidden_columns() if c in rows.columns])
+                # 평균단가 재계산 (쉼표는 표에서 표시만)
+                view['평균단가'] = average_price(view['수입'], view['배달건수'])
+                view_cols = ["날짜", "플랫폼", "수입", "배달건수", "평균단가", "메모"]
+                return view[[c for c in view_cols if c in view.columns]]
 
-            view_cols = ["날짜", "플랫폼", "수입", "배달건수", "평균단가", "메모"]
-            final_view_cols = [c for c in view_cols if c in current_month_df.columns]
-            current_month_df = current_month_df[final_view_cols]
-            
-            sorted_view = current_month_df.sort_values(by="날짜", ascending=False)
-            
-            edited_df = st.data_editor(
-                sorted_view,
-                num_rows="dynamic",
-                use_container_width=True,
-                key="editor_work",
-                hide_index=True,
-                disabled=["평균단가"]
-            )
+            ledger_editor(SHEET_WORK, df_work, current_month_df, selected_month, "work", work_view,
+                          disabled=["평균단가"])
 
-            csv = convert_df_to_csv(edited_df)
-            st.download_button(
-                label="📥 엑셀(CSV)로 다운로드",
-                data=csv,
-                file_name=f"매출기록_{selected_month}_{CURRENT_USER}.csv",
-                mime="text/csv",
-            )
+            csv_download(work_view(current_month_df), f"매출기록_{selected_month}_{CURRENT_USER}.csv", "work")
             
             if st.button("🔴 매출 수정/삭제 반영"):
-                with st.spinner("저장 중..."):
-                    # 수정된 데이터는 문자열(30,000)이므로 숫자로 변환
-                    edited_df['수입'] = safe_numeric(edited_df['수입'])
-                    edited_df['배달건수'] = safe_numeric(edited_df['배달건수'])
-                    
-                    # 재계산
-                    edited_df['평균단가'] = edited_df.apply(
-                        lambda row: int(row['수입'] / row['배달건수']) if row['배달건수'] > 0 else 0, 
-                        axis=1
-                    )
-                    
-                    # 저장 전 다시 쉼표 포맷팅
-                    edited_df['수입'] = edited_df['수입'].apply(lambda x: "{:,}".format(int(x)))
-                    edited_df['평균단가'] = edited_df['평균단가'].apply(lambda x: "{:,}".format(int(x)))
-
-                    df_work['날짜_temp'] = pd.to_datetime(df_work['날짜'], errors='coerce')
-                    df_work['월_temp'] = df_work['날짜_temp'].dt.strftime('%Y-%m')
-                    
-                    my_data_keep = df_work[df_work['월_temp'] != selected_month].drop(columns=['날짜_temp', '월_temp'])
-                    my_final_df = pd.concat([my_data_keep, edited_df], ignore_index=True)
-                    
-                    update_my_data(SHEET_WORK, my_final_df)
-                    
-                st.success("수정 완료!")
-                st.rerun()
+                save_editor_changes(SHEET_WORK, "work", fix_work_rows)
         else:
             st.info("데이터가 없습니다.")
     else:
         st.info("저장된 데이터가 없습니다.")
 
 # ================= [탭 2] 입금 관리 =================
-with tab2:
+if active_tab == TAB_BANK:
     st.subheader("💰 입금 내역 입력")
     with st.container(border=True):
         with st.form("bank_form", clear_on_submit=True):
@@ -355,76 +688,42 @@ with tab2:
             m = st.text_input("메모", key=f"b_mem_{st.session_state.form_id}")
             
             if st.form_submit_button("💾 입금 저장", type="primary"):
-                # 입금액 쉼표 포맷팅
-                fmt_amt = "{:,}".format(int(a))
-                save_new_entry(SHEET_BANK, [d, s, fmt_amt, m])
-                st.success("✅ 저장 완료!")
+                save_new_entry(SHEET_BANK, [d, s, int(a), m])
+                st.toast("✅ 저장 완료!")
                 reset_forms()
-                time.sleep(0.5)
                 st.rerun()
+        if sheet_ready(SHEET_BANK):
+            import_panel(SHEET_BANK, df_bank, "bank", ["쿠팡", "배민", "기타"])
 
     st.write("---")
     st.subheader("📋 입금 전체 내역 (수정/삭제)")
+    show_pending_rows(SHEET_BANK)
 
-    if not df_bank.empty:
-        df_bank_view = df_bank.copy()
-        df_bank_view['날짜_dt'] = pd.to_datetime(df_bank_view['입금날짜'], errors='coerce')
-        df_bank_view['월'] = df_bank_view['날짜_dt'].dt.strftime('%Y-%m')
-
-        all_months_bank = sorted(df_bank_view['월'].dropna().unique().tolist(), reverse=True)
+    if not sheet_ready(SHEET_BANK):
+        show_load_status(SHEET_BANK, "tab2")
+    elif not df_bank.empty:
+        bank_months = frame_cache.month_index(SHEET_BANK, MY_KEY, df_bank)
+        all_months_bank = bank_months.months
 
         if all_months_bank:
             col_sel_bank, _ = st.columns([1, 2])
             selected_month_bank = col_sel_bank.selectbox("📅 조회할 월 선택", all_months_bank, key="bank_month_select")
 
-            current_month_bank_df = df_bank_view[df_bank_view['월'] == selected_month_bank].drop(columns=['날짜_dt', '월'])
+            current_month_bank_df = bank_months.rows(selected_month_bank)
             
-            cols_to_hide = ['아이디', '비번']
-            current_month_bank_df = current_month_bank_df.drop(columns=[c for c in cols_to_hide if c in current_month_bank_df.columns])
-            
-            # 화면 표시용 쉼표
-            current_month_bank_df['입금액'] = current_month_bank_df['입금액'].apply(lambda x: "{:,}".format(int(safe_numeric(pd.Series([x]))[0])))
-
-            sorted_bank_view = current_month_bank_df.sort_values(by="입금날짜", ascending=False)
+            ledger_editor(SHEET_BANK, df_bank, current_month_bank_df, selected_month_bank, "bank", hide_columns)
 
-            edited_bank = st.data_editor(
-                sorted_bank_view,
-                num_rows="dynamic",
-                use_container_width=True,
-                key="editor_bank",
-                hide_index=True
-            )
-
-            csv_bank = convert_df_to_csv(edited_bank)
-            st.download_button(
-                label="📥 엑셀(CSV)로 다운로드",
-                data=csv_bank,
-                file_name=f"입금기록_{selected_month_bank}_{CURRENT_USER}.csv",
-                mime="text/csv",
-            )
+            csv_download(hide_columns(current_month_bank_df), f"입금기록_{selected_month_bank}_{CURRENT_USER}.csv", "bank")
             
             if st.button("🔴 입금 수정/삭제 반영"):
-                with st.spinner("저장 중..."):
-                    # 저장 전 다시 포맷팅
-                    edited_bank['입금액'] = safe_numeric(edited_bank['입금액']).apply(lambda x: "{:,}".format(int(x)))
-
-                    df_bank['날짜_temp'] = pd.to_datetime(df_bank['입금날짜'], errors='coerce')
-                    df_bank['월_temp'] = df_bank['날짜_temp'].dt.strftime('%Y-%m')
-
-                    my_data_keep = df_bank[df_bank['월_temp'] != selected_month_bank].drop(columns=['날짜_temp', '월_temp'])
-                    my_final_df = pd.concat([my_data_keep, edited_bank], ignore_index=True)
-                    
-                    update_my_data(SHEET_BANK, my_final_df)
-
-                st.success("저장 완료!")
-                st.rerun()
+                save_editor_changes(SHEET_BANK, "bank", None)
         else:
             st.info("데이터가 없습니다.")
     else:
         st.info("입금 내역이 없습니다.")
 
 # ================= [탭 3] 정비 관리 =================
-with tab3:
+if active_tab == TAB_MAINT:
     st.subheader("🛠️ 오토바이 정비 입력")
     
     maint_items = [
@@ -454,154 +753,163 @@ with tab3:
             if not final_item:
                 st.warning("항목을 입력해주세요!")
             else:
-                # [변경] 비용은 쉼표, 거리는 쉼표 + km
-                fmt_cost = "{:,}".format(int(c))
-                
-                # 거리 입력값 처리 (숫자만 추출해서 포맷팅)
-                try:
-                    raw_km = int(''.join(filter(str.isdigit, str(k))))
-                    fmt_km = "{:,} km".format(raw_km)
-                except:
-                    fmt_km = str(k)
-
-                save_new_entry(SHEET_MAINT, [d, final_item, fmt_cost, fmt_km, m])
-                st.success(f"✅ 저장 완료!")
-                reset_forms()
-                time.sleep(0.5)
-                st.rerun()
+                # 거리는 숫자(km)로만 저장
+                km = parse_number(k)
+                if k.strip() and km is None:
+                    st.warning("주행거리는 숫자로 입력해주세요! (예: 12345)")
+                else:
+                    save_new_entry(SHEET_MAINT, [d, final_item, int(c), "" if km is None else km, m])
+                    st.toast("✅ 저장 완료!")
+                    reset_forms()
+                    st.rerun()
 
     st.write("---")
+    show_pending_rows(SHEET_MAINT)
     st.subheader("🚗 내 오토바이 정비 현황")
-    st.caption("항목별 마지막 정비 기록입니다.")
+    st.caption("항목별 마지막 정비 기록과, 최근 주행거리로 계산한 다음 정비 예상입니다.")
+
+    # 정비 현황 인덱스가 없으면 불러온 기록으로 한 번 만든다 (그 뒤로는 저장할 때마다 고쳐짐)
+    if sheet_ready(SHEET_MAINT) and not maint_index.has(MY_KEY):
+        with perf.timed("maint_index.rebuild"):
+            maint_index.rebuild(MY_KEY, df_maint.values.tolist())
 
-    if not df_maint.empty:
-        df_status = df_maint.sort_values(by="날짜", ascending=False).drop_duplicates(["항목"])
-        df_status_view = df_status[["항목", "날짜", "당시주행거리", "메모"]]
-        st.dataframe(df_status_view, hide_index=True, use_container_width=True)
+    if not maint_index.has(MY_KEY):
+        show_load_status(SHEET_MAINT, "tab3")
     else:
-        st.info("기록이 없습니다.")
+        status = maint_index.projections(MY_KEY, SERVICE_INTERVALS)
+        if status:
+            _, odo_km, rate = maint_index.odometer(MY_KEY)
+            if rate:
+                st.caption(f"최근 하루 평균 {rate:,.0f} km 주행 (마지막 기록 {odo_km:,} km)")
+            df_status_view = pd.DataFrame(status)[["항목", "상태", "날짜", "당시주행거리", "남은거리", "예정일", "메모"]]
+            st.dataframe(df_status_view, hide_index=True, use_container_width=True, column_config={
+                **number_column_config(SHEET_MAINT),
+                "남은거리": st.column_config.NumberColumn("남은거리", format="%d km"),
+            })
+        else:
+            st.info("기록이 없습니다.")
+        if sheet_ready(SHEET_MAINT) and st.button("🔄 정비 현황 다시 계산", key="rebuild_maint_index"):
+            # 다른 기기/시트에서 직접 고친 게 안 맞을 때
+            maint_index.rebuild(MY_KEY, load_data(SHEET_MAINT).values.tolist())
+            st.rerun()
 
     st.write("---")
     
-    with st.expander("📋 정비 전체 기록 수정/삭제 (클릭)", expanded=True):
+    # 접힌 expander 안의 코드도 매번 실행되므로, 켰을 때만 전체 기록 표를 만든다
+    if st.toggle("📋 정비 전체 기록 수정/삭제", key="show_maint_editor"):
         if not df_maint.empty:
-            df_maint_view = df_maint.copy()
-            df_maint_view['날짜_dt'] = pd.to_datetime(df_maint_view['날짜'], errors='coerce')
-            df_maint_view['월'] = df_maint_view['날짜_dt'].dt.strftime('%Y-%m')
-
-            all_months_maint = sorted(df_maint_view['월'].dropna().unique().tolist(), reverse=True)
+            maint_months = frame_cache.month_index(SHEET_MAINT, MY_KEY, df_maint)
+            all_months_maint = maint_months.months
             
             if all_months_maint:
                 col_sel_m, _ = st.columns([1, 2])
                 selected_month_maint = col_sel_m.selectbox("📅 정비 내역 '월(Month)' 선택", all_months_maint, key="maint_month_select")
                 
-                current_month_maint_df = df_maint_view[df_maint_view['월'] == selected_month_maint].drop(columns=['날짜_dt', '월'])
+                current_month_maint_df = maint_months.rows(selected_month_maint)
                 
-                cols_to_hide = ['아이디', '비번']
-                current_month_maint_df = current_month_maint_df.drop(columns=[c for c in cols_to_hide if c in current_month_maint_df.columns])
-                
-                # 화면 표시용 쉼표 포맷팅
-                current_month_maint_df['금액'] = current_month_maint_df['금액'].apply(lambda x: "{:,}".format(int(safe_numeric(pd.Series([x]))[0])))
+                ledger_editor(SHEET_MAINT, df_maint, current_month_maint_df, selected_month_maint, "maint", hide_columns)
 
-                sorted_maint = current_month_maint_df.sort_values(by="날짜", ascending=False)
-                
-                edited_maint = st.data_editor(
-                    sorted_maint,
-                    num_rows="dynamic",
-                    use_container_width=True,
-                    key="editor_maint",
-                    hide_index=True
-                )
-
-                csv_maint = convert_df_to_csv(edited_maint)
-                st.download_button(
-                    label="📥 엑셀(CSV)로 다운로드",
-                    data=csv_maint,
-                    file_name=f"정비기록_{selected_month_maint}_{CURRENT_USER}.csv",
-                    mime="text/csv",
-                )
+                csv_download(hide_columns(current_month_maint_df), f"정비기록_{selected_month_maint}_{CURRENT_USER}.csv", "maint")
                 
                 if st.button("🔴 정비 수정/삭제 반영"):
-                    with st.spinner("저장 중..."):
-                        # 저장 전 포맷팅 (금액 쉼표, 거리 km 유지)
-                        edited_maint['금액'] = safe_numeric(edited_maint['금액']).apply(lambda x: "{:,}".format(int(x)))
-                        
-                        def reformat_km(val):
-                            try:
-                                num = int(''.join(filter(str.isdigit, str(val))))
-                                return "{:,} km".format(num)
-                            except:
-                                return str(val)
-                        edited_maint['당시주행거리'] = edited_maint['당시주행거리'].apply(reformat_km)
-
-                        df_maint['날짜_temp'] = pd.to_datetime(df_maint['날짜'], errors='coerce')
-                        df_maint['월_temp'] = df_maint['날짜_temp'].dt.strftime('%Y-%m')
-                        
-                        my_data_keep = df_maint[df_maint['월_temp'] != selected_month_maint].drop(columns=['날짜_temp', '월_temp'])
-                        
-                        my_final_df = pd.concat([my_data_keep, edited_maint], ignore_index=True)
-                        
-                        update_my_data(SHEET_MAINT, my_final_df)
-                        
-                    st.success("저장 완료!")
-                    st.rerun()
+                    save_editor_changes(SHEET_MAINT, "maint", None)
             else:
                  st.info("표시할 날짜 데이터가 없습니다.")
-        else:
+        elif sheet_ready(SHEET_MAINT):
             st.info("기록이 없습니다.")
 
 # ================= [탭 4] 통계 =================
-with tab4:
-    if not df_work.empty:
-        df_stat = df_work.copy()
-        df_stat['날짜'] = pd.to_datetime(df_stat['날짜'], errors='coerce')
-        df_stat = df_stat.dropna(subset=['날짜'])
+# 원본 기록 대신 집계표(일/월/년 합계)만 읽는다
+if active_tab == TAB_STATS:
+    if not rollups.has(MY_KEY):
+        show_load_status(SHEET_WORK, "tab4")
+    elif rollups.months(MY_KEY):
+        st.subheader("📊 월별 상세 분석 (Monthly)")
+        unique_months = sorted(rollups.months(MY_KEY), reverse=True)
         
-        if not df_stat.empty:
-            df_stat['년'] = df_stat['날짜'].dt.year
-            df_stat['월'] = df_stat['날짜'].dt.strftime('%Y-%m')
-            
-            st.subheader("📊 월별 상세 분석 (Monthly)")
-            unique_months = sorted(df_stat['월'].unique().tolist(), reverse=True)
-            
-            if unique_months:
-                selected_month = st.selectbox("조회할 월 선택", unique_months)
-                month_data = df_stat[df_stat['월'] == selected_month]
-
-                stat_profit = month_data['수입'].sum()
-                stat_count = month_data['배달건수'].sum()
+        selected_month = st.selectbox("조회할 월 선택", unique_months)
+        stat_profit, stat_count = rollups.total(MY_KEY, "M" + selected_month)
+
+        m1, m2 = st.columns(2)
+        m1.metric(f"{selected_month} 총 수입", f"{int(stat_profit):,}원")
+        m2.metric(f"{selected_month} 총 배달", f"{int(stat_count)}건")
+
+        st.write(f"###### 📈 {selected_month} 일별 수익 변화")
+        days = rollups.days_in_month(MY_KEY, selected_month)
+        daily_chart = pd.Series([rev for _, rev, _ in days], index=[f"{day[-2:]}일" for day, _, _ in days], name='수입')
+        daily_chart.index.name = '일'
+        if days:
+            st.bar_chart(daily_chart)
+        else:
+            # 연도별 시트로 옮긴 달은 월 합계만 남아 있다
+            st.caption("보관된 달이라 일별 기록은 없습니다.")
 
-                m1, m2 = st.columns(2)
-                m1.metric(f"{selected_month} 총 수입", f"{int(stat_profit):,}원")
-                m2.metric(f"{selected_month} 총 배달", f"{int(stat_count)}건")
+        st.write("---")
 
-                st.write(f"###### 📈 {selected_month} 일별 수익 변화")
-                month_data['일'] = month_data['날짜'].dt.strftime('%d일')
-                daily_chart = month_data.groupby('일')['수입'].sum()
-                st.bar_chart(daily_chart)
-            else:
-                st.info("데이터가 없습니다.")
+        st.subheader("📅 연간 매출 분석 (Yearly)")
+        unique_years = sorted(rollups.years(MY_KEY), reverse=True)
+        selected_year = st.selectbox("조회할 년도 선택", unique_years)
+        total_profit_year, total_count_year = rollups.total(MY_KEY, f"Y{selected_year}")
+        
+        c1, c2 = st.columns(2)
+        c1.metric(f"{selected_year}년 총 수입", f"{int(total_profit_year):,}원")
+        c2.metric(f"{selected_year}년 총 배달", f"{int(total_count_year):,}건")
+        
+        months = rollups.months_in_year(MY_KEY, selected_year)
+        monthly_chart = pd.Series([rev for _, rev, _ in months], index=[int(month[-2:]) for month, _, _ in months], name='수입')
+        monthly_chart.index.name = '월_숫자'
+        st.bar_chart(monthly_chart)
+    else:
+        st.info("데이터가 없습니다.")
 
-            st.write("---")
+    if rollups.has(MY_KEY) and st.button("🔄 통계 다시 계산", key="rebuild_rollups"):
+        # 누를 때만 매출기록을 불러와서 다시 만든다
+        get_archived_totals.clear()
+        rebuild_rollups(load_data(SHEET_WORK).values.tolist())
+        st.rerun()
 
-            st.subheader("📅 연간 매출 분석 (Yearly)")
-            unique_years = sorted(df_stat['년'].unique(), reverse=True)
-            if unique_years:
-                selected_year = st.selectbox("조회할 년도 선택", unique_years)
-                year_data = df_stat[df_stat['년'] == selected_year]
-                
-                if not year_data.empty:
-                    total_profit_year = year_data['수입'].sum()
-                    total_count_year = year_data['배달건수'].sum()
-                    
-                    c1, c2 = st.columns(2)
-                    c1.metric(f"{selected_year}년 총 수입", f"{int(total_profit_year):,}원")
-                    c2.metric(f"{selected_year}년 총 배달", f"{int(total_count_year):,}건")
-                    
-                    year_data['월_숫자'] = year_data['날짜'].dt.month
-                    monthly_chart = year_data.groupby('월_숫자')['수입'].sum()
-                    st.bar_chart(monthly_chart)
-                else:
-                    st.info("데이터가 없습니다.")
-            else:
-                st.info("데이터가 없습니다.")
+# ================= [관리자] 성능 패널 =================
+# secrets 의 admin_users = { 아이디 = "비밀번호" } 에 있는 사람만 본다 (로그인할 때 확인)
+
+def show_perf_panel():
+    summary = perf.recorder.summary()
+    api_calls = perf.recorder.api_calls()
+    total_calls = sum(sum(stages.values()) for stages in api_calls.values())
+    minutes = max((time.time() - perf.recorder.started) / 60, 1 / 60)
+
+    with st.sidebar.expander("⚙️ 성능 (관리자)"):
+        c1, c2 = st.columns(2)
+        c1.metric("이번 화면", f"{(time.perf_counter() - RERUN_START) * 1000:.0f} ms")
+        c2.metric("분당 API 호출", f"{total_calls / minutes:.1f}")
+        c1.metric("내 세션 API 호출", sum(api_calls.get(perf.current_session(), {}).values()))
+        c2.metric("전체 API 호출", total_calls)
+
+        cache = snapshot_cache.stats()
+        st.caption(
+            f"캐시 적중 {cache['hits']} / 미스 {cache['misses']} ({cache['hit_rate']:.0%}), "
+            f"항목 {cache['entries']}개, TTL {cache['ttl']}초"
+        )
+        st.caption(f"공용 캐시: {cache['shared']}, 다른 서버가 불러 둔 것 {cache['shared_hits']}회")
+        st.caption(f"전송 대기 전체 {write_queue.pending_count()}건")
+        if STORAGE_BACKEND != "sqlite":
+            sched = get_scheduler().stats()
+            st.caption(
+                f"시트 요청 대기 읽기 {sched['waiting_read']} / 쓰기 {sched['waiting_write']}, "
+                f"합친 읽기 {sched['coalesced']}회, 재시도 {sched['retries']}회, 속도 조절 {sched['throttled']}회"
+            )
+        if summary:
+            st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True)
+            st.dataframe(
+                pd.DataFrame([(s, stage, n) for s, stages in api_calls.items() for stage, n in stages.items()],
+                             columns=["세션", "호출", "횟수"]),
+                hide_index=True, use_container_width=True,
+            )
+        st.download_button("📥 JSON", perf.recorder.to_json({"cache": cache}), file_name="perf.json", mime="application/json")
+        st.download_button("📥 CSV", perf.recorder.to_csv(), file_name="perf.csv", mime="text/csv")
+        if st.button("기록 초기화", key="perf_reset"):
+            perf.recorder.reset()
+            st.rerun()
+
+perf.recorder.record("page.render", time.perf_counter() - RERUN_START)
+if st.session_state.get('is_admin'):
+    show_perf_panel()
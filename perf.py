@@ -0,0 +1,173 @@
+import contextlib
+import contextvars
+import csv
+import io
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+
+# ==========================================
+# [성능 측정]
+# 구글 시트 호출과 주요 pandas 단계의 걸린 시간, 행 수, 대략적인 바이트 수를
+# 단계별로 모으고, 세션별 API 호출 수를 센다. (관리자 사이드바 패널에서 봄)
+# 세션은 contextvar 로 구분하고, 백그라운드 작업(쓰기 대기열 등)은 "background" 로 잡힌다.
+# ==========================================
+HISTORY = 2000
+
+_session = contextvars.ContextVar("perf_session", default=None)
+
+
+def set_session(label):
+    _session.set(label)
+
+
+def current_session():
+    return _session.get() or "background"
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self, history=HISTORY):
+        self.history = history
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._latency = defaultdict(lambda: deque(maxlen=self.history))
+        self._totals = defaultdict(lambda: {"count": 0, "seconds": 0.0, "rows": 0, "bytes": 0, "errors": 0})
+        self._api_calls = defaultdict(lambda: defaultdict(int))
+        self.started = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def record(self, stage, seconds, rows=0, nbytes=0, api=False, error=False):
+        with self._lock:
+            self._latency[stage].append(seconds)
+            total = self._totals[stage]
+            total["count"] += 1
+            total["seconds"] += seconds
+            total["rows"] += rows
+            total["bytes"] += nbytes
+            total["errors"] += int(error)
+            if api:
+                self._api_calls[current_session()][stage] += 1
+
+    def summary(self):
+        # 단계별: 횟수, p50/p95/최대(ms), 행/바이트 합계
+        with self._lock:
+            result = []
+            for stage, total in sorted(self._totals.items()):
+                values = list(self._latency[stage])
+                result.append({
+                    "stage": stage,
+                    "count": total["count"],
+                    "p50_ms": round(_percentile(values, 0.5) * 1000, 1),
+                    "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                    "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+                    "total_s": round(total["seconds"], 3),
+                    "rows": total["rows"],
+                    "bytes": total["bytes"],
+                    "errors": total["errors"],
+                })
+            return result
+
+    def api_calls(self):
+        # 세션별 API 호출 수: {세션: {단계: 횟수}}
+        with self._lock:
+            return {session: dict(stages) for session, stages in self._api_calls.items()}
+
+    def to_json(self, extra=None):
+        # extra: 캐시 통계처럼 같이 내보낼 값
+        return json.dumps(
+            {"since": self.started, "stages": self.summary(), "api_calls": self.api_calls(), **(extra or {})},
+            ensure_ascii=False,
+            indent=2,
+        )
+
+    def to_csv(self):
+        rows = self.summary()
+        buf = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(buf, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return buf.getvalue()
+
+
+recorder = Recorder()
+
+
+@contextlib.contextmanager
+def timed(stage, api=False):
+    # with timed("pandas.parse") as info: ...; info["rows"] = len(df)
+    info = {"rows": 0, "bytes": 0}
+    start = time.perf_counter()
+    error = False
+    try:
+        yield info
+    except Exception:
+        error = True
+        raise
+    finally:
+        recorder.record(stage, time.perf_counter() - start, info["rows"], info["bytes"], api, error)
+
+
+def measure(value):
+    # 시트 값(리스트 안의 리스트...)의 행 수와 대략적인 바이트 수
+    rows = 0
+    nbytes = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, tuple)):
+            if item and not isinstance(item[0], (list, tuple, dict)):
+                rows += 1
+                nbytes += sum(len(str(cell)) for cell in item)
+            else:
+                stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(v for v in item.values() if isinstance(v, (list, tuple, dict)))
+    return rows, nbytes
+
+
+# --- gspread 객체 감싸기: API 메서드 호출마다 기록 ---
+API_METHODS = {
+    "get_all_values", "get_values", "batch_get", "append_row", "append_rows",
+    "batch_update", "update", "clear", "values_batch_get",
+}
+
+
+class Instrumented:
+    # before_call(메서드 이름): API 호출 직전에 부름 (요청 스케줄러가 토큰을 나눠줄 때 씀)
+    def __init__(self, target, prefix="sheets", before_call=None):
+        self._target = target
+        self._prefix = prefix
+        self._before_call = before_call
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == "spreadsheet":
+            return Instrumented(attr, self._prefix + ".spreadsheet", self._before_call)
+        if name not in API_METHODS or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self._before_call is not None:
+                self._before_call(name)
+            with timed(f"{self._prefix}.{name}", api=True) as info:
+                result = attr(*args, **kwargs)
+                # 읽기는 결과 크기, 쓰기는 보낸 값 크기
+                info["rows"], info["bytes"] = measure(result if name.startswith(("get", "batch_get", "values")) else [args, kwargs])
+            return result
+
+        return call
@@ -0,0 +1,210 @@
+import sqlite3
+import threading
+
+from schema import SHEET_WORK, column_names, normalize_date, parse_number, record_id, user_key
+from sheet_sync import SheetConflict
+from storage import Storage
+
+
+# ==========================================
+# [매출 집계표]
+# 사용자(사용자번호)별 일/월/년 수입 합계와 배달 건수를 미리 더해 둔다.
+# 저장/수정할 때마다 바뀐 행만큼만 더하고 빼서, 사이드바와 통계 탭은
+# 전체 기록을 다시 훑지 않고 이 표만 읽는다.
+# period 키: "D2025-01-03" / "M2025-01" / "Y2025"
+# 서버가 여러 대면(redis) 사용자별 버전 번호(shared_cache.Stamps)로 다른 서버에서 고친 것을 알아챈다.
+# ==========================================
+ROLLUP_SHEET = SHEET_WORK
+REVENUE_COL = "수입"
+COUNT_COL = "배달건수"
+
+def _periods(date_text):
+    day = normalize_date(date_text)
+    if len(day) != 10 or day[4] != "-":
+        return None
+    return ["D" + day, "M" + day[:7], "Y" + day[:4]]
+
+
+def _contributions(rows, sign=1):
+    # rows: 매출기록 값 리스트들 -> {(owner, period): [수입, 건수]}
+    names = column_names(ROLLUP_SHEET)
+    i_date, i_rev, i_cnt = names.index("날짜"), names.index(REVENUE_COL), names.index(COUNT_COL)
+    totals = {}
+    for row in rows:
+        row = list(row) + [""] * (len(names) - len(row))
+        periods = _periods(row[i_date])
+        if periods is None:
+            continue
+        owner = user_key(row[0])
+        revenue = (parse_number(row[i_rev]) or 0) * sign
+        count = (parse_number(row[i_cnt]) or 0) * sign
+        for period in periods:
+            entry = totals.setdefault((owner, period), [0, 0])
+            entry[0] += revenue
+            entry[1] += count
+    return totals
+
+
+class Rollups:
+    def __init__(self, path="rollups.db", stamps=None):
+        self.stamps = stamps
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup ("
+                "owner TEXT, period TEXT, revenue INTEGER, count INTEGER, PRIMARY KEY (owner, period))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS built (owner TEXT PRIMARY KEY, version TEXT DEFAULT '')")
+            if "version" not in [row[1] for row in self._conn.execute("PRAGMA table_info(built)")]:
+                self._conn.execute("ALTER TABLE built ADD COLUMN version TEXT DEFAULT ''")
+
+    def _apply(self, totals):
+        self._conn.executemany(
+            "INSERT INTO rollup (owner, period, revenue, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (owner, period) DO UPDATE SET "
+            "revenue = revenue + excluded.revenue, count = count + excluded.count",
+            [(owner, period, rev, cnt) for (owner, period), (rev, cnt) in totals.items()],
+        )
+        # 다 빠져서 0이 된 기간은 지운다
+        self._conn.executemany(
+            "DELETE FROM rollup WHERE owner = ? AND period = ? AND revenue = 0 AND count = 0",
+            list(totals),
+        )
+
+    def add_rows(self, rows, sign=1):
+        totals = _contributions(rows, sign)
+        if totals:
+            with self._lock, self._conn:
+                self._apply(totals)
+
+    def remove_rows(self, rows):
+        self.add_rows(rows, sign=-1)
+
+    def has(self, owner):
+        # 다른 서버에서 그 사용자 것을 고쳤으면 (버전 번호가 다르면) 다시 만들어야 한다
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM built WHERE owner = ?", (owner,)).fetchone()
+        return row is not None and (self.stamps is None or row[0] == self.stamps.current(owner)[0])
+
+    def touched(self, owner):
+        # 저장/수정 뒤: 버전 번호를 올려서 다른 서버에 알린다.
+        # 이 서버 표가 바로 앞 번호였으면 (방금 고친 것까지 반영됨) 새 번호로, 아니면 다음에 다시 만든다
+        if self.stamps is None:
+            return
+        before, version = self.stamps.bump(owner)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE built SET version = ? WHERE owner = ? AND version = ?",
+                               (version, owner, before))
+
+    def _version(self, owner):
+        return "" if self.stamps is None else self.stamps.current(owner)[0]
+
+    def forget(self, owner):
+        # 그 사용자 것을 믿을 수 없게 됨 (저장이 들어갔는지 모름) -> 다음에 불러올 때 다시 만든다
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM built WHERE owner = ?", (owner,))
+
+    def rebuild(self, owner, rows, archived=None):
+        # rows: 그 사용자의 매출기록 전체 (처음 한 번, 또는 어긋났을 때)
+        # archived: 연도별 시트로 옮긴 해의 {기간: (수입, 건수)} (archive.load_totals) -> 그대로 더한다
+        totals = {k: v for k, v in _contributions(rows).items() if k[0] == owner}
+        for period, (revenue, count) in (archived or {}).items():
+            entry = totals.setdefault((owner, period), [0, 0])
+            entry[0] += revenue
+            entry[1] += count
+        version = self._version(owner)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rollup WHERE owner = ?", (owner,))
+            self._apply(totals)
+            self._conn.execute("INSERT OR REPLACE INTO built (owner, version) VALUES (?, ?)", (owner, version))
+
+    def total(self, owner, period):
+        # 반환: (수입, 건수)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revenue, count FROM rollup WHERE owner = ? AND period = ?", (owner, period)
+            ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def series(self, owner, prefix):
+        # prefix 로 시작하는 기간들: [(기간, 수입, 건수)] 오름차순
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT period, revenue, count FROM rollup WHERE owner = ? AND period LIKE ? ORDER BY period",
+                (owner, prefix + "%"),
+            ).fetchall()
+        return [(p[len(prefix[:1]):], rev, cnt) for p, rev, cnt in rows]
+
+    def months(self, owner):
+        return [p for p, _, _ in self.series(owner, "M")]
+
+    def years(self, owner):
+        return [int(p) for p, _, _ in self.series(owner, "Y")]
+
+    def days_in_month(self, owner, month):
+        return self.series(owner, "D" + month)
+
+    def months_in_year(self, owner, year):
+        return self.series(owner, f"M{int(year):04d}")
+
+
+# --- 저장소에 끼워서 쓰기 때마다 집계표도 같이 고치기 ---
+class RollupStorage(Storage):
+    def __init__(self, inner, rollups):
+        self.inner = inner
+        self.rollups = rollups
+        self.stable_ids = inner.stable_ids
+
+    def load_user_rows(self, sheet_name, user):
+        return self.inner.load_user_rows(sheet_name, user)
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        return self.inner.iter_user_rows(sheet_name, user, start, end, chunk_size)
+
+    def forget(self, sheet_name, user):
+        self.inner.forget(sheet_name, user)
+        self._stale(sheet_name, user)
+
+    def _stale(self, sheet_name, user):
+        if sheet_name == ROLLUP_SHEET:
+            self.rollups.forget(user)
+            self.rollups.touched(user)
+
+    def append_rows(self, sheet_name, user, rows):
+        try:
+            self.inner.append_rows(sheet_name, user, rows)
+        except Exception:
+            # 들어갔는데 응답만 못 받았을 수도 있다
+            self._stale(sheet_name, user)
+            raise
+        if sheet_name == ROLLUP_SHEET:
+            self.rollups.add_rows(rows)
+            self.rollups.touched(user)
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        if sheet_name != ROLLUP_SHEET:
+            return self.inner.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        # 바뀌기 전 값 (방금 화면에 불러온 캐시에서 가져옴)
+        # 행 번호가 밀렸을 수 있으니 기록ID 가 있으면 기록ID 로 찾는다
+        rows = self.inner.load_user_rows(sheet_name, user)
+        old = dict(rows)
+        by_record = {record_id(sheet_name, values): values for _, values in rows}
+        by_record.pop("", None)
+        before = []
+        for r in list(updates) + list(deletes):
+            rid = (expected or {}).get(r, [None, ""])[1]
+            values = by_record.get(rid) if rid else old.get(r)
+            if values is not None:
+                before.append(values)
+        try:
+            deleted = self.inner.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        except SheetConflict:
+            raise
+        except Exception:
+            self._stale(sheet_name, user)
+            raise
+        self.rollups.remove_rows(before)
+        self.rollups.add_rows(list(updates.values()) + list(inserts))
+        self.rollups.touched(user)
+        return deleted
@@ -0,0 +1,243 @@
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+
+from gspread.utils import rowcol_to_a1
+
+
+# ==========================================
+# [사용자별 행 인덱스]
+# 시트마다 "사용자번호 -> 그 사람 행 번호 구간들" 을 저장해 두고,
+# 불러올 때는 시트 전체 대신 그 구간만 batch_get 으로 읽는다.
+# 파일(JSON)로 저장되고, 앱에서 추가/삭제할 때마다 같이 갱신된다.
+#
+# 인덱스가 틀어졌을 때 (시트에서 직접 행을 지우거나 옮긴 경우):
+#     python row_index.py rebuild [시트이름 ...]
+# ==========================================
+DEFAULT_PATH = "row_index.json"
+
+# 구간 사이가 이 정도 이하로 떨어져 있으면 한 범위로 합쳐서 읽는다 (남의 행은 읽은 뒤 버림)
+MERGE_GAP = 3
+# batch_get 한 번에 보내는 범위 수 (URL 길이 제한)
+RANGES_PER_CALL = 100
+
+
+class IndexDrift(Exception):
+    # 인덱스와 실제 시트가 다를 때 -> 전체를 한 번 읽고 다시 만든다
+    pass
+
+
+def _add_row(ranges, row):
+    # 정렬된 [시작, 끝] 구간 리스트에 행 하나 추가 (붙어 있으면 늘리기만 함)
+    # 대부분 맨 뒤에 붙는 경우라 (인덱스 재구성/추가) 마지막 구간부터 본다
+    if not ranges or row > ranges[-1][1] + 1:
+        ranges.append([row, row])
+        return
+    if row == ranges[-1][1] + 1:
+        ranges[-1][1] = row
+        return
+    for r in ranges:
+        if r[0] <= row <= r[1]:
+            return
+        if r[1] + 1 == row:
+            r[1] = row
+            return
+        if r[0] - 1 == row:
+            r[0] = row
+            return
+    ranges.append([row, row])
+    ranges.sort()
+
+
+def _remove_and_shift(ranges, deleted):
+    # deleted: 지워진 행 번호들 -> 그 행은 빼고 아래쪽 행 번호는 당긴다
+    # 행 하나씩 보지 않고 구간을 지워진 행 기준으로 잘라서 조각째 당긴다
+    deleted = sorted(set(deleted))
+    result = []
+    for start, end in ranges:
+        lo, hi = bisect.bisect_left(deleted, start), bisect.bisect_right(deleted, end)
+        piece_start = start
+        for cut in deleted[lo:hi] + [end + 1]:
+            if piece_start < cut:
+                shift = bisect.bisect_left(deleted, piece_start)
+                s, e = piece_start - shift, cut - 1 - shift
+                if result and result[-1][1] + 1 >= s:
+                    result[-1][1] = max(result[-1][1], e)
+                else:
+                    result.append([s, e])
+            piece_start = cut + 1
+    return result
+
+
+def _updated_rows(response):
+    # append_row(s) 응답의 updatedRange ("'매출기록'!A15:H17") 에서 행 번호 뽑기
+    try:
+        updated_range = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    nums = [int(n) for n in re.findall(r"[A-Z]+(\d+)", updated_range.split("!")[-1])]
+    if not nums:
+        return None
+    return min(nums), max(nums)
+
+
+class RowIndex:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sheets = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._sheets = json.load(f)
+            except (OSError, ValueError):
+                self._sheets = {}
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        # json.dump 는 순수 파이썬 인코더라 느리다 -> 한 번에 문자열로 만들어 쓴다
+        text = json.dumps(self._sheets, ensure_ascii=False)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+
+    def has(self, sheet_name):
+        with self._lock:
+            return sheet_name in self._sheets
+
+    def last_row(self, sheet_name):
+        with self._lock:
+            return self._sheets[sheet_name]["last_row"]
+
+    def ranges(self, sheet_name, user):
+        with self._lock:
+            return [list(r) for r in self._sheets[sheet_name]["users"].get(user, [])]
+
+    def rebuild_sheet(self, sheet_name, rows):
+        # rows: get_all_values() 결과 (1행은 헤더)
+        users = {}
+        for row_num, values in enumerate(rows[1:], start=2):
+            user = values[0] if values else ""
+            _add_row(users.setdefault(user, []), row_num)
+        with self._lock:
+            self._sheets[sheet_name] = {"last_row": len(rows), "users": users}
+            self._save()
+
+    def drop(self, sheet_name):
+        with self._lock:
+            if self._sheets.pop(sheet_name, None) is not None:
+                self._save()
+
+    def note_append(self, sheet_name, user, response):
+        # user 가 None 이면 헤더처럼 주인 없는 행
+        rows = _updated_rows(response)
+        if rows is None:
+            # 응답을 못 읽으면 다음 로드 때 다시 만든다
+            self.drop(sheet_name)
+        else:
+            self.note_rows(sheet_name, user, *rows)
+
+    def note_appended(self, sheet_name, user, count):
+        # 응답에 행 번호가 없는 추가 (batch_update 의 appendCells): 지금 마지막 행 다음부터라고 본다
+        # (앱 밖에서 추가된 행이 있었다면 다음 로드 때 read_user_rows 가 알아채고 다시 만든다)
+        with self._lock:
+            entry = self._sheets.get(sheet_name)
+            start = entry["last_row"] + 1 if entry else None
+        if start is not None and count:
+            self.note_rows(sheet_name, user, start, start + count - 1)
+
+    def note_rows(self, sheet_name, user, start, end):
+        with self._lock:
+            entry = self._sheets.get(sheet_name)
+            if entry is None:
+                return
+            if user is not None:
+                user_ranges = entry["users"].setdefault(user, [])
+                for row in range(start, end + 1):
+                    _add_row(user_ranges, row)
+            entry["last_row"] = max(entry["last_row"], end)
+            self._save()
+
+    def note_delete(self, sheet_name, deleted):
+        with self._lock:
+            entry = self._sheets.get(sheet_name)
+            if entry is None or not deleted:
+                return
+            for user in list(entry["users"]):
+                shifted = _remove_and_shift(entry["users"][user], deleted)
+                if shifted:
+                    entry["users"][user] = shifted
+                else:
+                    del entry["users"][user]
+            entry["last_row"] -= len(set(deleted))
+            self._save()
+
+
+def _merge_ranges(ranges, gap=MERGE_GAP):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] - 1 <= gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def read_user_rows(worksheet, index, sheet_name, user, width):
+    # 반환: [(행번호, 값 리스트)] -> user 의 행만, 칸 수는 width 로 맞춤
+    if not index.has(sheet_name):
+        raise IndexDrift(sheet_name)
+
+    own = index.ranges(sheet_name, user)
+    expected = sum(end - start + 1 for start, end in own)
+    merged = _merge_ranges(own)
+
+    # 마지막 행 다음 칸이 비어 있는지도 같이 확인 (앱 밖에서 추가된 행 감지)
+    sentinel = index.last_row(sheet_name) + 1
+    a1_ranges = [f"{rowcol_to_a1(s, 1)}:{rowcol_to_a1(e, width)}" for s, e in merged]
+    a1_ranges.append(f"{rowcol_to_a1(sentinel, 1)}:{rowcol_to_a1(sentinel, width)}")
+
+    fetched = []
+    for i in range(0, len(a1_ranges), RANGES_PER_CALL):
+        fetched.extend(worksheet.batch_get(a1_ranges[i:i + RANGES_PER_CALL]))
+
+    if fetched[-1] and any(fetched[-1][0]):
+        raise IndexDrift(sheet_name)
+
+    result = []
+    for (start, _), values in zip(merged, fetched[:-1]):
+        for offset, row in enumerate(values):
+            if row and row[0] == user:
+                row = list(row)[:width]
+                row += [""] * (width - len(row))
+                result.append((start + offset, row))
+
+    if len(result) != expected:
+        raise IndexDrift(sheet_name)
+    return result
+
+
+# --- 인덱스 재구성 명령 ---
+def rebuild(pool, index, sheet_names):
+    for name in sheet_names:
+        rows = pool.run(name, lambda ws: ws.get_all_values())
+        index.rebuild_sheet(name, rows)
+        users = {r[0] for r in rows[1:] if r}
+        print(f"{name}: {max(len(rows) - 1, 0)}행, 사용자 {len(users)}명")
+
+
+if __name__ == "__main__":
+    from schema import LEDGER_SHEETS
+    from sheet_client import load_local_secrets, pool_from_secrets
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("사용법: python row_index.py rebuild [시트이름 ...]")
+        sys.exit(1)
+
+    secrets = load_local_secrets()
+    pool = pool_from_secrets(secrets)
+    index = RowIndex(secrets.get("row_index_path", DEFAULT_PATH))
+    rebuild(pool, index, sys.argv[2:] or LEDGER_SHEETS)
@@ -0,0 +1,167 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import perf
+
+
+# ==========================================
+# [시트 요청 스케줄러]
+# 모든 gspread 호출이 여기를 거친다.
+# - 토큰 버킷: 분당 읽기/쓰기 한도(프로젝트 할당량)에 맞춰 호출 간격을 조절
+# - 우선순위: 화면에서 부르는 읽기가 백그라운드 전송(쓰기 대기열 등)보다 먼저
+# - 같은 읽기가 동시에 여러 세션에서 오면 한 번만 부르고 결과를 나눠 가진다
+# - 429(할당량 초과)/5xx 는 지터를 섞어 점점 길게 기다렸다가 다시 시도
+#   (5xx 는 요청이 반영됐는지 모르니 읽기처럼 다시 해도 되는 요청만)
+# ==========================================
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority = contextvars.ContextVar("sheets_priority", default=INTERACTIVE)
+
+# 읽기 한도에서 토큰을 쓰는 호출 (나머지는 쓰기 한도). 시트 열기/핸들 만들기도 읽기로 센다
+READ_METHODS = {"get_all_values", "get_values", "batch_get", "values_batch_get", "open", "worksheet"}
+
+
+@contextlib.contextmanager
+def background():
+    # 이 안에서 부르는 시트 요청은 화면 요청 뒤로 밀린다
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _status(e):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(e, idempotent):
+    status = _status(e)
+    if status == 429:
+        return True
+    return idempotent and status is not None and 500 <= status < 600
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        # 한 번에 몰아 쓸 수 있는 양 (기본: 30초 치). 분 경계에서 조금 넘치면 429 재시도가 받아준다
+        self.capacity = burst or max(1, per_minute // 2)
+        self.tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self):
+        # 토큰 하나가 생길 때까지 남은 시간 (0 이면 바로 가능)
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RequestScheduler:
+    def __init__(self, read_per_minute=60, write_per_minute=60, max_retries=5, base_delay=1.0, max_delay=32.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {"read": TokenBucket(read_per_minute), "write": TokenBucket(write_per_minute)}
+        self._waiting = {"read": [], "write": []}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._inflight = {}
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled = 0
+
+    # --- 토큰 받기 (API 호출 하나마다) ---
+    def acquire(self, method):
+        kind = "read" if method in READ_METHODS else "write"
+        me = (_priority.get(), next(self._seq))
+        bucket = self._buckets[kind]
+        waiting = self._waiting[kind]
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(waiting, me)
+            try:
+                while True:
+                    wait = bucket.wait_time()
+                    if waiting[0] == me and wait == 0:
+                        bucket.take()
+                        return
+                    # 차례가 아니면 앞사람이 토큰을 받을 때 깨워준다
+                    self._cond.wait(timeout=wait if waiting[0] == me else None)
+            finally:
+                waiting.remove(me)
+                heapq.heapify(waiting)
+                self._cond.notify_all()
+                waited = time.monotonic() - start
+                if waited > 0.001:
+                    self.throttled += 1
+                    perf.recorder.record(f"scheduler.wait_{kind}", waited)
+
+    # --- 요청 하나 (재시도 + 같은 읽기 합치기) ---
+    def call(self, fn, key=None, idempotent=True):
+        # key: 같은 key 로 동시에 들어온 읽기는 먼저 온 것의 결과를 같이 쓴다
+        if key is None or not idempotent:
+            return self._with_retry(fn, idempotent)
+
+        with self._cond:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._with_retry(fn, idempotent)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def _with_retry(self, fn, idempotent):
+        delay = self.base_delay
+        for attempt in itertools.count():
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e, idempotent):
+                    raise
+                self.retries += 1
+                # full jitter: 0 ~ delay 사이 아무 때나 (여러 세션이 한꺼번에 다시 몰리지 않게)
+                time.sleep(random.uniform(0, delay))
+                delay = min(delay * 2, self.max_delay)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "waiting_read": len(self._waiting["read"]),
+                "waiting_write": len(self._waiting["write"]),
+                "inflight": len(self._inflight),
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "throttled": self.throttled,
+            }
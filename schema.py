@@ -0,0 +1,191 @@
+import re
+import uuid
+
+import pandas as pd
+
+
+# ==========================================
+# [장부 스키마]
+# 시트 이름, 컬럼 순서, 컬럼 종류를 한 곳에서 정의한다.
+# 저장소(구글 시트 / SQLite)와 화면 코드가 모두 여기를 본다.
+# ==========================================
+SHEET_WORK = "매출기록"
+SHEET_BANK = "입금기록"
+SHEET_MAINT = "정비기록"
+SHEET_GOAL = "목표설정"
+
+LEDGER_SHEETS = [SHEET_WORK, SHEET_BANK, SHEET_MAINT]
+
+# 장부 행의 첫 칸: 사용자 목록(users.py)의 번호. 아이디/비밀번호는 장부에 적지 않는다
+# (비밀번호를 바꿔도 장부 행은 그대로)
+USER_KEY = "사용자번호"
+
+# 장부 행마다 맨 뒤에 붙는 관리용 칸 (화면에는 안 보인다)
+#   기록ID  : 처음 저장할 때 한 번 정하고 안 바뀐다 -> 위쪽 행이 지워져서 행 번호가 밀려도 같은 기록을 찾는다
+#   수정번호: 고칠 때마다 1씩 올린다 -> 불러온 뒤에 다른 곳에서 고쳤으면 저장할 때 알 수 있다
+RECORD_ID = "기록ID"
+VERSION = "수정번호"
+META_COLUMNS = [(RECORD_ID, "text"), (VERSION, "count")]
+
+# 컬럼 종류: key(사용자번호), text(글자), date(YYYY-MM-DD), won(원, 쉼표), count(건수), km(주행거리)
+COLUMNS = {
+    SHEET_WORK: [
+        (USER_KEY, "key"), ("날짜", "date"), ("플랫폼", "text"),
+        ("수입", "won"), ("배달건수", "count"), ("평균단가", "won"), ("메모", "text"),
+    ] + META_COLUMNS,
+    SHEET_BANK: [
+        (USER_KEY, "key"), ("입금날짜", "date"), ("입금처", "text"),
+        ("입금액", "won"), ("메모", "text"),
+    ] + META_COLUMNS,
+    SHEET_MAINT: [
+        (USER_KEY, "key"), ("날짜", "date"), ("항목", "text"),
+        ("금액", "won"), ("당시주행거리", "km"), ("메모", "text"),
+    ] + META_COLUMNS,
+}
+
+NUMBER_KINDS = ("key", "won", "count", "km")
+
+
+def column_names(sheet_name):
+    return [name for name, _ in COLUMNS.get(sheet_name, [])]
+
+
+def column_kinds(sheet_name):
+    return [kind for _, kind in COLUMNS.get(sheet_name, [])]
+
+
+def data_columns(sheet_name):
+    # 사용자번호 뒤의 장부 내용 칸 (관리용 칸 포함) - 입력/편집/가져오기가 채우는 부분
+    return column_names(sheet_name)[1:]
+
+
+def date_column(sheet_name):
+    # 세 장부 모두 사용자번호 바로 뒤가 날짜
+    return column_names(sheet_name)[1]
+
+
+def hidden_columns():
+    # 화면 표에서 빼는 칸 (사용자번호 + 관리용 칸)
+    return [USER_KEY] + [name for name, _ in META_COLUMNS]
+
+
+# --- 저장 형식 ---
+# 숫자(원/건수/km)는 쉼표나 "km" 없이 정수 그대로, 날짜는 YYYY-MM-DD 로 저장한다.
+# 예전 형식("30,000", "12,345 km", "2025.1.3")은 읽을 때 한 번만 바꾼다.
+# 쉼표/단위는 화면에 보여줄 때만 붙인다.
+_NOT_NUMBER = re.compile(r"[,\s]|km", re.IGNORECASE)
+_DATE = re.compile(r"(\d{4})\D+(\d{1,2})\D+(\d{1,2})")
+
+
+def _is_blank(value):
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value == ""
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_number(value):
+    # "30,000" / "12,345 km" / 30000 -> 정수, 숫자가 아니면 None
+    if _is_blank(value):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = _NOT_NUMBER.sub("", str(value))
+    if not text:
+        return None
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+
+def normalize_date(value):
+    # "2025.1.3" / "2025-01-03 00:00:00" -> "2025-01-03", 날짜가 아니면 글자 그대로
+    if _is_blank(value):
+        return ""
+    m = _DATE.search(str(value))
+    if not m:
+        return str(value)
+    return f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}"
+
+
+def canonical_row(sheet_name, values):
+    # 행 하나를 저장 형식으로 (숫자로 못 바꾸는 글자는 잃어버리지 않게 그대로 둔다)
+    out = []
+    for value, kind in zip(list(values) + [""] * len(COLUMNS[sheet_name]), column_kinds(sheet_name)):
+        if kind in NUMBER_KINDS:
+            number = parse_number(value)
+            out.append(number if number is not None else ("" if _is_blank(value) else str(value)))
+        elif kind == "date":
+            out.append(normalize_date(value))
+        else:
+            out.append("" if _is_blank(value) else str(value))
+    return out
+
+
+def parse_frame(df, sheet_name):
+    # 불러온 표를 한 번에 변환 (행마다 돌지 않고 컬럼 단위로)
+    for name, kind in COLUMNS[sheet_name]:
+        if name not in df.columns:
+            continue
+        col = df[name]
+        if kind in NUMBER_KINDS:
+            text = col.astype(str).str.replace(_NOT_NUMBER, "", regex=True)
+            number = pd.to_numeric(text, errors="coerce")
+            if kind == "km":
+                # 주행거리는 모르면 빈 칸으로 남긴다
+                df[name] = number.round().astype("Int64")
+            else:
+                df[name] = number.fillna(0).astype("int64")
+        elif kind == "date":
+            parts = col.astype(str).str.extract(_DATE)
+            iso = parts[0].str.zfill(4) + "-" + parts[1].str.zfill(2) + "-" + parts[2].str.zfill(2)
+            df[name] = iso.where(parts[0].notna(), col.fillna("").astype(str))
+        else:
+            df[name] = col.fillna("").astype(str)
+    return df
+
+
+def user_key(value):
+    # 사용자번호 칸 값 (시트는 "17", SQLite 는 17) -> 저장소/집계표가 쓰는 글자 "17", 없으면 ""
+    number = parse_number(value)
+    return "" if number is None else str(number)
+
+
+# --- 기록ID / 수정번호 ---
+def new_record_id():
+    return uuid.uuid4().hex[:12]
+
+
+def new_record(sheet_name, values):
+    # 새로 저장할 행: 저장 형식으로 바꾸고 기록ID 가 없으면 새로 정한다 (수정번호 1)
+    row = canonical_row(sheet_name, values)
+    names = column_names(sheet_name)
+    i_id, i_ver = names.index(RECORD_ID), names.index(VERSION)
+    if not row[i_id]:
+        row[i_id] = new_record_id()
+    if row[i_ver] == "":
+        row[i_ver] = 1
+    return row
+
+
+def record_id(sheet_name, values):
+    values = list(values)
+    i_id = column_names(sheet_name).index(RECORD_ID)
+    return str(values[i_id]) if i_id < len(values) and not _is_blank(values[i_id]) else ""
+
+
+def row_key(sheet_name, values):
+    # 저장 전에 "불러온 그 행이 아직 그대로인지" 비교하는 값. key[1] 은 항상 기록ID
+    #   기록ID 가 있으면 [사용자번호, 기록ID, 수정번호]
+    #   예전 행(기록ID 없음)은 [사용자번호, "", 날짜, 날짜 다음 칸]  -> 행 번호가 밀리면 다시 찾지 못한다
+    row = canonical_row(sheet_name, values)
+    names = column_names(sheet_name)
+    rid = row[names.index(RECORD_ID)]
+    if rid:
+        return [str(row[0]), str(rid), str(row[names.index(VERSION)])]
+    return [str(row[0]), "", str(row[1]), str(row[2])]
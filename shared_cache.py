@@ -0,0 +1,447 @@
+import contextlib
+import json
+import socket
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+# ==========================================
+# [서버 공용 저장소]
+# 서버(Streamlit 프로세스)가 여러 대일 때 같이 보는 작은 키-값 저장소.
+# 시트 스냅샷(sheet_cache), 집계표/정비 인덱스 버전(rollups, maint_index),
+# 쓰기 대기열(write_queue), 시트 수정 잠금(storage), 사용자 목표 금액을 여기에 둔다.
+#   LocalShared  : 프로세스 안 dict (서버 한 대, 기본값). 다시 켜면 비어 있다
+#   RedisShared  : redis 서버 (RESP 프로토콜을 표준 라이브러리 소켓으로 직접). 모든 서버가 같은 값을 본다
+# secrets 의 shared_cache = "redis://localhost:6379/0" 이면 redis, 비어 있으면 프로세스 안.
+# 로컬에서 redis 없이 확인할 때는 fake_redis.py 를 띄운다.
+# 값은 JSON 으로 바꿀 수 있는 것만 (redis 쪽에서 JSON 문자열로 저장).
+# ==========================================
+class LocalShared:
+    name = "프로세스 안"
+    # 이 프로세스 밖에서는 안 보인다 -> 쓰기 대기열은 로컬 파일(WriteQueue)을 그대로 쓴다
+    local = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 키 -> (값, 만료 시각 또는 None). 목록은 list, 집합은 set 을 값으로
+        self._data = {}
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _expires(self, ttl):
+        return None if ttl is None else time.monotonic() + ttl
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+        return None if entry is None else entry[0]
+
+    def mget(self, keys):
+        with self._lock:
+            entries = [self._live(key) for key in keys]
+        return [None if entry is None else entry[0] for entry in entries]
+
+    def set(self, key, value, ttl=None, nx=False):
+        # 반환: 적었는지 (nx=True 인데 이미 있으면 False)
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return False
+            self._data[key] = (value, self._expires(ttl))
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def expire(self, key, ttl):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[key] = (entry[0], self._expires(ttl))
+        return True
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0] if entry is not None else 0) + 1
+            self._data[key] = (value, None if entry is None else entry[1])
+        return value
+
+    def rpush(self, key, values):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = self._data[key] = ([], None)
+            entry[0].extend(values)
+            return len(entry[0])
+
+    def lrange(self, key, start, stop):
+        # redis 처럼 stop 포함, -1 은 끝까지
+        with self._lock:
+            entry = self._live(key)
+            items = [] if entry is None else entry[0]
+            return list(items[start:None if stop == -1 else stop + 1])
+
+    def ltrim(self, key, start, stop):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return
+            kept = entry[0][start:None if stop == -1 else stop + 1]
+            if kept:
+                self._data[key] = (kept, entry[1])
+            else:
+                del self._data[key]
+
+    def llen(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return 0 if entry is None else len(entry[0])
+
+    def lrem_many(self, key, values):
+        # 값마다 앞에서부터 같은 것 하나씩 지운다. 반환: 지운 개수
+        removed = 0
+        with self._lock:
+            entry = self._live(key)
+            for value in values if entry is not None else []:
+                if value in entry[0]:
+                    entry[0].remove(value)
+                    removed += 1
+            if entry is not None and not entry[0]:
+                del self._data[key]
+        return removed
+
+    def sadd(self, key, member):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = self._data[key] = (set(), None)
+            entry[0].add(member)
+
+    def srem(self, key, member):
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                entry[0].discard(member)
+                if not entry[0]:
+                    del self._data[key]
+
+    def smembers(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return set() if entry is None else set(entry[0])
+
+
+# --- redis (RESP) ---
+class RedisError(Exception):
+    pass
+
+
+def _arg(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+def encode_command(args):
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = _arg(arg)
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+def read_reply(reader):
+    # 반환: 문자열(+), 정수(:), bytes 또는 None($), 리스트(*), 오류는 RedisError 객체(-)
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("redis 연결이 끊겼습니다")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RedisError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = reader.read(size + 2)
+        if len(data) != size + 2:
+            raise ConnectionError("redis 연결이 끊겼습니다")
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        return None if size < 0 else [read_reply(reader) for _ in range(size)]
+    raise RedisError(f"알 수 없는 응답: {line[:40]!r}")
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load(data):
+    return None if data is None else json.loads(data)
+
+
+class RedisShared:
+    local = False
+
+    def __init__(self, url, timeout=2.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.strip("/") or 0)
+        self.password = parts.password
+        self.timeout = timeout
+        self.name = f"redis {self.host}:{self.port}/{self.db}"
+        self.calls = 0
+        # 연결 하나를 잠가서 같이 쓴다 (명령 하나가 1ms 도 안 걸림)
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _roundtrip(self, args):
+        self._sock.sendall(encode_command(args))
+        return read_reply(self._reader)
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        for args in ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.db)] if self.db else []):
+            reply = self._roundtrip(args)
+            if isinstance(reply, RedisError):
+                self._close()
+                raise reply
+
+    def command(self, *args, retry=True):
+        # 끊긴 연결이면 한 번 다시 연결해서 보낸다 (retry=False: 두 번 들어가면 안 되는 명령)
+        with self._lock:
+            self.calls += 1
+            for attempt in range(2 if retry else 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    reply = self._roundtrip(args)
+                    break
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt or not retry:
+                        raise
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands):
+        # 명령 여러 개를 한 번에 보내고 응답을 순서대로 받는다 (다시 보내지 않는다)
+        with self._lock:
+            self.calls += len(commands)
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b"".join(encode_command(args) for args in commands))
+                replies = [read_reply(self._reader) for _ in commands]
+            except (OSError, ConnectionError):
+                self._close()
+                raise
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def ping(self):
+        return self.command("PING") == "PONG"
+
+    def get(self, key):
+        return _load(self.command("GET", key))
+
+    def mget(self, keys):
+        if not keys:
+            return []
+        return [_load(v) for v in self.command("MGET", *keys)]
+
+    def set(self, key, value, ttl=None, nx=False):
+        args = ["SET", key, _dump(value)]
+        if ttl is not None:
+            args += ["PX", max(int(ttl * 1000), 1)]
+        if nx:
+            args.append("NX")
+        return self.command(*args) is not None
+
+    def delete(self, key):
+        self.command("DEL", key)
+
+    def expire(self, key, ttl):
+        return self.command("PEXPIRE", key, max(int(ttl * 1000), 1)) == 1
+
+    def incr(self, key):
+        return self.command("INCR", key)
+
+    def rpush(self, key, values):
+        if not values:
+            return self.llen(key)
+        return self.command("RPUSH", key, *[_dump(v) for v in values], retry=False)
+
+    def lrange(self, key, start, stop):
+        return [_load(v) for v in self.command("LRANGE", key, start, stop)]
+
+    def ltrim(self, key, start, stop):
+        self.command("LTRIM", key, start, stop)
+
+    def llen(self, key):
+        return self.command("LLEN", key)
+
+    def lrem_many(self, key, values):
+        if not values:
+            return 0
+        return sum(self.pipeline([("LREM", key, 1, _dump(v)) for v in values]))
+
+    def sadd(self, key, member):
+        self.command("SADD", key, member)
+
+    def srem(self, key, member):
+        self.command("SREM", key, member)
+
+    def smembers(self, key):
+        return {m.decode("utf-8") for m in self.command("SMEMBERS", key)}
+
+
+# --- 서버 여러 대가 같이 쓰는 잠금 ---
+class SharedLock:
+    # storage._SheetLock 의 서버 간 버전 (공유/단독). 키에 토큰을 적어서 잡는다 (SET NX PX)
+    #   단독: 키 name 을 잡고, 공유로 잡은 것들이 다 풀릴 때까지 기다린다
+    #   공유: member(사용자)마다 키 name:u:member 를 잡는다 -> 다른 member 끼리는 같이, 같은 member 는 하나씩.
+    #         잡은 뒤에 단독이 잡혀 있으면 놓고 다시 기다린다 (단독이 먼저 -> 둘 다 들어가는 일은 없다)
+    # 잡고 있는 동안 ttl/3 초마다 연장하고, 풀 때는 아직 내 토큰일 때만 지운다 (서버가 꺼지면 ttl 뒤에 저절로 풀린다)
+    def __init__(self, shared, name, ttl=30, timeout=60):
+        self.shared = shared
+        self.name = name
+        self.members = f"{name}:members"
+        self.ttl = ttl
+        self.timeout = timeout
+
+    def _extend(self, key, token):
+        return self.shared.get(key) == token and self.shared.expire(key, self.ttl)
+
+    def _free(self, key, token):
+        if self.shared.get(key) == token:
+            self.shared.delete(key)
+
+    def _shared_held(self):
+        # 공유로 잡힌 것이 남아 있는지 (풀린 키는 목록에서 뺀다)
+        busy = False
+        for key in self.shared.smembers(self.members):
+            if self.shared.get(key) is None:
+                self.shared.srem(self.members, key)
+            else:
+                busy = True
+        return busy
+
+    def _acquire(self, key, token, exclusive):
+        deadline = time.monotonic() + self.timeout
+        wait = 0.05
+        taken = False
+        while True:
+            if exclusive:
+                taken = taken or self.shared.set(key, token, ttl=self.ttl, nx=True)
+                if taken and not self._shared_held():
+                    return
+            elif self.shared.get(self.name) is None and self.shared.set(key, token, ttl=self.ttl, nx=True):
+                self.shared.sadd(self.members, key)
+                if self.shared.get(self.name) is None:
+                    return
+                self._free(key, token)
+            if time.monotonic() >= deadline:
+                if taken:
+                    self._free(key, token)
+                raise TimeoutError(f"다른 서버가 잠금을 놓지 않습니다: {key}")
+            time.sleep(wait)
+            wait = min(wait * 2, 1.0)
+
+    @contextlib.contextmanager
+    def hold(self, member=None, exclusive=False):
+        token = uuid.uuid4().hex
+        key = self.name if exclusive else f"{self.name}:u:{member}"
+        self._acquire(key, token, exclusive)
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.ttl / 3):
+                if not self._extend(key, token):
+                    return
+
+        threading.Thread(target=renew, name="shared-lock", daemon=True).start()
+        try:
+            yield
+        finally:
+            stop.set()
+            self._free(key, token)
+
+
+def shared_from_url(url):
+    # "" / "local" -> 프로세스 안, "redis://..." -> redis
+    if not url or url == "local":
+        return LocalShared()
+    if url.startswith("redis://"):
+        return RedisShared(url)
+    raise ValueError(f"알 수 없는 shared_cache 설정: {url}")
+
+
+# --- 버전 번호 ---
+class Stamps:
+    # 이름별 버전 번호 "시대.번호" (번호는 공용 저장소의 정수). 바뀔 때마다 1씩 올리고,
+    # 각 서버는 자기가 들고 있는 것을 만든 번호와 비교해서 다르면 버린다 (값을 지우러 다니지 않는다)
+    # 시대: 공용 저장소가 비워지면(redis 재시작) 새로 정해진다 -> 다시 0부터 센 번호가 예전 번호와 겹치지 않는다
+    EPOCH = "stamps:epoch"
+
+    def __init__(self, shared, prefix):
+        self.shared = shared
+        self.prefix = prefix
+
+    def _key(self, name):
+        return f"{self.prefix}:v:{name}"
+
+    def _epoch(self, value):
+        if value is None:
+            self.shared.set(self.EPOCH, uuid.uuid4().hex[:8], nx=True)
+            value = self.shared.get(self.EPOCH)
+        return value
+
+    def current(self, *names):
+        values = self.shared.mget([self.EPOCH] + [self._key(n) for n in names])
+        epoch = self._epoch(values[0])
+        return tuple(f"{epoch}.{int(v or 0)}" for v in values[1:])
+
+    def bump(self, name):
+        # 반환: (올리기 전 번호, 올린 번호)
+        number = self.shared.incr(self._key(name))
+        epoch = self._epoch(self.shared.get(self.EPOCH))
+        return f"{epoch}.{number - 1}", f"{epoch}.{number}"
+
+
+def owner_stamps(shared, prefix):
+    # 집계표/정비 인덱스용. 서버가 한 대(프로세스 안)면 다른 서버가 고칠 일이 없으니 버전을 안 본다
+    # (프로세스 안 번호는 다시 켜면 처음부터라, 보면 켤 때마다 모든 사용자 것을 다시 만들게 된다)
+    return None if shared.local else Stamps(shared, prefix)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from shared_cache import LocalShared, Stamps
+
+
+# ==========================================
+# [시트 스냅샷 캐시]
+# 모든 세션/리런이 같이 쓰는 캐시. (시트, 사용자) -> 불러온 행들.
+# 저장/수정 후에는 invalidate()로 바로 비워준다.
+# 비우는 대신 공용 저장소(shared_cache)의 버전 번호를 올린다: 전체 / 시트 / (시트, 사용자) 세 개.
+# 값은 이 프로세스 dict 와 공용 저장소에 "불러올 때의 버전 번호"를 붙여서 둔다.
+# 번호가 바뀌었으면 옛날 값이라 안 쓴다 -> 서버가 여러 대여도 한 대에서 고치면 모두 바로 새로 읽고,
+# 새로 읽은 값은 공용 저장소에 남으니 데이터가 바뀔 때마다 시트 읽기는 (서버 수와 상관없이) 한 번.
+# ==========================================
+class SnapshotCache:
+    def __init__(self, ttl=60, shared=None):
+        self.ttl = ttl
+        self.shared = shared if shared is not None else LocalShared()
+        self.stamps = Stamps(self.shared, "snap")
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 키 -> (불러온 시각, 버전 번호, 값)
+        self._data = {}
+
+    def _stamp(self, key):
+        # 불러오는 도중에 invalidate 되면 번호가 바뀌어서 옛날 값이 다시 들어가지 않는다
+        if isinstance(key, tuple):
+            return self.stamps.current("", key[0], f"{key[0]}:{key[1]}")
+        return self.stamps.current("", key)
+
+    def _shared_key(self, key, stamp):
+        name = ":".join(str(k) for k in key) if isinstance(key, tuple) else str(key)
+        return f"snap:rows:{name}:" + ".".join(str(n) for n in stamp)
+
+    def _local(self, key, stamp):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] == stamp and time.monotonic() - entry[0] < self.ttl:
+            return entry
+        return None
+
+    def get(self, key, loader):
+        stamp = self._stamp(key)
+        with self._lock:
+            entry = self._local(key, stamp)
+            if entry is not None:
+                self.hits += 1
+                return entry[2]
+
+        # 다른 서버가 같은 버전으로 이미 불러 둔 값
+        value = None if self.shared.local else self.shared.get(self._shared_key(key, stamp))
+        if value is not None:
+            with self._lock:
+                self.shared_hits += 1
+                self._data[key] = (time.monotonic(), stamp, value)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = loader()
+
+        if self._stamp(key) == stamp:
+            with self._lock:
+                self._data[key] = (time.monotonic(), stamp, value)
+            if not self.shared.local:
+                try:
+                    self.shared.set(self._shared_key(key, stamp), value, ttl=self.ttl)
+                except TypeError:
+                    # JSON 으로 못 바꾸는 값 (날짜 객체 등) -> 이 서버에만 둔다
+                    pass
+        return value
+
+    def peek(self, key):
+        # TTL 안에 있는 값만 돌려준다 (없으면 None, 카운터는 건드리지 않음)
+        stamp = self._stamp(key)
+        with self._lock:
+            entry = self._local(key, stamp)
+        return None if entry is None else entry[2]
+
+    def invalidate(self, key=None):
+        # key 가 시트 이름이면 (시트, 아이디) 처럼 그 이름으로 시작하는 키도 같이 비운다
+        if key is None:
+            self.stamps.bump("")
+        elif isinstance(key, tuple):
+            self.stamps.bump(f"{key[0]}:{key[1]}")
+        else:
+            self.stamps.bump(key)
+        with self._lock:
+            if key is None:
+                keys = list(self._data)
+            else:
+                keys = [k for k in self._data if k == key or (isinstance(k, tuple) and k[0] == key)]
+            for k in keys:
+                self._data.pop(k, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.shared_hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.shared_hits) / total) if total else 0.0,
+                "entries": len(self._data),
+                "ttl": self.ttl,
+                "shared": self.shared.name,
+            }
@@ -0,0 +1,184 @@
+import os
+import threading
+
+import gspread
+import requests
+from google.auth.exceptions import RefreshError
+
+import perf
+from scheduler import RequestScheduler
+
+try:
+    from gspread.urls import DRIVE_FILES_API_V3_URL
+except ImportError:  # 예전 gspread
+    DRIVE_FILES_API_V3_URL = "https://www.googleapis.com/drive/v3/files"
+
+
+# ==========================================
+# [구글 시트 연결 풀]
+# 서버 프로세스당 인증 클라이언트 1개, 스프레드시트 1개,
+# 시트 이름 -> Worksheet 핸들 맵을 만들어 두고 모든 세션이 같이 쓴다.
+# 토큰 만료/연결 끊김이 나면 한 번 다시 연결해서 재시도한다.
+# 핸들은 perf.Instrumented 로 감싸서 API 호출마다 시간/크기를 기록한다.
+# scheduler(RequestScheduler)를 주면 모든 호출이 할당량/우선순위/재시도를 거친다.
+# ==========================================
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1vNdErX9sW6N5ulvfr-ndcrGmutxwiuvfe2og87AOEnI"
+
+
+def _is_reconnectable(e, idempotent):
+    # 401: 토큰 문제라 요청 자체가 거절됨 -> 쓰기도 다시 해도 안전
+    if isinstance(e, RefreshError):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        response = getattr(e, "response", None)
+        return getattr(response, "status_code", None) == 401
+    # 연결 끊김은 요청이 들어갔는지 알 수 없으니 읽기만 재시도
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return idempotent
+    return False
+
+
+def drive_version(spreadsheet):
+    # Drive 파일 version: 스프레드시트가 바뀔 때마다 올라가는 정수 (시트 UI 에서 직접 고쳐도).
+    # 수정 시각과 달리 두 번 물어본 사이에 다른 곳에서도 바뀌었는지 알 수 있다
+    response = spreadsheet.client.http_client.request(
+        "get", f"{DRIVE_FILES_API_V3_URL}/{spreadsheet.id}",
+        params={"supportsAllDrives": True, "includeItemsFromAllDrives": True, "fields": "version"},
+    )
+    return int(response.json()["version"])
+
+
+class SheetPool:
+    def __init__(self, credentials_info, url, connect=None, scheduler=None):
+        self.credentials_info = credentials_info
+        self.url = url
+        self.scheduler = scheduler
+        self._connect_fn = connect or self._default_connect
+        # _lock 은 핸들 맵을 보고 고칠 때만 잡는다 (스케줄러 토큰을 기다리는 동안 잡고 있으면
+        # 백그라운드 전송이 기다리는 사이 화면 읽기가 핸들도 못 받는다). 처음 연결은 _connect_lock 으로 한 번만
+        self._lock = threading.RLock()
+        self._connect_lock = threading.Lock()
+        self._spreadsheet = None
+        self._worksheets = {}
+        self.reconnects = 0
+
+    def _gate(self, method):
+        if self.scheduler is not None:
+            self.scheduler.acquire(method)
+
+    def _default_connect(self):
+        with perf.timed("sheets.auth", api=True):
+            gc = gspread.service_account_from_dict(self.credentials_info)
+        self._gate("open")
+        with perf.timed("sheets.open", api=True):
+            return gc.open_by_url(self.url)
+
+    def spreadsheet(self):
+        with self._lock:
+            if self._spreadsheet is not None:
+                return self._spreadsheet
+        with self._connect_lock:
+            with self._lock:
+                if self._spreadsheet is not None:
+                    return self._spreadsheet
+            spreadsheet = self._connect_fn()
+            with self._lock:
+                self._spreadsheet = spreadsheet
+            return spreadsheet
+
+    def worksheet(self, name):
+        with self._lock:
+            ws = self._worksheets.get(name)
+        if ws is not None:
+            return ws
+        # 토큰 기다리기와 API 호출은 잠금 밖에서. 두 세션이 같이 만들면 먼저 넣은 것을 쓴다
+        spreadsheet = self.spreadsheet()
+        self._gate("worksheet")
+        with perf.timed("sheets.worksheet", api=True):
+            ws = perf.Instrumented(spreadsheet.worksheet(name), before_call=self._gate)
+        with self._lock:
+            return self._worksheets.setdefault(name, ws)
+
+    def titles(self):
+        # 워크시트 이름 목록 (연도별 보관 시트 찾기)
+        spreadsheet = self.spreadsheet()
+        self._gate("worksheet")
+        with perf.timed("sheets.worksheets", api=True):
+            return [ws.title for ws in spreadsheet.worksheets()]
+
+    def add_worksheet(self, name, header):
+        # 새 워크시트를 만들고 1행에 헤더를 적는다
+        spreadsheet = self.spreadsheet()
+        self._gate("add_worksheet")
+        with perf.timed("sheets.add_worksheet", api=True):
+            ws = spreadsheet.add_worksheet(title=name, rows=1, cols=len(header))
+        ws = perf.Instrumented(ws, before_call=self._gate)
+        with self._lock:
+            self._worksheets[name] = ws
+        ws.update(range_name="A1", values=[header])
+        return ws
+
+    def forget(self, name):
+        # 시트가 지워지거나 이름이 바뀌었을 때 핸들만 버린다
+        with self._lock:
+            self._worksheets.pop(name, None)
+
+    def reset(self):
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets = {}
+            self.reconnects += 1
+
+    def _revision_once(self):
+        with perf.timed("sheets.revision", api=True):
+            try:
+                return drive_version(self.spreadsheet())
+            except Exception as e:
+                if not _is_reconnectable(e, True):
+                    raise
+                self.reset()
+                return drive_version(self.spreadsheet())
+
+    def revision(self):
+        # 스프레드시트 버전 번호 (Drive API, drive_version)
+        # (Drive 할당량은 따로라 토큰은 안 쓰고 재시도/합치기만)
+        if self.scheduler is None:
+            return self._revision_once()
+        return self.scheduler.call(self._revision_once, key=("revision",))
+
+    def run(self, name, fn, idempotent=True, key=None):
+        # fn(worksheet) 실행. 스케줄러가 있으면 그 위에서 재시도하고,
+        # key 가 같은 읽기가 동시에 들어오면 한 번만 부른다
+        if self.scheduler is None:
+            return self._run_once(name, fn, idempotent)
+        return self.scheduler.call(lambda: self._run_once(name, fn, idempotent), key=key, idempotent=idempotent)
+
+    def _run_once(self, name, fn, idempotent):
+        # 재연결이 필요한 오류면 새 연결로 한 번 더 시도
+        try:
+            return fn(self.worksheet(name))
+        except gspread.exceptions.WorksheetNotFound:
+            self.forget(name)
+            raise
+        except Exception as e:
+            if not _is_reconnectable(e, idempotent):
+                raise
+            self.reset()
+            return fn(self.worksheet(name))
+
+
+# --- 명령줄 도구용: .streamlit/secrets.toml 읽기 ---
+def load_local_secrets(path=os.path.join(".streamlit", "secrets.toml")):
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def scheduler_from_secrets(secrets):
+    # 분당 한도는 프로젝트 할당량에 맞춰 secrets 에서 조절 (기본 60)
+    return RequestScheduler(int(secrets.get("sheets_read_quota", 60)), int(secrets.get("sheets_write_quota", 60)))
+
+
+def pool_from_secrets(secrets):
+    return SheetPool(dict(secrets["gcp_service_account"]), secrets.get("sheet_url", SHEET_URL),
+                     scheduler=scheduler_from_secrets(secrets))
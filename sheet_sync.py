@@ -0,0 +1,150 @@
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+
+# ==========================================
+# [행 단위 변경 반영]
+# st.data_editor 가 돌려준 표를 편집 전 표와 비교해서
+# 바뀐 행만 뽑아서, 시트 전체를 지우고 다시 쓰지 않고 그 행만 고친다.
+# 편집 전 표의 index 는 저장소의 행 id (시트는 실제 행 번호, 헤더=1행)여야 한다.
+# 수정/추가/삭제는 spreadsheet.batch_update 한 번으로 보낸다 -> 전부 되거나 하나도 안 된다.
+# ==========================================
+class SheetConflict(Exception):
+    # 불러온 뒤에 그 행을 다른 곳에서 고치거나 지웠을 때
+    pass
+
+
+# 편집기에 넘기는 표에서 행 id 를 담는 숨은 칸
+ROW_COL = "_행"
+
+
+def _blank(value):
+    return value is None or value == "" or (not isinstance(value, str) and bool(pd.isna(value)))
+
+
+def _same(a, b):
+    # 편집기를 거치면 정수가 실수로 바뀌기도 해서 숫자는 값으로 비교
+    if _blank(a) or _blank(b):
+        return _blank(a) and _blank(b)
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+
+def editor_frame(view_df):
+    # 편집기에 넘길 표: 행 id 를 숨은 칸에 글자로 넣는다 (편집기가 새 행에 붙이는 번호와 섞이지 않게)
+    out = view_df.reset_index(drop=True)
+    out.insert(0, ROW_COL, [str(label) for label in view_df.index])
+    return out
+
+
+def frame_changes(view_df, edited_df):
+    # view_df: 편집 전 표 (index = 행 id), edited_df: data_editor 가 돌려준 표 (editor_frame 모양)
+    # 반환값: (수정 {행 id: 행 dict}, 추가 [행 dict], 삭제 [행 id])
+    labels = {str(label): label for label in view_df.index}
+    columns = list(view_df.columns)
+    before = view_df.to_dict("index")
+
+    updated, added, seen = {}, [], set()
+    for row in edited_df.to_dict("records"):
+        values = {c: row.get(c) for c in columns}
+        label = labels.get(row.get(ROW_COL))
+        if label is None:
+            # 새로 추가한 행 (아무것도 입력하지 않은 빈 행은 버린다)
+            if not all(_blank(v) for v in values.values()):
+                added.append(values)
+            continue
+        seen.add(label)
+        if not all(_same(values[c], before[label][c]) for c in columns):
+            updated[label] = values
+
+    deleted = [label for label in view_df.index if label not in seen]
+    return updated, added, deleted
+
+
+def _row_range(row, width):
+    return f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, width)}"
+
+
+def verify_rows(worksheet, expected, width, key):
+    # expected: {행번호: 비교값} -> 한 번의 batch_get 으로 확인
+    # key: 시트에서 읽은 행을 expected 와 같은 형식으로 바꾸는 함수
+    # 반환: 비교값이 달라진 행 번호들 (행이 밀렸거나 다른 곳에서 고침)
+    rows = sorted(expected)
+    if not rows:
+        return []
+    ranges = worksheet.batch_get([_row_range(r, width) for r in rows])
+    changed = []
+    for r, value_range in zip(rows, ranges):
+        current = list(value_range[0]) if value_range else []
+        current += [""] * (width - len(current))
+        if key(current) != list(expected[r]):
+            changed.append(r)
+    return changed
+
+
+def _delete_requests(sheet_id, rows):
+    # 연속된 행은 한 구간으로 묶고, 아래쪽부터 지워야 위쪽 행 번호가 안 밀린다
+    runs = []
+    for r in sorted(set(rows), reverse=True):
+        if runs and runs[-1][0] == r + 1:
+            runs[-1][0] = r
+        else:
+            runs.append([r, r])
+    return [
+        {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": start - 1,
+                    "endIndex": end,
+                }
+            }
+        }
+        for start, end in runs
+    ]
+
+
+def _cells(values):
+    # 값 그대로 (RAW) 넣는다: 숫자는 숫자, 나머지는 글자
+    return {"values": [
+        {"userEnteredValue": {"numberValue": v} if isinstance(v, (int, float)) else {"stringValue": str(v)}}
+        for v in values
+    ]}
+
+
+def _update_requests(sheet_id, updates, width):
+    return [
+        {
+            "updateCells": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": r - 1,
+                    "endRowIndex": r,
+                    "startColumnIndex": 0,
+                    "endColumnIndex": width,
+                },
+                "rows": [_cells(values)],
+                "fields": "userEnteredValue",
+            }
+        }
+        for r, values in sorted(updates.items())
+    ]
+
+
+def apply_changes(worksheet, width, updates, inserts, deletes):
+    # updates: {행번호: 값 리스트}, inserts: [값 리스트], deletes: [행번호]
+    # 순서: 수정(지우기 전 행 번호) -> 삭제(아래쪽부터) -> 맨 끝에 추가
+    requests = _update_requests(worksheet.id, updates, width) + _delete_requests(worksheet.id, deletes)
+    if inserts:
+        requests.append({
+            "appendCells": {
+                "sheetId": worksheet.id,
+                "rows": [_cells(values) for values in inserts],
+                "fields": "userEnteredValue",
+            }
+        })
+    if requests:
+        worksheet.spreadsheet.batch_update({"requests": requests})
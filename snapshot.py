@@ -0,0 +1,290 @@
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow 가 없으면 스냅샷 없이 돈다
+    pa = None
+
+import perf
+from schema import COLUMNS, NUMBER_KINDS, canonical_row, column_names, user_key
+from sheet_sync import SheetConflict
+from storage import Storage
+
+
+# ==========================================
+# [로컬 스냅샷 (Arrow 파일)]
+# 장부 시트마다 전체 행을 정수/글자 컬럼으로 바꿔서 디스크에 저장해 둔다.
+# 사용자별로 정렬해 두고 {사용자번호: (시작, 개수)} 를 같이 적어서 한 사람 몫만 잘라 읽는다.
+# 파일은 memory-map 으로 열어서 서버를 다시 켜도 첫 화면이 시트 API 를 기다리지 않는다.
+# 스프레드시트 버전 번호(revision, Drive 파일 version)가 스냅샷을 만들 때와 같을 때만 쓴다.
+#     pip install pyarrow   (없으면 이 기능만 꺼진다)
+# ==========================================
+HAS_ARROW = pa is not None
+ROW_ID = "_row"
+
+
+def _column(kind, values):
+    # 숫자 컬럼은 정수(빈 칸=null), 숫자로 못 바꾼 값이 섞여 있으면 글자로 둔다
+    if kind in NUMBER_KINDS and all(isinstance(v, int) or v == "" for v in values):
+        return pa.array([None if v == "" else v for v in values], type=pa.int64())
+    return pa.array([str(v) for v in values], type=pa.string())
+
+
+class ColumnarSnapshot:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._tables = {}
+
+    def _meta_path(self, sheet_name):
+        return os.path.join(self.directory, sheet_name + ".json")
+
+    def _load_meta(self, sheet_name):
+        if sheet_name not in self._meta:
+            try:
+                with open(self._meta_path(sheet_name), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+            # 컬럼 구성이 바뀌기 전에 만든 스냅샷은 안 쓴다
+            if meta is not None and meta.get("columns") != column_names(sheet_name):
+                meta = None
+            self._meta[sheet_name] = meta
+        return self._meta[sheet_name]
+
+    def _save_meta(self, sheet_name, meta):
+        self._meta[sheet_name] = meta
+        path = self._meta_path(sheet_name)
+        if meta is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        text = json.dumps(meta, ensure_ascii=False)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def _table(self, sheet_name, meta):
+        # 파일 이름이 바뀌었을 때만 다시 연다 (memory-map -> 실제로 읽는 건 잘라낸 부분뿐)
+        cached = self._tables.get(sheet_name)
+        if cached is None or cached[0] != meta["file"]:
+            source = pa.memory_map(os.path.join(self.directory, meta["file"]))
+            cached = (meta["file"], pa.ipc.open_file(source).read_all())
+            self._tables[sheet_name] = cached
+        return cached[1]
+
+    def revision(self, sheet_name):
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            return meta["revision"] if meta else None
+
+    def user_rows(self, sheet_name, user):
+        # 반환: [(행 id, 값 리스트)], 스냅샷에 그 사용자 몫이 없거나 버려졌으면 None
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            if meta is None or user in meta["dropped"]:
+                return None
+            span = meta["users"].get(user)
+            if span is None:
+                return []
+            try:
+                table = self._table(sheet_name, meta)
+            except (OSError, pa.ArrowException):
+                self._save_meta(sheet_name, None)
+                return None
+            shifts = [list(d) for d in meta["deleted"]]
+        with perf.timed("snapshot.read") as info:
+            part = table.slice(span[0], span[1])
+            ids = part.column(ROW_ID).to_pylist()
+            columns = [part.column(name).to_pylist() for name, _ in COLUMNS[sheet_name]]
+            # 스냅샷 이후 시트에서 지워진 행만큼 행 번호를 당긴다 (지운 순서대로)
+            for deleted in shifts:
+                ids = [row_id - bisect.bisect_left(deleted, row_id) for row_id in ids]
+            rows = [(row_id, ["" if v is None else v for v in values]) for row_id, *values in zip(ids, *columns)]
+            info["rows"] = len(rows)
+        return rows
+
+    def save(self, sheet_name, revision, rows):
+        # rows: 시트 전체 [(행 id, 값 리스트)]
+        with perf.timed("snapshot.write") as info:
+            rows = sorted(((row_id, canonical_row(sheet_name, values)) for row_id, values in rows),
+                          key=lambda r: (str(r[1][0]), r[0]))
+            users = {}
+            for pos, (_, values) in enumerate(rows):
+                span = users.setdefault(str(values[0]), [pos, 0])
+                span[1] += 1
+
+            arrays = [pa.array([row_id for row_id, _ in rows], type=pa.int64())]
+            names = [ROW_ID]
+            for i, (name, kind) in enumerate(COLUMNS[sheet_name]):
+                arrays.append(_column(kind, [values[i] for _, values in rows]))
+                names.append(name)
+            table = pa.Table.from_arrays(arrays, names=names)
+
+            # 열려 있는 파일을 덮어쓰지 않도록 (윈도우) 매번 새 이름으로 쓰고 옛 파일은 지운다
+            file_name = f"{sheet_name}-{uuid.uuid4().hex[:8]}.arrow"
+            with pa.OSFile(os.path.join(self.directory, file_name), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            info["rows"] = len(rows)
+
+        with self._lock:
+            old = self._load_meta(sheet_name)
+            self._save_meta(sheet_name, {
+                "revision": revision, "file": file_name, "columns": column_names(sheet_name), "users": users,
+                "dropped": [], "deleted": [], "saved": time.time(),
+            })
+            self._tables.pop(sheet_name, None)
+        if old:
+            self._remove_file(old["file"])
+
+    def _remove_file(self, file_name):
+        try:
+            os.remove(os.path.join(self.directory, file_name))
+        except OSError:
+            pass
+
+    def drop_user(self, sheet_name, user):
+        # 그 사용자 몫만 못 믿게 됐을 때 (그 사람이 저장/수정함)
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            if meta is not None and user not in meta["dropped"]:
+                meta["dropped"].append(user)
+                self._save_meta(sheet_name, meta)
+
+    def note_delete(self, sheet_name, deleted):
+        # 시트에서 행이 지워짐 -> 다른 사람 행은 그대로 두고 읽을 때 행 번호만 당긴다
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            if meta is not None:
+                meta["deleted"].append(sorted(set(deleted)))
+                self._save_meta(sheet_name, meta)
+
+    def dropped_ratio(self, sheet_name):
+        # 스냅샷에서 버려진 사용자 비율 (많으면 통째로 새로 만드는 게 낫다)
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            if meta is None:
+                return 1.0
+            return len(meta["dropped"]) / max(len(meta["users"]), 1)
+
+    def drop(self, sheet_name):
+        with self._lock:
+            meta = self._load_meta(sheet_name)
+            self._save_meta(sheet_name, None)
+            self._tables.pop(sheet_name, None)
+        if meta:
+            self._remove_file(meta["file"])
+
+    def adopt_revision(self, old, new):
+        # 우리가 쓴 것 때문에 버전 번호만 바뀐 경우: old 로 만든 스냅샷은 그대로 유효
+        with self._lock:
+            for name in COLUMNS:
+                meta = self._load_meta(name)
+                if meta is not None and meta["revision"] == old:
+                    meta["revision"] = new
+                    self._save_meta(name, meta)
+
+
+# --- 저장소에 끼워서 쓰기 ---
+class SnapshotStorage(Storage):
+    # inner 는 GoogleSheetsStorage (load_all_rows 필요)
+    # revision: 스프레드시트 버전 번호(정수)를 돌려주는 함수 (check_interval 초에 한 번만 물어본다)
+    # 저장/수정한 사용자는 스냅샷에서 빼고 원래 저장소에서 읽다가, 그런 사용자가
+    # REFRESH_RATIO 를 넘으면 시트 전체를 한 번 읽어서 새로 만든다
+    REFRESH_RATIO = 0.2
+
+    def __init__(self, inner, snapshot, revision, check_interval=30):
+        self.inner = inner
+        self.snapshot = snapshot
+        self.revision = revision
+        self.check_interval = check_interval
+        self.stable_ids = inner.stable_ids
+        self._lock = threading.Lock()
+        self._refresh_locks = {name: threading.Lock() for name in COLUMNS}
+        self._remote = None
+        self._checked = 0.0
+
+    def _remote_revision(self, force=False):
+        # 여러 세션이 동시에 물어봐도 API 는 한 번만 부른다
+        with self._lock:
+            if force or self._remote is None or time.monotonic() - self._checked >= self.check_interval:
+                self._remote = self.revision()
+                self._checked = time.monotonic()
+            return self._remote
+
+    def _usable(self, sheet_name, remote):
+        return (self.snapshot.revision(sheet_name) == remote
+                and self.snapshot.dropped_ratio(sheet_name) <= self.REFRESH_RATIO)
+
+    def load_user_rows(self, sheet_name, user):
+        remote = self._remote_revision()
+        if self._usable(sheet_name, remote):
+            rows = self.snapshot.user_rows(sheet_name, user)
+            if rows is not None:
+                return rows
+            return self.inner.load_user_rows(sheet_name, user)
+
+        with self._refresh_locks[sheet_name]:
+            # 기다리는 동안 다른 세션이 이미 새로 만들었으면 그걸 쓴다
+            if self._usable(sheet_name, remote):
+                rows = self.snapshot.user_rows(sheet_name, user)
+                if rows is not None:
+                    return rows
+                return self.inner.load_user_rows(sheet_name, user)
+            all_rows = self.inner.load_all_rows(sheet_name)
+            self.snapshot.save(sheet_name, remote, all_rows)
+        return [(row_id, values) for row_id, values in all_rows if user_key(values[0]) == user]
+
+    def _before_write(self):
+        # 쓰기 직전의 버전 번호 (캐시 말고 지금 값). 스냅샷이 이 번호가 아니면
+        # 그 사이에 다른 서버나 시트 화면에서 고친 것이니 쓰고 나서도 갈아타지 않는다
+        return self._remote_revision(force=True)
+
+    def _after_write(self, sheet_name, user, ok, before, deletes=()):
+        # 쓴 사용자 몫은 스냅샷에서 빼고, 우리가 쓴 한 번만큼 올라간 버전 번호로 갈아탄다
+        # (쓰기 직전 번호 before 로 만든 스냅샷만, 쓴 뒤 번호가 before + 1 일 때만.
+        #  더 올라갔으면 그 사이에 다른 서버나 시트 화면에서도 고친 것 -> 다음 확인 때 새로 만든다)
+        # 실패했으면 번호는 그대로 둔다 -> 뭔가 반영됐다면 다음 확인 때 새로 만든다
+        self.snapshot.drop_user(sheet_name, user)
+        if deletes and not self.stable_ids:
+            if not ok:
+                # 행 삭제가 됐는지 모르면 다른 사람 행 번호도 믿을 수 없다
+                self.snapshot.drop(sheet_name)
+                return
+            self.snapshot.note_delete(sheet_name, deletes)
+        if ok:
+            after = self._remote_revision(force=True)
+            if after == before + 1:
+                self.snapshot.adopt_revision(before, after)
+
+    def append_rows(self, sheet_name, user, rows):
+        before = self._before_write()
+        try:
+            self.inner.append_rows(sheet_name, user, rows)
+        except Exception:
+            self._after_write(sheet_name, user, False, before)
+            raise
+        self._after_write(sheet_name, user, True, before)
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        before = self._before_write()
+        try:
+            deleted = self.inner.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        except SheetConflict:
+            # 확인 단계에서 멈춤 -> 시트는 그대로, 그 사용자 몫만 다시 읽게 한다
+            self._after_write(sheet_name, user, False, before)
+            raise
+        except Exception:
+            self._after_write(sheet_name, user, False, before, deletes)
+            raise
+        # 행이 밀려 다시 찾았으면 실제로 지운 번호로 당긴다
+        self._after_write(sheet_name, user, True, before, deleted)
+        return deleted
@@ -0,0 +1,481 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+
+import sheet_sync
+from row_index import IndexDrift, read_user_rows
+from schema import (COLUMNS, canonical_row, column_names, date_column, new_record, normalize_date, record_id, row_key,
+                    user_key)
+from scheduler import background
+from shared_cache import SharedLock
+from sheet_sync import SheetConflict
+
+
+# ==========================================
+# [저장소]
+# 화면 코드는 아래 인터페이스만 쓰고, 실제 저장 위치는 설정으로 고른다.
+#   - GoogleSheetsStorage : 지금까지 쓰던 구글 시트
+#   - SqliteStorage       : 로컬 DB (사용자/날짜 인덱스, 숫자는 정수로 저장)
+#   - MirroredStorage     : SQLite 에 쓰고, 구글 시트에는 백그라운드로 복사
+#   - CachedStorage       : 어떤 저장소든 앞에 스냅샷 캐시를 붙임
+#
+# 행 값은 schema.COLUMNS 순서의 리스트로 주고받는다. 쓸 때는 schema.canonical_row
+# 형식(정수/ISO 날짜)으로 저장하고, 읽은 값은 load_data 에서 schema.parse_frame 으로 한 번 변환한다.
+# 행 id 는 저장소마다 다르다 (시트 = 행 번호, SQLite = rowid).
+# 행마다 기록ID/수정번호(schema.META_COLUMNS)가 있어서, 수정할 때는 불러온 뒤에
+# 그 행이 그대로인지 확인하고 고친다 (다른 사용자와는 잠금 없이 같이 저장된다).
+# ==========================================
+class Storage:
+    # 지운 행 때문에 다른 행의 id 가 바뀌지 않으면 True
+    stable_ids = False
+
+    def load_user_rows(self, sheet_name, user):
+        # 반환: [(행 id, 값 리스트)]
+        raise NotImplementedError
+
+    def append_rows(self, sheet_name, user, rows):
+        raise NotImplementedError
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        # updates: {행 id: 값 리스트}, inserts: [값 리스트], deletes: [행 id]
+        # expected: {행 id: schema.row_key} -> 지금 값과 다르면 SheetConflict
+        # 반환: 실제로 지운 행 id (시트에서 행이 밀려 다시 찾았으면 바뀐 번호)
+        raise NotImplementedError
+
+    def forget(self, sheet_name, user):
+        # 이 저장소를 거치지 않고 들어간 행이 있을 수 있음 (응답 없이 끊긴 저장)
+        # -> 따로 더해 두는 표(집계표/정비 인덱스)는 다음에 불러올 때 다시 만든다
+        pass
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        # 내보내기용: 날짜순 [(행 id, 값 리스트)] 를 chunk_size 개씩
+        # start/end: "YYYY-MM-DD" (그 날 포함), None 이면 처음/끝까지
+        # 기본은 한 번에 불러와서 자른다 (SQLite 는 DB 에서 조금씩 읽는다)
+        rows = _in_period(self.load_user_rows(sheet_name, user), start, end)
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+
+
+def _in_period(rows, start, end):
+    # 세 장부 모두 2번째 칸(사용자번호 다음)이 날짜
+    dated = sorted(((normalize_date(values[1]), row_id, values) for row_id, values in rows), key=lambda r: r[:2])
+    return [(row_id, values) for day, row_id, values in dated
+            if (start is None or day >= start) and (end is None or day <= end)]
+
+
+def _as_text(sheet_name, values):
+    return [str(v) for v in canonical_row(sheet_name, values)]
+
+
+def _pad(row, width):
+    return (list(row) + [""] * width)[:width]
+
+
+class _SheetLock:
+    # 시트 하나에 대한 공유/단독 잠금 (이 서버 프로세스 안에서만)
+    # 행 번호가 밀리거나 추가 위치를 계산해야 하는 쓰기(삭제, 표에서 추가)는 단독,
+    # 나머지 쓰기(수정, 입력 폼 추가)는 여러 사용자가 같이 한다
+    # 서버가 여러 대면 GoogleSheetsStorage 가 공용 저장소 잠금(shared_cache.SharedLock)도 잡는다
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=False):
+        with self._cond:
+            while self._exclusive or (exclusive and self._shared):
+                self._cond.wait()
+            if exclusive:
+                self._exclusive = True
+            else:
+                self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if exclusive:
+                    self._exclusive = False
+                else:
+                    self._shared -= 1
+                self._cond.notify_all()
+
+
+# --- 구글 시트 ---
+# shared: 서버가 여러 대일 때 공용 저장소 (redis). apply_changes 는 확인(_locate)부터 쓰기까지
+# 시트별 공용 잠금 sheet:lock:시트 를 잡는다 -> 다른 서버가 그 사이에 행을 지워서 번호가 밀리지 않는다.
+# 행을 지우는 쓰기만 단독, 수정/표에서 추가는 사용자별 공유 (다른 사용자 수정은 서버가 달라도 같이 한다).
+# 맨 끝에 붙이기만 하는 쓰기(append_rows)는 다른 행 번호를 바꾸지 않아서 안 잡는다
+class GoogleSheetsStorage(Storage):
+    def __init__(self, pool, row_index, shared=None):
+        self.pool = pool
+        self.row_index = row_index
+        self._sheet_locks = {name: _SheetLock() for name in COLUMNS}
+        self._shared_locks = {}
+        if shared is not None and not shared.local:
+            self._shared_locks = {name: SharedLock(shared, f"sheet:lock:{name}") for name in COLUMNS}
+        self._user_locks = {}
+        self._lock = threading.Lock()
+
+    def _user_lock(self, sheet_name, user):
+        # 같은 사용자가 두 기기에서 동시에 저장하면 확인->쓰기 사이에 끼어들지 않도록
+        with self._lock:
+            return self._user_locks.setdefault((sheet_name, user), threading.Lock())
+
+    def _write_lock(self, sheet_name, user, exclusive):
+        lock = self._shared_locks.get(sheet_name)
+        return contextlib.nullcontext() if lock is None else lock.hold(user, exclusive)
+
+    def _rebuild_index(self, sheet_name):
+        # 시트 전체를 한 번 읽어서 인덱스를 다시 만든다 (처음이거나 틀어졌을 때만)
+        all_rows = self.pool.run(sheet_name, lambda ws: ws.get_all_values(), key=("all_rows", sheet_name))
+        self.row_index.rebuild_sheet(sheet_name, all_rows)
+        return all_rows
+
+    def load_user_rows(self, sheet_name, user, coalesce=True):
+        # coalesce=False: 다른 세션이 먼저 시작한 읽기 결과를 같이 쓰지 않는다 (저장 직전 확인용)
+        width = len(COLUMNS[sheet_name])
+        try:
+            return self.pool.run(
+                sheet_name,
+                lambda ws: read_user_rows(ws, self.row_index, sheet_name, user, width),
+                key=("user_rows", sheet_name, user) if coalesce else None,
+            )
+        except IndexDrift:
+            return [(row_num, row) for row_num, row in self.load_all_rows(sheet_name) if user_key(row[0]) == user]
+
+    def load_all_rows(self, sheet_name):
+        # 모든 사용자의 행 [(행번호, 값)] -> 전체를 읽은 김에 인덱스도 새로 만든다
+        width = len(COLUMNS[sheet_name])
+        all_rows = self._rebuild_index(sheet_name)
+        return [(row_num, _pad(row, width)) for row_num, row in enumerate(all_rows[1:], start=2) if row]
+
+    def _ensure_header(self, sheet_name):
+        # 인덱스에 행이 있으면 헤더가 있는 것 -> 시트를 다시 읽지 않는다
+        if self.row_index.has(sheet_name):
+            has_header = self.row_index.last_row(sheet_name) >= 1
+        else:
+            has_header = bool(self._rebuild_index(sheet_name))
+        header = column_names(sheet_name)
+        if not has_header and header:
+            response = self.pool.run(sheet_name, lambda ws: ws.append_row(header), idempotent=False)
+            self.row_index.note_append(sheet_name, None, response)
+
+    def append_rows(self, sheet_name, user, rows):
+        self._ensure_header(sheet_name)
+        rows = [new_record(sheet_name, row) for row in rows]
+        with self._sheet_locks[sheet_name].hold():
+            try:
+                response = self.pool.run(sheet_name, lambda ws: ws.append_rows(rows), idempotent=False)
+            except Exception as e:
+                # 4xx 는 거절된 것. 나머지(연결 끊김, 5xx)는 들어갔는지 모르니 인덱스를 다음 로드 때 새로 만든다
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status is None or status >= 500:
+                    self.row_index.drop(sheet_name)
+                raise
+            self.row_index.note_append(sheet_name, user, response)
+
+    def _locate(self, sheet_name, user, expected):
+        # 반환: {불러올 때 행 번호: 지금 행 번호}
+        # 다른 사용자가 위쪽 행을 지워서 밀렸으면 기록ID 로 다시 찾는다.
+        # 기록ID 는 같은데 수정번호가 다르거나, 기록이 없어졌으면 SheetConflict
+        width = len(COLUMNS[sheet_name])
+        key = lambda row: row_key(sheet_name, row)
+        moved = self.pool.run(sheet_name, lambda ws: sheet_sync.verify_rows(ws, expected, width, key))
+        located = {r: r for r in expected}
+        if not moved:
+            return located
+        if any(not expected[r][1] for r in moved):
+            raise SheetConflict("기록ID 가 없는 행이 변경되었습니다")
+        rows = self.load_user_rows(sheet_name, user, coalesce=False)
+        current = {record_id(sheet_name, row): (row_num, key(row)) for row_num, row in rows}
+        for r in moved:
+            row_num, have = current.get(expected[r][1], (None, None))
+            if have != list(expected[r]):
+                raise SheetConflict(f"{r}행이 변경되었습니다")
+            located[r] = row_num
+        return located
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        width = len(COLUMNS[sheet_name])
+        inserts = [new_record(sheet_name, values) for values in inserts]
+        with self._sheet_locks[sheet_name].hold(exclusive=bool(deletes or inserts)), self._user_lock(sheet_name, user), \
+                self._write_lock(sheet_name, user, exclusive=bool(deletes)):
+            try:
+                located = self._locate(sheet_name, user, expected) if expected else {}
+                updates = {located.get(r, r): canonical_row(sheet_name, values) for r, values in updates.items()}
+                deletes = [located.get(r, r) for r in deletes]
+                self.pool.run(
+                    sheet_name,
+                    lambda ws: sheet_sync.apply_changes(ws, width, updates, inserts, deletes),
+                    idempotent=False,
+                )
+            except SheetConflict:
+                raise
+            except Exception:
+                # 보냈는지 모르는 실패면 인덱스를 믿을 수 없으니 다음 로드 때 새로 만든다
+                self.row_index.drop(sheet_name)
+                raise
+            if deletes:
+                self.row_index.note_delete(sheet_name, deletes)
+            if inserts:
+                self.row_index.note_appended(sheet_name, user, len(inserts))
+        return deletes
+
+
+# --- SQLite ---
+_SQL_TYPES = {"key": "INTEGER", "text": "TEXT", "date": "TEXT", "won": "INTEGER", "count": "INTEGER", "km": "INTEGER"}
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SqliteStorage(Storage):
+    stable_ids = True
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            for sheet_name, columns in COLUMNS.items():
+                cols = ", ".join(f"{_q(name)} {_SQL_TYPES[kind]}" for name, kind in columns)
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_q(sheet_name)} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})"
+                )
+                # 예전에 만든 DB 에 없는 칸 (기록ID/수정번호 등)은 붙인다
+                existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({_q(sheet_name)})")}
+                for name, kind in columns:
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE {_q(sheet_name)} ADD COLUMN {_q(name)} {_SQL_TYPES[kind]}")
+                user_col, date_col = columns[0][0], date_column(sheet_name)
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_q('idx_' + sheet_name + '_user_date')} "
+                    f"ON {_q(sheet_name)} ({_q(user_col)}, {_q(date_col)})"
+                )
+
+    def _to_db(self, sheet_name, values):
+        # 숫자 칸은 INTEGER 로 들어간다 (숫자가 아닌 글자는 그대로 둔다)
+        return [None if v == "" else v for v in canonical_row(sheet_name, values)]
+
+    def _from_db(self, sheet_name, values):
+        return ["" if v is None else v for v in values]
+
+    def _columns_sql(self, sheet_name):
+        return ", ".join(_q(name) for name in column_names(sheet_name))
+
+    def load_user_rows(self, sheet_name, user):
+        user_col = column_names(sheet_name)[0]
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT id, {self._columns_sql(sheet_name)} FROM {_q(sheet_name)} WHERE {_q(user_col)} = ? ORDER BY id",
+                (user,),
+            )
+            rows = cur.fetchall()
+        return [(row[0], self._from_db(sheet_name, row[1:])) for row in rows]
+
+    def load_all_rows(self, sheet_name):
+        # 모든 사용자의 행 [(id, 값)] (밤 작업 같은 명령줄 도구용)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {self._columns_sql(sheet_name)} FROM {_q(sheet_name)} ORDER BY id"
+            ).fetchall()
+        return [(row[0], self._from_db(sheet_name, row[1:])) for row in rows]
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        # (날짜, id) 다음 것부터 chunk_size 개씩 -> 전체를 메모리에 올리지 않고, 읽는 사이에 잠금도 풀어 둔다
+        names = column_names(sheet_name)
+        # 날짜가 빈 행(NULL)도 빠지지 않게 빈 글자로 비교
+        user_col, date_col = _q(names[0]), f"COALESCE({_q(date_column(sheet_name))}, '')"
+        period = ""
+        params = [user]
+        if start is not None:
+            period += f" AND {date_col} >= ?"
+            params.append(start)
+        if end is not None:
+            period += f" AND {date_col} <= ?"
+            params.append(end)
+        last = None
+        while True:
+            after = ""
+            if last is not None:
+                after = f" AND ({date_col} > ? OR ({date_col} = ? AND id > ?))"
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, {self._columns_sql(sheet_name)} FROM {_q(sheet_name)} "
+                    f"WHERE {user_col} = ?{period}{after} ORDER BY {date_col}, id LIMIT ?",
+                    params + (list(last) if last else []) + [chunk_size],
+                ).fetchall()
+            if not rows:
+                return
+            yield [(row[0], self._from_db(sheet_name, row[1:])) for row in rows]
+            day = rows[-1][1 + names.index(date_column(sheet_name))] or ""
+            last = (day, day, rows[-1][0])
+
+    def _insert(self, sheet_name, rows):
+        names = column_names(sheet_name)
+        self._conn.executemany(
+            f"INSERT INTO {_q(sheet_name)} ({self._columns_sql(sheet_name)}) VALUES ({', '.join('?' * len(names))})",
+            [self._to_db(sheet_name, new_record(sheet_name, row)) for row in rows],
+        )
+
+    def append_rows(self, sheet_name, user, rows):
+        with self._lock, self._conn:
+            self._insert(sheet_name, rows)
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        names = column_names(sheet_name)
+        table = _q(sheet_name)
+        with self._lock, self._conn:
+            for row_id, want in (expected or {}).items():
+                row = self._conn.execute(
+                    f"SELECT {self._columns_sql(sheet_name)} FROM {table} WHERE id = ?", (row_id,)
+                ).fetchone()
+                if row is None or row_key(sheet_name, self._from_db(sheet_name, row)) != list(want):
+                    raise SheetConflict(f"{row_id}번 행이 변경되었습니다")
+            assignments = ", ".join(f"{_q(name)} = ?" for name in names)
+            for row_id, values in updates.items():
+                self._conn.execute(
+                    f"UPDATE {table} SET {assignments} WHERE id = ?",
+                    self._to_db(sheet_name, values) + [row_id],
+                )
+            if inserts:
+                self._insert(sheet_name, inserts)
+            if deletes:
+                self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in deletes])
+        return deletes
+
+
+# --- 스냅샷 캐시 ---
+class CachedStorage(Storage):
+    def __init__(self, inner, cache):
+        self.inner = inner
+        self.cache = cache
+        self.stable_ids = inner.stable_ids
+
+    def load_user_rows(self, sheet_name, user):
+        return self.cache.get((sheet_name, user), lambda: self.inner.load_user_rows(sheet_name, user))
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        # 캐시에 있으면 그걸 자르고, 없으면 캐시에 넣지 않고 그대로 흘려보낸다 (큰 내보내기가 캐시를 채우지 않게)
+        if self.cache.peek((sheet_name, user)) is not None:
+            return Storage.iter_user_rows(self, sheet_name, user, start, end, chunk_size)
+        return self.inner.iter_user_rows(sheet_name, user, start, end, chunk_size)
+
+    def append_rows(self, sheet_name, user, rows):
+        try:
+            self.inner.append_rows(sheet_name, user, rows)
+        finally:
+            self.cache.invalidate((sheet_name, user))
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        try:
+            deleted = self.inner.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        except Exception:
+            self.cache.invalidate(sheet_name)
+            raise
+        if deleted and not self.stable_ids:
+            # 시트에서 행을 지우면 아래쪽 모든 사람의 행 번호가 당겨지므로 시트 전체 캐시를 비운다
+            self.cache.invalidate(sheet_name)
+        else:
+            self.cache.invalidate((sheet_name, user))
+        return deleted
+
+
+# --- SQLite + 구글 시트 백그라운드 복사 ---
+class MirroredStorage(Storage):
+    RETRY_DELAY = 5
+
+    def __init__(self, primary, mirror):
+        self.primary = primary
+        self.mirror = mirror
+        self.stable_ids = primary.stable_ids
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._worker, name="sheet-mirror", daemon=True).start()
+
+    def _mark(self, sheet_name, user):
+        # 같은 (시트, 사용자)는 한 번만 줄 세운다
+        key = (sheet_name, user)
+        with self._lock:
+            if key in self._dirty:
+                return
+            self._dirty.add(key)
+        self._queue.put(key)
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def load_user_rows(self, sheet_name, user):
+        return self.primary.load_user_rows(sheet_name, user)
+
+    def iter_user_rows(self, sheet_name, user, start=None, end=None, chunk_size=1000):
+        return self.primary.iter_user_rows(sheet_name, user, start, end, chunk_size)
+
+    def append_rows(self, sheet_name, user, rows):
+        self.primary.append_rows(sheet_name, user, rows)
+        self._mark(sheet_name, user)
+
+    def apply_changes(self, sheet_name, user, updates, inserts, deletes, expected=None):
+        deleted = self.primary.apply_changes(sheet_name, user, updates, inserts, deletes, expected)
+        self._mark(sheet_name, user)
+        return deleted
+
+    def sync_user(self, sheet_name, user):
+        # 그 사용자의 시트 행을 DB 와 같게 맞춘다 (바뀐 행만 수정/추가/삭제)
+        # 기록ID 로 짝을 짓는다 (중간 행을 지워도 뒤쪽 행이 밀려서 전부 수정으로 보이지 않게).
+        # 기록ID 가 없는 예전 행끼리만 순서대로 짝짓는다
+        want = [values for _, values in self.primary.load_user_rows(sheet_name, user)]
+        have = self.mirror.load_user_rows(sheet_name, user)
+        wanted = {}
+        for values in want:
+            wanted.setdefault(record_id(sheet_name, values), values)
+        plain_want = [values for values in want if not record_id(sheet_name, values)]
+        plain_have = [(row_id, old) for row_id, old in have if not record_id(sheet_name, old)]
+
+        pairs, deletes, seen = list(zip(plain_have, plain_want)), [], set()
+        deletes += [row_id for row_id, _ in plain_have[len(plain_want):]]
+        for row_id, old in have:
+            rid = record_id(sheet_name, old)
+            if not rid:
+                continue
+            if rid in seen or rid not in wanted:
+                deletes.append(row_id)
+                continue
+            seen.add(rid)
+            pairs.append(((row_id, old), wanted[rid]))
+        # 시트는 글자, DB 는 정수 -> 저장 형식을 글자로 바꿔서 비교
+        updates = {row_id: values for (row_id, old), values in pairs
+                   if _as_text(sheet_name, old) != _as_text(sheet_name, values)}
+        inserts = [values for values in want if record_id(sheet_name, values) not in seen
+                   and record_id(sheet_name, values)] + plain_want[len(plain_have):]
+        if updates or deletes:
+            self.mirror.apply_changes(sheet_name, user, updates, [], deletes)
+        if inserts:
+            self.mirror.append_rows(sheet_name, user, inserts)
+
+    def _worker(self):
+        # 시트 복사는 화면 요청보다 뒤로 (scheduler)
+        with background():
+            while True:
+                self._sync_next()
+
+    def _sync_next(self):
+        key = self._queue.get()
+        with self._lock:
+            self._dirty.discard(key)
+        try:
+            self.sync_user(*key)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            time.sleep(self.RETRY_DELAY)
+            self._mark(*key)
@@ -0,0 +1,63 @@
+import io
+import zipfile
+
+import pytest
+
+import export
+from schema import SHEET_BANK, SHEET_WORK, new_record
+from storage import SqliteStorage
+
+
+@pytest.fixture
+def storage():
+    storage = SqliteStorage(":memory:")
+    storage.append_rows(SHEET_WORK, "1", [
+        new_record(SHEET_WORK, ["1", "2025-03-02", "쿠팡", 20000, 4, 5000, "둘째"]),
+        new_record(SHEET_WORK, ["1", "2025-03-01", "배민", 30000, 6, 5000, "첫째"]),
+        new_record(SHEET_WORK, ["2", "2025-03-01", "쿠팡", 99000, 9, 11000, "남의 것"]),
+    ])
+    return storage
+
+
+def _csv_lines(data):
+    assert data.startswith(b"\xef\xbb\xbf")
+    return data.decode("utf-8-sig").splitlines()
+
+
+def test_csv_has_own_rows_in_date_order_without_hidden_columns(storage):
+    data = export.build_export(storage, [SHEET_WORK], "1")
+    assert isinstance(data, bytes)
+    lines = _csv_lines(data)
+    assert lines[0] == "날짜,플랫폼,수입,배달건수,평균단가,메모"
+    assert lines[1:] == ["2025-03-01,배민,30000,6,5000,첫째", "2025-03-02,쿠팡,20000,4,5000,둘째"]
+
+
+def test_period_and_empty_ledger(storage):
+    lines = _csv_lines(export.build_export(storage, [SHEET_WORK], "1", start="2025-03-02", end="2025-03-02"))
+    assert lines[1:] == ["2025-03-02,쿠팡,20000,4,5000,둘째"]
+    # 기록이 없어도 헤더는 남는다
+    assert len(_csv_lines(export.build_export(storage, [SHEET_BANK], "1"))) == 1
+
+
+def test_several_ledgers_are_zipped(storage):
+    assert export.file_kind([SHEET_WORK, SHEET_BANK], "csv") == "zip"
+    data = export.build_export(storage, [SHEET_WORK, SHEET_BANK], "1")
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == [f"{SHEET_WORK}.csv", f"{SHEET_BANK}.csv"]
+        assert len(_csv_lines(archive.read(f"{SHEET_WORK}.csv"))) == 3
+
+
+def test_download_button_accepts_the_result(storage):
+    download = pytest.importorskip("streamlit.runtime.download_data_util")
+    data, _ = download.convert_data_to_bytes_and_infer_mime(
+        export.build_export(storage, [SHEET_WORK], "1"), unsupported_error=TypeError("지원하지 않는 형식"))
+    assert data.startswith(b"\xef\xbb\xbf")
+
+
+@pytest.mark.skipif(not export.HAS_XLSX, reason="openpyxl 없음")
+def test_xlsx_has_one_sheet_per_ledger(storage):
+    import openpyxl
+
+    book = openpyxl.load_workbook(io.BytesIO(export.build_export(storage, [SHEET_WORK, SHEET_BANK], "1", "xlsx")))
+    assert book.sheetnames == [SHEET_WORK, SHEET_BANK]
+    assert book[SHEET_WORK].max_row == 3
@@ -0,0 +1,14 @@
+from maint_index import MaintIndex
+from schema import SHEET_MAINT, new_record
+
+
+def test_rows_without_record_id_are_listed():
+    # migrate_typed.py 전 시트 (기록ID 없음)
+    index = MaintIndex(":memory:")
+    index.rebuild("1", [
+        ["1", "2025-01-02", "오일교환", 8000, 10000, "", "", ""],
+        ["1", "2025-03-02", "오일교환", 8000, 12000, "", "", ""],
+        ["1", "2025-03-02", "오일교환", 8000, 12000, "", "", ""],
+        new_record(SHEET_MAINT, ["1", "2025-02-02", "타이어(앞)", 50000, 11000, "앞"]),
+    ])
+    assert index.latest("1") == [("오일교환", "2025-03-02", 12000, ""), ("타이어(앞)", "2025-02-02", 11000, "앞")]
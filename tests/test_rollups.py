@@ -0,0 +1,73 @@
+import pytest
+
+from rollups import RollupStorage, Rollups
+from schema import SHEET_WORK, new_record
+from shared_cache import LocalShared, Stamps
+from storage import SqliteStorage
+
+
+def _work(day, revenue, count, user="1"):
+    return new_record(SHEET_WORK, [user, day, "쿠팡", revenue, count, revenue // count, ""])
+
+
+def _rebuilt(storage, user):
+    fresh = Rollups(":memory:")
+    fresh.rebuild(user, [values for _, values in storage.load_user_rows(SHEET_WORK, user)])
+    return {p: fresh.total(user, p) for p in ("D2025-03-01", "D2025-03-02", "M2025-03", "M2025-04", "Y2025")}
+
+
+@pytest.fixture
+def storage():
+    return RollupStorage(SqliteStorage(":memory:"), Rollups(":memory:"))
+
+
+def test_totals_follow_appends_edits_and_deletes(storage):
+    rollups = storage.rollups
+    rollups.rebuild("1", [])
+    storage.append_rows(SHEET_WORK, "1", [_work("2025-03-01", 30000, 10), _work("2025-03-02", 20000, 5),
+                                          _work("2025-04-01", 10000, 2), _work("2025-03-01", 9000, 3, user="2")])
+    assert rollups.total("1", "D2025-03-01") == (30000, 10)
+    assert rollups.total("1", "M2025-03") == (50000, 15)
+    assert rollups.total("1", "Y2025") == (60000, 17)
+
+    rows = storage.load_user_rows(SHEET_WORK, "1")
+    first, second = rows[0], rows[1]
+    edited = list(first[1])
+    edited[3] = 45000
+    storage.apply_changes(SHEET_WORK, "1", {first[0]: edited}, [], [second[0]])
+    assert rollups.total("1", "M2025-03") == (45000, 10)
+    # 다 빠진 날은 없어진다
+    assert rollups.days_in_month("1", "2025-03") == [("2025-03-01", 45000, 10)]
+    assert {p: rollups.total("1", p) for p in ("D2025-03-01", "D2025-03-02", "M2025-03", "M2025-04", "Y2025")} \
+        == _rebuilt(storage, "1")
+
+
+def test_rebuild_adds_archived_totals():
+    rollups = Rollups(":memory:")
+    rollups.rebuild("1", [_work("2025-03-01", 30000, 10)], archived={"M2023-05": (70000, 20), "Y2023": (70000, 20)})
+    assert rollups.years("1") == [2023, 2025]
+    assert rollups.total("1", "Y2023") == (70000, 20)
+    assert rollups.months_in_year("1", 2025) == [("2025-03", 30000, 10)]
+
+
+def test_failed_write_marks_rider_stale(storage):
+    storage.rollups.rebuild("1", [])
+
+    def broken(*args, **kwargs):
+        raise ConnectionError("응답 없이 끊김")
+
+    storage.inner.append_rows = broken
+    with pytest.raises(ConnectionError):
+        storage.append_rows(SHEET_WORK, "1", [_work("2025-03-01", 30000, 10)])
+    assert not storage.rollups.has("1")
+
+
+def test_other_server_write_makes_table_stale():
+    shared = LocalShared()
+    here, there = Rollups(":memory:", Stamps(shared, "rollup")), Rollups(":memory:", Stamps(shared, "rollup"))
+    here.rebuild("1", [])
+    there.rebuild("1", [])
+    here.add_rows([_work("2025-03-01", 30000, 10)])
+    here.touched("1")
+    assert here.has("1")
+    assert not there.has("1")
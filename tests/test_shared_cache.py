@@ -0,0 +1,41 @@
+import pytest
+
+from shared_cache import LocalShared, RedisShared, SharedLock, Stamps
+
+
+def test_redis_store_round_trip(redis_url):
+    shared = RedisShared(redis_url)
+    shared.set("goal:1", 300000)
+    assert shared.get("goal:1") == 300000
+    assert not shared.set("goal:1", 1, nx=True)
+    shared.rpush("q", [{"a": 1}, {"a": 2}, {"a": 1}])
+    assert shared.lrem_many("q", [{"a": 1}]) == 1
+    assert shared.lrange("q", 0, -1) == [{"a": 2}, {"a": 1}]
+
+
+def test_stamps_change_when_bumped():
+    stamps = Stamps(LocalShared(), "rollup")
+    before = stamps.current("1")[0]
+    assert stamps.bump("1") == (before, stamps.current("1")[0])
+    assert stamps.current("1")[0] != before
+
+
+def test_sheet_lock_is_shared_per_rider_and_exclusive_for_the_sheet():
+    shared = LocalShared()
+    here, there = SharedLock(shared, "sheet:lock:t", timeout=0.2), SharedLock(shared, "sheet:lock:t", timeout=0.2)
+    with here.hold("1"):
+        # 다른 사용자는 같이, 같은 사용자와 시트 단독은 기다린다
+        with there.hold("2"):
+            pass
+        with pytest.raises(TimeoutError):
+            with there.hold("1"):
+                pass
+        with pytest.raises(TimeoutError):
+            with there.hold("2", exclusive=True):
+                pass
+    with here.hold("1", exclusive=True):
+        with pytest.raises(TimeoutError):
+            with there.hold("2"):
+                pass
+    with there.hold("2", exclusive=True):
+        pass
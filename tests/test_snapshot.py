@@ -0,0 +1,65 @@
+import pytest
+
+import bench
+from schema import SHEET_WORK
+
+pytest.importorskip("pyarrow")
+
+
+def _app(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = bench.App(spreadsheet, str(tmp_path), snapshot=True)
+    for user in ids:
+        app.storage.load_user_rows(SHEET_WORK, user)
+    return app
+
+
+def _row_of(spreadsheet, user):
+    rows = spreadsheet.worksheet(SHEET_WORK)._rows
+    return next(i + 1 for i, r in enumerate(rows) if i and r and r[0] == user)
+
+
+def _memo(app, user, row_num):
+    app.cache.invalidate()
+    return dict(app.storage.load_user_rows(SHEET_WORK, user))[row_num][6]
+
+
+def test_own_write_adopts_revision(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = _app(sheet, tmp_path)
+    reads = spreadsheet.calls["get_all_values"]
+    app.save_new_entry(SHEET_WORK, ids[0], ["2025-03-15", "쿠팡", 1000, 1, 1000, ""])
+    app.wait_for_queue(timeout=30)
+    app.cache.invalidate()
+    app.storage.load_user_rows(SHEET_WORK, ids[1])
+    # 우리가 쓴 것뿐이면 스냅샷을 그대로 쓴다 (시트 전체를 다시 읽지 않는다)
+    assert spreadsheet.calls["get_all_values"] == reads
+
+
+def test_edit_before_write_is_not_adopted(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = _app(sheet, tmp_path)
+    row_num = _row_of(spreadsheet, ids[1])
+    spreadsheet.worksheet(SHEET_WORK).update(range_name=f"G{row_num}", values=[["시트에서 고침"]])
+    app.save_new_entry(SHEET_WORK, ids[0], ["2025-03-15", "쿠팡", 1000, 1, 1000, ""])
+    app.wait_for_queue(timeout=30)
+    assert _memo(app, ids[1], row_num) == "시트에서 고침"
+
+
+def test_write_between_revision_reads_is_not_adopted(sheet, tmp_path):
+    # 우리 쓰기와 쓴 뒤 버전 확인 사이에 다른 서버가 고침 -> 번호가 2 올라가서 갈아타지 않는다
+    ids, spreadsheet = sheet
+    app = _app(sheet, tmp_path)
+    row_num = _row_of(spreadsheet, ids[1])
+    ws = spreadsheet.worksheet(SHEET_WORK)
+    original = ws.append_rows
+
+    def racing(*args, **kwargs):
+        result = original(*args, **kwargs)
+        ws.update(range_name=f"G{row_num}", values=[["다른 서버"]])
+        return result
+
+    ws.append_rows = racing
+    app.save_new_entry(SHEET_WORK, ids[0], ["2025-03-15", "쿠팡", 1000, 1, 1000, ""])
+    app.wait_for_queue(timeout=30)
+    assert _memo(app, ids[1], row_num) == "다른 서버"
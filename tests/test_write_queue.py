@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+import bench
+from conftest import lose_first_response
+from schema import SHEET_BANK, SHEET_WORK, new_record, record_id
+from shared_cache import RedisShared
+from write_queue import SharedWriteQueue
+
+
+def _sheet_rows(spreadsheet, sheet_name, user):
+    return [r for r in spreadsheet.worksheet(sheet_name)._rows[1:] if r and r[0] == user]
+
+
+def _drain(app):
+    app.wait_for_queue(timeout=30)
+    time.sleep(0.2)
+
+
+class _Rejected(Exception):
+    class response:
+        status_code = 400
+
+
+def test_resend_after_lost_response_does_not_duplicate(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = bench.App(spreadsheet, str(tmp_path))
+    user = ids[0]
+    lose_first_response(spreadsheet.worksheet(SHEET_WORK))
+    for i in range(3):
+        app.save_new_entry(SHEET_WORK, user, ["2025-03-15", "쿠팡", 1000 + i, 1, 1000, "queued"])
+    _drain(app)
+    sent = [r for r in _sheet_rows(spreadsheet, SHEET_WORK, user) if r[6] == "queued"]
+    assert len(sent) == 3
+    assert len({record_id(SHEET_WORK, r) for r in sent}) == 3
+    assert app.queue.pending_count() == 0
+
+
+def test_rollups_rebuilt_after_unsure_append(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = bench.App(spreadsheet, str(tmp_path))
+    user = ids[0]
+    app.stats(user, app.load_data(SHEET_WORK, user))
+    before = app.rollups.total(user, "M2025-03")
+    lose_first_response(spreadsheet.worksheet(SHEET_WORK))
+    app.save_new_entry(SHEET_WORK, user, ["2025-03-15", "쿠팡", 12000, 3, 4000, ""])
+    _drain(app)
+    # 들어갔는지 모르는 저장 -> 집계표를 믿지 않고 다시 만든다
+    assert not app.rollups.has(user)
+    app.stats(user, app.load_data(SHEET_WORK, user))
+    assert app.rollups.total(user, "M2025-03") == (before[0] + 12000, before[1] + 3)
+
+
+def test_resend_check_marks_indexes_stale(sheet, tmp_path):
+    # 응답 없이 끊긴 뒤 다시 보낼 때 이미 들어간 행을 빼면, 그 행은 집계표에 더해진 적이 없다
+    ids, spreadsheet = sheet
+    app = bench.App(spreadsheet, str(tmp_path))
+    user = ids[0]
+    app.stats(user, app.load_data(SHEET_WORK, user))
+    row = new_record(SHEET_WORK, [user, "2025-03-15", "쿠팡", 5000, 1, 5000, ""])
+    # 집계표를 거치지 않고 시트에만 들어간 상태
+    app.storage.inner.inner.append_rows(SHEET_WORK, user, [row])
+    count = len(_sheet_rows(spreadsheet, SHEET_WORK, user))
+    assert app.rollups.has(user)
+
+    app.queue._unsure = True
+    app.queue.submit(SHEET_WORK, user, row)
+    _drain(app)
+    assert len(_sheet_rows(spreadsheet, SHEET_WORK, user)) == count
+    assert not app.rollups.has(user)
+
+
+def test_rejected_batch_is_parked_and_retried(sheet, tmp_path):
+    ids, spreadsheet = sheet
+    app = bench.App(spreadsheet, str(tmp_path))
+    user = ids[0]
+    bank = spreadsheet.worksheet(SHEET_BANK)
+    original = bank.append_rows
+
+    def reject(*args, **kwargs):
+        raise _Rejected("Invalid range")
+
+    bank.append_rows = reject
+    app.save_new_entry(SHEET_BANK, user, ["2025-03-15", "쿠팡", 50000, "parked"])
+    app.save_new_entry(SHEET_WORK, user, ["2025-03-15", "쿠팡", 7000, 1, 7000, "after"])
+    _drain(app)
+    assert [(s, r[4]) for s, r, _ in app.queue.failed_rows(user)] == [(SHEET_BANK, "parked")]
+    assert any(r[6] == "after" for r in _sheet_rows(spreadsheet, SHEET_WORK, user))
+
+    bank.append_rows = original
+    assert app.queue.retry_failed(user) == 1
+    _drain(app)
+    assert app.queue.failed_rows(user) == []
+    assert any(r[4] == "parked" for r in _sheet_rows(spreadsheet, SHEET_BANK, user))
+
+
+def test_shared_queue_sends_once_across_servers(sheet, tmp_path, redis_url):
+    ids, spreadsheet = sheet
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    a = bench.App(spreadsheet, str(tmp_path / "a"), shared=RedisShared(redis_url))
+    b = bench.App(spreadsheet, str(tmp_path / "b"), shared=RedisShared(redis_url))
+    assert isinstance(a.queue, SharedWriteQueue)
+    user = ids[0]
+    count = len(_sheet_rows(spreadsheet, SHEET_WORK, user))
+    for i in range(5):
+        b.save_new_entry(SHEET_WORK, user, ["2025-03-15", "쿠팡", 1000 + i, 1, 1000, ""])
+    assert a.queue.pending_count(user) == 5
+    _drain(b)
+    _drain(a)
+    assert len(_sheet_rows(spreadsheet, SHEET_WORK, user)) == count + 5
+
+
+def test_shared_queue_keeps_rows_after_losing_the_lease(tmp_path, redis_url):
+    class Idle(SharedWriteQueue):
+        def _worker(self):
+            pass
+
+    queue = Idle(None, RedisShared(redis_url), flush_delay=0)
+    queue.submit_many(SHEET_WORK, "1", [["1", "2025-03-15", "쿠팡", 1000, 1, 1000, "", "r1", 1]])
+    sheet_name, user, ids, rows = queue._next_batch()
+    # 다른 서버가 잠금을 이어받음
+    queue.shared.set(queue.LOCK, "other")
+    with pytest.raises(RuntimeError):
+        queue._done(sheet_name, user, ids)
+    assert queue.pending_count() == 1
@@ -0,0 +1,197 @@
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+# ==========================================
+# [사용자 목록 (로그인 확인 + 사용자번호)]
+# 아이디마다 사용자번호(정수)와 비밀번호 해시 하나. 로그인할 때 장부 행을 뒤지지 않고 이 목록만 확인하고,
+# 장부 행에는 아이디/비밀번호 대신 사용자번호만 적는다 (비밀번호를 바꿔도 장부는 그대로).
+# 로컬 SQLite 파일(users.db)에 들고 있고, 시트를 쓰는 설정이면 "사용자" 시트가 원본이다
+# (서버가 여러 대여도 같은 목록). 로컬에 없는 아이디나 틀린 비밀번호일 때만 시트를 다시 읽는다.
+# 이 모듈은 표준 라이브러리만 쓴다 -> 로그인 화면은 pandas/gspread 없이 바로 뜬다.
+# 예전 장부(아이디/비번 칸)는 migrate_users.py 로 한 번 옮긴다.
+# ==========================================
+REGISTRY_SHEET = "사용자"
+REGISTRY_HEADER = ["사용자번호", "아이디", "솔트", "비번해시", "가입일"]
+HASH_ROUNDS = 100000
+# 시트를 다시 읽는 최소 간격(초). 틀린 비밀번호를 계속 넣어도 시트 읽기는 이만큼에 한 번
+REFRESH_GAP = 10
+# 두 서버에서 동시에 가입해서 번호가 겹치면 새 번호로 다시 (몇 번까지)
+REGISTER_TRIES = 3
+
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), HASH_ROUNDS).hex()
+
+
+def new_entry(key, user, password):
+    # 반환: "사용자" 시트 한 줄 (사용자번호, 아이디, 솔트, 비번해시, 가입일)
+    salt = os.urandom(16).hex()
+    return [key, user, salt, hash_password(password, salt), datetime.now().strftime("%Y-%m-%d")]
+
+
+def _winners(entries):
+    # 같은 아이디나 같은 번호가 두 줄이면 먼저 적힌 쪽만 (두 서버에서 동시에 가입한 경우)
+    seen_users, seen_keys, out = set(), set(), []
+    for entry in entries:
+        try:
+            key = int(entry[0])
+        except (TypeError, ValueError):
+            continue
+        if not entry[1] or entry[1] in seen_users or key in seen_keys:
+            continue
+        seen_users.add(entry[1])
+        seen_keys.add(key)
+        out.append([key] + list(entry[1:]))
+    return out
+
+
+class SheetUsers:
+    # "사용자" 시트 읽기/추가/고치기 (pool: sheet_client.SheetPool)
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _rows(self):
+        if REGISTRY_SHEET not in self.pool.titles():
+            return []
+        rows = self.pool.run(REGISTRY_SHEET, lambda ws: ws.get_all_values(), key=("all_rows", REGISTRY_SHEET))
+        width = len(REGISTRY_HEADER)
+        return [(list(r) + [""] * width)[:width] for r in rows[1:]]
+
+    def load(self):
+        return self._rows()
+
+    def append(self, entries):
+        if REGISTRY_SHEET not in self.pool.titles():
+            self.pool.add_worksheet(REGISTRY_SHEET, REGISTRY_HEADER)
+        # RAW: "007" 같은 아이디나 솔트가 숫자로 바뀌지 않게
+        self.pool.run(REGISTRY_SHEET, lambda ws: ws.append_rows(entries, value_input_option="RAW"),
+                      idempotent=False)
+
+    def replace(self, entry):
+        # 같은 번호/아이디의 첫 줄을 entry 로 덮어쓴다 (비밀번호 바꾸기)
+        for row_num, row in enumerate(self._rows(), start=2):
+            if row[0] == str(entry[0]) and row[1] == entry[1]:
+                self.pool.run(REGISTRY_SHEET,
+                              lambda ws: ws.update(range_name=f"A{row_num}", values=[entry], value_input_option="RAW"),
+                              idempotent=False)
+                return
+        raise KeyError(entry[1])
+
+
+class UserRegistry:
+    def __init__(self, path="users.db", source=None):
+        # source: SheetUsers 를 돌려주는 함수 (처음 필요할 때 연결). None 이면 로컬 파일이 원본
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._source_fn = source
+        self._source = None
+        self._refreshed = None
+        with self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(users)")]
+            if columns and "key" not in columns:
+                # 사용자번호 없이 만든 예전 목록 -> 등록 순서대로 번호를 붙인다
+                self._conn.execute("ALTER TABLE users RENAME TO users_old")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "key INTEGER PRIMARY KEY, user TEXT UNIQUE, salt TEXT, hash TEXT, joined TEXT)"
+            )
+            if columns and "key" not in columns:
+                self._conn.execute("INSERT INTO users (key, user, salt, hash, joined) "
+                                   "SELECT rowid, user, salt, hash, joined FROM users_old ORDER BY rowid")
+                self._conn.execute("DROP TABLE users_old")
+
+    def _remote(self):
+        if self._source is None:
+            self._source = self._source_fn()
+        return self._source
+
+    def _entry(self, user):
+        with self._lock:
+            return self._conn.execute("SELECT key, user, salt, hash, joined FROM users WHERE user = ?",
+                                      (user,)).fetchone()
+
+    def _check_local(self, user, password):
+        row = self._entry(user)
+        if row is None:
+            return "new"
+        return "ok" if hmac.compare_digest(hash_password(password, row[2]), row[3]) else "wrong"
+
+    def _next_key(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(key), 0) + 1 FROM users").fetchone()[0]
+
+    def refresh(self, force=False):
+        # 시트 원본을 다시 읽어서 로컬 목록을 통째로 바꾼다. 반환: 다시 읽었는지
+        if self._source_fn is None:
+            return False
+        if not force and self._refreshed is not None and time.monotonic() - self._refreshed < REFRESH_GAP:
+            return False
+        entries = _winners(self._remote().load())
+        self._refreshed = time.monotonic()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users")
+            self._conn.executemany("INSERT INTO users (key, user, salt, hash, joined) VALUES (?, ?, ?, ?, ?)",
+                                   entries)
+        return True
+
+    def check(self, user, password):
+        # 반환: "ok" / "wrong" (비밀번호 틀림) / "new" (없는 아이디)
+        state = self._check_local(user, password)
+        if state != "ok" and self.refresh():
+            state = self._check_local(user, password)
+        return state
+
+    def key(self, user):
+        # 사용자번호 (정수), 없는 아이디면 None
+        row = self._entry(user)
+        return None if row is None else row[0]
+
+    def register(self, user, password):
+        # 새 아이디 등록. 반환: 등록 뒤 check() 결과 (다른 곳에서 먼저 같은 아이디로 가입했으면 "wrong")
+        self.register_many([(user, password)])
+        return self._check_local(user, password)
+
+    def register_many(self, pairs):
+        # 없는 아이디만 새 번호로 등록 (이미 있는 아이디는 그대로 둔다)
+        pending = [(user, password) for user, password in pairs]
+        for _ in range(REGISTER_TRIES):
+            if self._source_fn is not None:
+                self.refresh(force=True)
+            pending = [(user, password) for user, password in pending if self._entry(user) is None]
+            if not pending:
+                return
+            start = self._next_key()
+            entries = [new_entry(start + i, user, password) for i, (user, password) in enumerate(pending)]
+            if self._source_fn is None:
+                with self._lock, self._conn:
+                    self._conn.executemany("INSERT OR IGNORE INTO users (key, user, salt, hash, joined) "
+                                           "VALUES (?, ?, ?, ?, ?)", entries)
+                return
+            self._remote().append(entries)
+        self.refresh(force=True)
+
+    def set_password(self, user, old_password, new_password):
+        # 비밀번호만 바꾼다 (사용자번호는 그대로 -> 장부 행은 안 고친다). 반환: 바꿨는지
+        if self.check(user, old_password) != "ok":
+            return False
+        key = self.key(user)
+        entry = new_entry(key, user, new_password)
+        if self._source_fn is None:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE users SET salt = ?, hash = ? WHERE key = ?", (entry[2], entry[3], key))
+            return True
+        entry[4] = self._entry(user)[4]
+        self._remote().replace(entry)
+        self.refresh(force=True)
+        return self._check_local(user, new_password) == "ok"
+
+    def users(self):
+        self.refresh()
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT user FROM users")}
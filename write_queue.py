@@ -0,0 +1,345 @@
+import contextlib
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from scheduler import background
+from schema import record_id
+
+
+# ==========================================
+# [쓰기 대기열]
+# 입력 폼에서 저장하면 바로 로컬 파일(SQLite)에 적어두고 끝낸다.
+# 백그라운드 작업자가 (시트, 사용자)별로 모아서 append_rows 한 번으로 보낸다.
+# 서버가 꺼져도 파일에 남아 있으니 다시 켜지면 이어서 보낸다.
+# 할당량 초과(429)나 연결 끊김 같은 오류는 점점 길게 기다렸다가 다시 보낸다.
+# 보냈는데 응답만 못 받았을 수 있으니, 다시 보낼 때는 시트에 이미 있는 기록ID 를 빼고 보낸다.
+# 다시 보내도 안 되는 오류(잘못된 범위/값)는 그 묶음을 실패 목록으로 옮기고 다음 묶음으로 넘어간다
+# (화면에서 다시 보내거나 버린다).
+# 서버가 여러 대면 SharedWriteQueue: 대기열을 공용 저장소(redis)에 둔다 (make_write_queue).
+# ==========================================
+def is_quota_error(e):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def is_transient(e):
+    # 기다렸다가 다시 보내면 될 수 있는 오류: 할당량 초과, 구글 쪽 오류(5xx), 연결 끊김/시간 초과
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 429) or 500 <= status < 600
+    return isinstance(e, OSError)
+
+
+class WriteQueue:
+    MAX_BACKOFF = 60
+    # 깨우는 사람이 없어도 이 간격(초)마다 대기열을 본다 (None: 이 프로세스에서 넣을 때만)
+    POLL = None
+
+    def __init__(self, storage, path="write_queue.db", batch_size=500, flush_delay=0.5):
+        self.storage = storage
+        self.batch_size = batch_size
+        # 첫 저장 후 잠깐 기다렸다가 보내서 연속 입력을 한 번에 묶는다
+        self.flush_delay = flush_delay
+        self.last_error = None
+        self.synced = {}
+        # 지난 전송의 결과를 모름 (응답 없이 끊김) -> 다음 전송 전에 이미 들어간 행을 확인
+        self._unsure = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._open(path)
+        threading.Thread(target=self._worker, name="write-queue", daemon=True).start()
+        if self.pending_count():
+            self._wake.set()
+
+    def _open(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT, user TEXT, row TEXT, created REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failed ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT, user TEXT, row TEXT, created REAL, error TEXT)"
+            )
+
+    def submit(self, sheet_name, user, row):
+        self.submit_many(sheet_name, user, [row])
+
+    def submit_many(self, sheet_name, user, rows):
+        # 여러 행을 한 번에 (CSV 가져오기): 한 트랜잭션으로 적고, 같은 묶음으로 나간다
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO queue (sheet, user, row, created) VALUES (?, ?, ?, ?)",
+                [(sheet_name, user, json.dumps(row, ensure_ascii=False), now) for row in rows],
+            )
+        self._wake.set()
+
+    def pending_count(self, user=None):
+        with self._lock:
+            if user is None:
+                return self._conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM queue WHERE user = ?", (user,)).fetchone()[0]
+
+    def pending_rows(self, user, sheet_name):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row FROM queue WHERE user = ? AND sheet = ? ORDER BY id", (user, sheet_name)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def synced_count(self, user):
+        with self._lock:
+            return self.synced.get(user, 0)
+
+    # --- 실패 목록 (다시 보내도 안 되는 오류) ---
+    def failed_rows(self, user):
+        # 반환: [(시트, 행, 오류)] 들어온 순서
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sheet, row, error FROM failed WHERE user = ? ORDER BY id", (user,)
+            ).fetchall()
+        return [(sheet_name, json.loads(row), error) for sheet_name, row, error in rows]
+
+    def retry_failed(self, user):
+        # 실패 목록을 대기열 끝으로 다시 넣는다. 반환: 행 수
+        with self._lock, self._conn:
+            moved = self._conn.execute(
+                "INSERT INTO queue (sheet, user, row, created) "
+                "SELECT sheet, user, row, created FROM failed WHERE user = ? ORDER BY id", (user,)
+            ).rowcount
+            self._conn.execute("DELETE FROM failed WHERE user = ?", (user,))
+        self._wake.set()
+        return moved
+
+    def discard_failed(self, user):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM failed WHERE user = ?", (user,))
+
+    def _fail(self, sheet_name, user, ids, rows, error):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO failed (sheet, user, row, created, error) "
+                "SELECT sheet, user, row, created, ? FROM queue WHERE id = ?", [(error, i) for i in ids]
+            )
+            self._conn.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+
+    def _next_batch(self):
+        with self._lock:
+            first = self._conn.execute("SELECT sheet, user FROM queue ORDER BY id LIMIT 1").fetchone()
+            if first is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT id, row FROM queue WHERE sheet = ? AND user = ? ORDER BY id LIMIT ?",
+                (first[0], first[1], self.batch_size),
+            ).fetchall()
+        return first[0], first[1], [r[0] for r in rows], [json.loads(r[1]) for r in rows]
+
+    def _done(self, sheet_name, user, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+
+    def flush_once(self):
+        # 가장 오래된 (시트, 사용자) 묶음 하나를 보낸다. 보낼 게 없으면 False
+        batch = self._next_batch()
+        if batch is None:
+            return False
+        sheet_name, user, ids, rows = batch
+        try:
+            with self._sending():
+                unsent = self._unsent(sheet_name, user, rows) if self._unsure else rows
+                if len(unsent) < len(rows):
+                    # 지난번에 응답 없이 들어간 행은 집계표/정비 인덱스에 안 더해졌다
+                    self.storage.forget(sheet_name, user)
+                if unsent:
+                    self.storage.append_rows(sheet_name, user, unsent)
+        except Exception as e:
+            if not is_transient(e):
+                self._fail(sheet_name, user, ids, rows, str(e) or type(e).__name__)
+                self.last_error = None
+                return True
+            if not is_quota_error(e):
+                # 429 는 거절된 것이라 안 들어갔다. 나머지는 들어갔는지 모른다
+                self._unsure = True
+            raise
+        # 대기열에서 지우다 실패해도 다음에 다시 보낼 때 확인하도록
+        self._unsure = True
+        self._done(sheet_name, user, ids)
+        self._unsure = False
+        with self._lock:
+            self.synced[user] = self.synced.get(user, 0) + len(rows)
+        return True
+
+    def _sending(self):
+        return contextlib.nullcontext()
+
+    def _unsent(self, sheet_name, user, rows):
+        # 시트에 이미 있는 기록ID 는 뺀다 (같은 묶음을 두 번 넣지 않게)
+        present = {record_id(sheet_name, values) for _, values in self.storage.load_user_rows(sheet_name, user)}
+        return [row for row in rows if not record_id(sheet_name, row) or record_id(sheet_name, row) not in present]
+
+    def _worker(self):
+        # 대기열 전송은 화면 요청보다 뒤로 (scheduler)
+        with background():
+            self._run()
+
+    def _run(self):
+        backoff = 0
+        while True:
+            self._wake.wait(self.POLL)
+            self._wake.clear()
+            time.sleep(self.flush_delay)
+            while True:
+                try:
+                    if not self.flush_once():
+                        break
+                    backoff = 0
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = ("할당량 초과: " if is_quota_error(e) else "") + (str(e) or type(e).__name__)
+                    backoff = min(max(backoff * 2, 1), self.MAX_BACKOFF)
+                    time.sleep(backoff * random.uniform(0.5, 1.0))
+
+
+# --- 서버 여러 대: 공용 저장소에 두는 대기열 ---
+# (시트, 사용자)별 목록 wq:rows:시트:사용자번호 + 목록 이름 모음 wq:keys.
+# 어느 서버에서 저장해도 모든 서버에 "전송 대기"로 보이고, 보내는 건 한 번에 한 서버만
+# (wq:lock 을 LEASE 초씩 잡고, 보내는 동안은 LEASE/3 초마다 늘린다).
+# 보내던 서버가 꺼지면 잠금이 풀린 뒤 다른 서버가 POLL 초 안에 이어서 보낸다.
+# 보낸 행은 개수가 아니라 그 행 자체로 목록에서 지운다 (잠금이 아직 내 것일 때만).
+# 보내는 중 표시(wq:inflight)가 남아 있는데 잠금을 새로 잡았으면 앞 서버가 보내다 멈춘 것 ->
+# 시트에 이미 들어간 기록ID 를 빼고 보낸다.
+# 서버를 다시 켜도 남는지는 redis 설정(appendonly 등)을 따른다.
+class SharedWriteQueue(WriteQueue):
+    POLL = 5
+    LEASE = 30
+    KEYS = "wq:keys"
+    LOCK = "wq:lock"
+    INFLIGHT = "wq:inflight"
+
+    def __init__(self, storage, shared, batch_size=500, flush_delay=0.5):
+        self.shared = shared
+        self._token = uuid.uuid4().hex
+        super().__init__(storage, None, batch_size, flush_delay)
+
+    def _open(self, path):
+        pass
+
+    def _list_key(self, sheet_name, user):
+        return f"wq:rows:{sheet_name}:{user}"
+
+    def _queues(self, user=None):
+        # [(시트, 사용자)] 이름 순
+        out = []
+        for member in sorted(self.shared.smembers(self.KEYS)):
+            sheet_name, _, owner = member.partition("\t")
+            if user is None or owner == str(user):
+                out.append((sheet_name, owner))
+        return out
+
+    def submit_many(self, sheet_name, user, rows):
+        # 목록에 먼저 넣고 이름을 모음에 (보내는 쪽이 이름을 지운 직후에 넣어도 안 빠지게)
+        self.shared.rpush(self._list_key(sheet_name, user), list(rows))
+        self.shared.sadd(self.KEYS, f"{sheet_name}\t{user}")
+        self._wake.set()
+
+    def pending_count(self, user=None):
+        return sum(self.shared.llen(self._list_key(s, u)) for s, u in self._queues(user))
+
+    def pending_rows(self, user, sheet_name):
+        return self.shared.lrange(self._list_key(sheet_name, user), 0, -1)
+
+    def _claim(self):
+        # 보내는 서버 자리: 비어 있으면 잡고, 내 것이면 연장
+        if self.shared.set(self.LOCK, self._token, ttl=self.LEASE, nx=True):
+            if self.shared.get(self.INFLIGHT) not in (None, self._token):
+                self._unsure = True
+            return True
+        return self._extend()
+
+    def _extend(self):
+        # 내 것일 때만 연장 (이미 풀렸으면 다시 잡지 않는다 -> 그 사이 다른 서버가 보냈을 수 있다)
+        return self._owns() and self.shared.expire(self.LOCK, self.LEASE)
+
+    def _owns(self):
+        return self.shared.get(self.LOCK) == self._token
+
+    @contextlib.contextmanager
+    def _sending(self):
+        # 보내는 동안 잠금을 계속 늘리고, 멈추면 다음 서버가 알 수 있게 표시해 둔다
+        if not self._extend():
+            raise RuntimeError("보내는 동안 대기열 잠금을 놓쳤습니다")
+        self.shared.set(self.INFLIGHT, self._token)
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.LEASE / 3):
+                if not self._extend():
+                    return
+
+        threading.Thread(target=renew, name="write-queue-lease", daemon=True).start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def _release(self):
+        if self.shared.get(self.LOCK) == self._token:
+            self.shared.delete(self.LOCK)
+
+    def _next_batch(self):
+        if not self._claim():
+            # 다른 서버가 보내는 중 (그 서버가 이 목록까지 보낸다)
+            return None
+        for sheet_name, user in self._queues():
+            key = self._list_key(sheet_name, user)
+            rows = self.shared.lrange(key, 0, self.batch_size - 1)
+            if rows:
+                return sheet_name, user, rows, rows
+            member = f"{sheet_name}\t{user}"
+            self.shared.srem(self.KEYS, member)
+            if self.shared.llen(key):
+                self.shared.sadd(self.KEYS, member)
+        self._release()
+        return None
+
+    def _done(self, sheet_name, user, ids):
+        # ids: 보낸 행들. 잠금을 놓쳤으면 (다른 서버가 이어받음) 손대지 않는다 -> 그 서버가 확인하고 지운다
+        if not self._owns():
+            raise RuntimeError("보내는 동안 대기열 잠금을 놓쳤습니다")
+        self.shared.lrem_many(self._list_key(sheet_name, user), ids)
+        self.shared.delete(self.INFLIGHT)
+
+    def _failed_key(self, user):
+        return f"wq:failed:{user}"
+
+    def failed_rows(self, user):
+        return [(e["sheet"], e["row"], e["error"]) for e in self.shared.lrange(self._failed_key(user), 0, -1)]
+
+    def retry_failed(self, user):
+        entries = self.shared.lrange(self._failed_key(user), 0, -1)
+        self.shared.delete(self._failed_key(user))
+        for sheet_name in dict.fromkeys(e["sheet"] for e in entries):
+            self.submit_many(sheet_name, user, [e["row"] for e in entries if e["sheet"] == sheet_name])
+        return len(entries)
+
+    def discard_failed(self, user):
+        self.shared.delete(self._failed_key(user))
+
+    def _fail(self, sheet_name, user, ids, rows, error):
+        if not self._owns():
+            raise RuntimeError("보내는 동안 대기열 잠금을 놓쳤습니다")
+        self.shared.rpush(self._failed_key(user), [{"sheet": sheet_name, "row": row, "error": error} for row in rows])
+        self._done(sheet_name, user, ids)
+
+
+def make_write_queue(storage, shared, path="write_queue.db", batch_size=500, flush_delay=0.5):
+    # 공용 저장소가 프로세스 안이면 로컬 파일 대기열 (꺼져도 남는다), redis 면 모든 서버가 같이 쓰는 대기열
+    if shared.local:
+        return WriteQueue(storage, path, batch_size, flush_delay)
+    return SharedWriteQueue(storage, shared, batch_size, flush_delay)